@@ -76,6 +76,37 @@ DATABASES = {
     }
 }
 
+# Cache (search results / catalog version)
+# LocMem ใช้ได้เฉพาะ process เดียว ถ้ามี REDIS_URL จะใช้ Redis ร่วมกันทุก worker
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'music-matcher',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Write-behind buffer สำหรับ Interaction / PlayHistory (matcher/events.py)
+EVENT_BUFFER_MAX_EVENTS = 500       # flush เมื่อมี event ค้างถึงจำนวนนี้
+EVENT_BUFFER_FLUSH_INTERVAL = 5.0   # หรือทุก ๆ กี่วินาที
+EVENT_BUFFER_MAX_BACKLOG = 50000    # DB ล่มนาน ๆ -> ทิ้ง play เก่าสุดเมื่อค้างเกินนี้
+EVENT_BUFFER_SHARED_TTL = 600       # อายุสำเนาสถานะ like/dislike ที่ยังไม่ flush ใน cache กลาง
+# หลาย worker (gunicorn/uwsgi) ต้องตั้ง REDIS_URL: buffer อยู่ใน memory ของแต่ละ process
+# ถ้าใช้ LocMem แล้วรันหลาย process การกด like ซ้ำที่ไปตก worker อื่นอาจ toggle จากสถานะเก่าใน DB
+
+# Raw Spotify response cache ของ enrich_audio_features (อยู่ใน .gitignore / ย้ายออกนอก repo ได้ด้วย env)
+AUDIO_FEATURE_CACHE_DIR = os.environ.get('AUDIO_FEATURE_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'audio_features'))
+
+# Analytics rollup (matcher/rollups.py) — นับเฉพาะแถวที่เก่ากว่านี้ (วินาที) กันข้ามแถวที่ commit ช้า
+ROLLUP_SAFETY_LAG = 300
+
+# Admin dashboard snapshot (matcher/dashboard.py) — เก่ากว่านี้ (วินาที) จะรีเฟรชเบื้องหลัง
+DASHBOARD_SNAPSHOT_MAX_AGE = 300
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
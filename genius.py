@@ -1,21 +1,26 @@
-import lyricsgenius
+import argparse
 import json
-import time
 import os
-import sys
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from bs4 import BeautifulSoup
 
 # ==========================================
 # 1. ตั้งค่า API
 # ==========================================
-# !!! ใส่ Token ของคุณตรงนี้ !!!
-GENIUS_ACCESS_TOKEN = "mrF4wm7h9-x2lcRMbdur8zpcFidhjGqHJIiMjASY8W7prU2B3P0UE612URlFEPZ7"
+# Token อ่านจาก env เท่านั้น: export GENIUS_ACCESS_TOKEN=... (ห้าม commit token ลงโค้ด)
+GENIUS_ACCESS_TOKEN = os.environ.get("GENIUS_ACCESS_TOKEN")
+# เปลี่ยนเป็น server จำลองในเครื่องได้ เช่น http://127.0.0.1:8765
+GENIUS_API_ROOT = os.environ.get("GENIUS_API_ROOT", "https://api.genius.com")
 
-# ตั้งค่า Timeout ให้นานขึ้น และ Retry เยอะขึ้น
-genius = lyricsgenius.Genius(GENIUS_ACCESS_TOKEN, timeout=60, retries=10)
-genius.verbose = False       
-genius.remove_section_headers = True 
-genius.skip_non_songs = True 
-genius.excluded_terms = ["(Remix)", "(Live)", "(Demo)", "(Instrumental)"]
+TIMEOUT = 60
+MAX_RETRIES = 10
+EXCLUDED_TERMS = ["(Remix)", "(Live)", "(Demo)", "(Instrumental)"]
 
 # ==========================================
 # 2. รายชื่อศิลปิน
@@ -34,104 +39,340 @@ thai_artists_list = [
 
 MIN_YEAR = 2012
 SONGS_PER_ARTIST = 100
-FILENAME = 'thai_songs_final_fixed.json'
+PER_PAGE = 50
+
+# ผลลัพธ์เป็น JSON Lines (append ทีละเพลง) — import ได้ตรง ๆ ด้วย `manage.py import_songs thai_songs.jsonl`
+FILENAME = 'thai_songs.jsonl'
+STATE_FILENAME = 'thai_songs.state.json'       # ความคืบหน้ารายศิลปิน (resume)
+LEGACY_FILENAME = 'thai_songs_final_fixed.json'  # ไฟล์ JSON array รุ่นเก่า (อ่านเพื่อกันซ้ำเท่านั้น)
+
+WORKERS = 4               # ศิลปินที่ scrape พร้อมกัน
+REQUESTS_PER_SECOND = 4   # เพดาน request รวมทุก thread
+BURST = 8
+
+
+# ==========================================
+# 3. TOKEN BUCKET RATE LIMITER
+# ==========================================
+class TokenBucket:
+    """ เติม token `rate` ต่อวินาที เก็บได้สูงสุด `capacity` — ทุก request ต้อง acquire ก่อน (thread-safe) """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# ==========================================
+# 4. GENIUS HTTP CLIENT
+# ==========================================
+class GeniusError(Exception):
+    pass
+
+
+class GeniusClient:
+    """ เรียก Genius API + หน้าเนื้อเพลงผ่าน requests (session แยกต่อ thread) """
+
+    def __init__(self, token, api_root=GENIUS_API_ROOT, bucket=None, timeout=TIMEOUT, retries=MAX_RETRIES):
+        self.token = token
+        self.api_root = api_root.rstrip('/')
+        self.bucket = bucket or TokenBucket(REQUESTS_PER_SECOND, BURST)
+        self.timeout = timeout
+        self.retries = retries
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+            self._local.session.headers['User-Agent'] = 'MusicMatcher/1.0'
+        return self._local.session
+
+    def get(self, url, params=None, api=True):
+        """ GET พร้อม retry แบบ exponential backoff + jitter (429 / 5xx / network error) """
+        headers = {'Authorization': f'Bearer {self.token}'} if api else {}
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                res = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error, retry_after = e, None
+            else:
+                if res.status_code < 400:
+                    return res
+                if res.status_code != 429 and res.status_code < 500:
+                    raise GeniusError(f"HTTP {res.status_code} for {url}")
+                error, retry_after = f"HTTP {res.status_code}", res.headers.get('Retry-After')
+            if attempt == self.retries:
+                raise GeniusError(f"{error} for {url} (gave up after {self.retries} retries)")
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = min(60.0, 0.5 * 2 ** attempt) + random.uniform(0, 0.5)
+            time.sleep(delay)
+
+    def api(self, path, **params):
+        return self.get(f"{self.api_root}/{path.lstrip('/')}", params=params).json()['response']
+
+    def find_artist(self, name):
+        """ หา artist id จากผลค้นหา (ชื่อตรงกันก่อน ไม่งั้นเอาผลแรก) """
+        hits = [hit['result']['primary_artist'] for hit in self.api('search', q=name).get('hits', [])]
+        for artist in hits:
+            if artist['name'].strip().lower() == name.strip().lower():
+                return artist
+        return hits[0] if hits else None
+
+    def artist_songs(self, artist_id, page):
+        data = self.api(f'artists/{artist_id}/songs', sort='popularity', per_page=PER_PAGE, page=page)
+        return data.get('songs', []), data.get('next_page')
+
+    def song(self, song_id):
+        return self.api(f'songs/{song_id}')['song']
+
+    def lyrics(self, url):
+        """ ดึงเนื้อเพลงจากหน้าเว็บ (ตัด [Verse]/[Chorus] ออก) """
+        soup = BeautifulSoup(self.get(url, api=False).text, 'html.parser')
+        for br in soup.find_all('br'):
+            br.replace_with('\n')
+        parts = [div.get_text() for div in soup.select('div[data-lyrics-container="true"]')]
+        text = re.sub(r'(\[.*?\])*', '', '\n'.join(parts))
+        return re.sub(r'\n{2,}', '\n', text).strip() or None
+
+
+# ==========================================
+# 5. APPEND-ONLY CHECKPOINT + RESUME STATE
+# ==========================================
+def song_key(title, artist):
+    return f"{title}_{artist}"
+
+
+class Checkpoint:
+    """
+    - เพลง: append ทีละบรรทัดลง JSON Lines (เขียนเฉพาะเพลงใหม่ ไม่เขียนทั้งไฟล์ซ้ำ)
+    - สถานะรายศิลปิน: ไฟล์ JSON เล็ก ๆ เขียนทับแบบ atomic (หน้าถัดไป / จำนวนที่ตรวจแล้ว / เสร็จหรือยัง)
+    """
+
+    def __init__(self, path=FILENAME, state_path=STATE_FILENAME, legacy_path=LEGACY_FILENAME):
+        self.path = path
+        self.state_path = state_path
+        self.lock = threading.Lock()
+        self.keys = set()
+        self.count = 0
 
-def scrape_genius_super_safe():
-    collected_songs = []
-    
-    # โหลดไฟล์เดิมถ้ามี (Resume)
-    if os.path.exists(FILENAME):
+        if legacy_path and os.path.exists(legacy_path):
+            try:
+                with open(legacy_path, 'r', encoding='utf-8') as f:
+                    self.keys.update(song_key(s.get('title'), s.get('artist')) for s in json.load(f))
+            except (OSError, ValueError):
+                pass
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        s = json.loads(line)
+                    except ValueError:
+                        continue  # บรรทัดสุดท้ายที่เขียนไม่จบตอนโปรแกรมถูกปิด
+                    self.keys.add(song_key(s.get('title'), s.get('artist')))
+                    self.count += 1
+
+        self.state = {}
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+
+        self._out = open(path, 'a', encoding='utf-8')
+
+    def close(self):
+        self._out.close()
+
+    def add(self, record):
+        """ คืน False ถ้ามีเพลงนี้อยู่แล้ว """
+        key = song_key(record['title'], record['artist'])
+        with self.lock:
+            if key in self.keys:
+                return False
+            self.keys.add(key)
+            self._out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._out.flush()
+            self.count += 1
+            return True
+
+    def seen(self, title, artist):
+        with self.lock:
+            return song_key(title, artist) in self.keys
+
+    def artist_state(self, name):
+        with self.lock:
+            return dict(self.state.get(name, {}))
+
+    def update_artist(self, name, **fields):
+        with self.lock:
+            self.state.setdefault(name, {}).update(fields)
+            tmp = f"{self.state_path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False)
+            os.replace(tmp, self.state_path)
+
+
+# ==========================================
+# 6. SCRAPER
+# ==========================================
+def song_year(s_dict):
+    """ หาปีแบบปลอดภัย: release_date ("2023-11-25") ก่อน ไม่งั้น release_date_components """
+    r_date = s_dict.get('release_date')
+    if r_date:
         try:
-            with open(FILENAME, 'r', encoding='utf-8') as f:
-                collected_songs = json.load(f)
-            print(f"Resuming... Found {len(collected_songs)} existing songs.")
-        except:
+            return int(str(r_date).split('-')[0])
+        except ValueError:
             pass
+    components = s_dict.get('release_date_components') or {}
+    return components.get('year')
 
-    # สร้าง Set เก็บชื่อเพลง+ศิลปิน เพื่อกันซ้ำ
-    existing_keys = set(f"{s.get('title')}_{s.get('artist')}" for s in collected_songs)
 
-    print(f"Starting scrape for {len(thai_artists_list)} artists...")
+def is_excluded(title):
+    return any(term.lower() in (title or '').lower() for term in EXCLUDED_TERMS)
 
-    for artist_idx, artist_name in enumerate(thai_artists_list):
-        # ใช้ print ภาษาอังกฤษล้วน
-        print(f"\n[{artist_idx + 1}/{len(thai_artists_list)}] Processing Artist: {artist_name}")
-        
-        try:
-            artist = genius.search_artist(artist_name, max_songs=SONGS_PER_ARTIST, sort="popularity")
-            
-            if not artist:
-                print(f" - Artist not found: {artist_name}")
+
+def scrape_artist(client, checkpoint, artist_name, songs_per_artist=SONGS_PER_ARTIST, min_year=MIN_YEAR):
+    """ scrape ศิลปินเดียวต่อจาก state เดิม (บันทึก state หลังจบแต่ละหน้า) คืนจำนวนเพลงที่เพิ่ม """
+    state = checkpoint.artist_state(artist_name)
+    if state.get('done'):
+        return 0
+
+    artist_id = state.get('artist_id')
+    if not artist_id:
+        artist = client.find_artist(artist_name)
+        if not artist:
+            print(f" - Artist not found: {artist_name}")
+            checkpoint.update_artist(artist_name, done=True, added=0)
+            return 0
+        artist_id = artist['id']
+        checkpoint.update_artist(artist_name, artist_id=artist_id)
+
+    page = state.get('next_page', 1)
+    scanned = state.get('scanned', 0)
+    added = state.get('added', 0)
+    added_now = 0
+
+    while page and scanned < songs_per_artist:
+        songs, next_page = client.artist_songs(artist_id, page)
+        for song in songs:
+            if scanned >= songs_per_artist:
+                break
+            # skip_non_songs: เอาเฉพาะที่มีเนื้อเพลงครบ และไม่ใช่ Remix/Live/...
+            if song.get('lyrics_state', 'complete') != 'complete' or is_excluded(song.get('title')):
                 continue
+            scanned += 1
+
+            title = song.get('title', 'Unknown')
+            artist_val = song.get('artist_names', artist_name)  # บางที key คือ artist_names
+            if checkpoint.seen(title, artist_val):
+                continue
+
+            year = song_year(song)
+            if not (year and year >= min_year):
+                continue
+            s_dict = client.song(song['id'])
+            year = song_year(s_dict) or year
+            if not (year and year >= min_year):
+                continue
+
+            final_data = {
+                "id": s_dict.get('id'),
+                "title": title,
+                "artist": artist_val,
+                "album": s_dict.get('album', {}).get('name') if s_dict.get('album') else None,
+                "year": year,
+                "release_date": s_dict.get('release_date'),
+                "lyrics": client.lyrics(s_dict['url']) if s_dict.get('url') else None,
+                "image_url": s_dict.get('song_art_image_url'),
+                "url": s_dict.get('url'),
+                "stats_pageviews": (s_dict.get('stats') or {}).get('pageviews', 0),
+            }
+            if checkpoint.add(final_data):
+                added += 1
+                added_now += 1
+                print(f"   + Saved ID: {final_data['id']} (Year: {year})")
+
+        page = next_page
+        checkpoint.update_artist(artist_name, next_page=page, scanned=scanned, added=added)
+
+    checkpoint.update_artist(artist_name, done=True)
+    return added_now
+
+
+def scrape_genius_super_safe(artists=None, workers=WORKERS, rate=REQUESTS_PER_SECOND, api_root=GENIUS_API_ROOT,
+                             output=FILENAME, state_path=STATE_FILENAME, songs_per_artist=SONGS_PER_ARTIST,
+                             min_year=MIN_YEAR, token=None):
+    token = token or GENIUS_ACCESS_TOKEN
+    if not token:
+        raise GeniusError("GENIUS_ACCESS_TOKEN is not set (export GENIUS_ACCESS_TOKEN=<your token>)")
+    artists = artists or thai_artists_list
+    client = GeniusClient(token, api_root=api_root, bucket=TokenBucket(rate, max(1, rate * 2)))
+    checkpoint = Checkpoint(output, state_path)
+    if checkpoint.count:
+        print(f"Resuming... Found {checkpoint.count} existing songs.")
+
+    print(f"Starting scrape for {len(artists)} artists with {workers} workers ({rate} req/s)...")
+    failed = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {
+                pool.submit(scrape_artist, client, checkpoint, name, songs_per_artist, min_year): name
+                for name in artists
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                name = futures[future]
+                try:
+                    added = future.result()
+                    print(f"[{done}/{len(artists)}] >> Done with {name}. Added {added} songs.")
+                except Exception as e:
+                    # ไม่หยุดทั้งงาน: state ของศิลปินนี้ยังไม่ done -> รันใหม่จะทำต่อจากหน้าล่าสุด
+                    failed.append(name)
+                    print(f"[{done}/{len(artists)}] !!! Error with {name}: {str(e)[:80]}")
+    finally:
+        checkpoint.close()
+
+    print(f"\nCompleted! Total songs collected: {checkpoint.count}")
+    print(f"File saved to: {output}")
+    if failed:
+        print(f"Failed artists (run again to resume): {', '.join(failed)}")
+    return checkpoint.count, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape Thai songs from Genius (concurrent + resumable)")
+    parser.add_argument('--artists', nargs='*', help="ชื่อศิลปิน (default: thai_artists_list)")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND, help="request ต่อวินาที (รวมทุก thread)")
+    parser.add_argument('--api-root', default=GENIUS_API_ROOT)
+    parser.add_argument('--output', default=FILENAME)
+    parser.add_argument('--state', default=STATE_FILENAME)
+    parser.add_argument('--songs-per-artist', type=int, default=SONGS_PER_ARTIST)
+    parser.add_argument('--min-year', type=int, default=MIN_YEAR)
+    args = parser.parse_args(argv)
+    if not GENIUS_ACCESS_TOKEN:
+        parser.error("GENIUS_ACCESS_TOKEN is not set (export GENIUS_ACCESS_TOKEN=<your token>)")
+    scrape_genius_super_safe(
+        artists=args.artists, workers=args.workers, rate=args.rate, api_root=args.api_root,
+        output=args.output, state_path=args.state, songs_per_artist=args.songs_per_artist,
+        min_year=args.min_year,
+    )
 
-            added_count = 0
-            for song in artist.songs:
-                # !!! จุดสำคัญ: แปลงเป็น Dict ก่อนเรียกใช้ เพื่อป้องกัน AttributeError !!!
-                s_dict = song.to_dict()
-                
-                title = s_dict.get('title', 'Unknown')
-                artist_val = s_dict.get('artist_names', artist_name) # บางที key คือ artist_names
-                
-                unique_key = f"{title}_{artist_val}"
-                if unique_key in existing_keys:
-                    continue
-
-                # --- 1. หาปีแบบปลอดภัยสุดๆ (Safe Parsing) ---
-                song_year = None
-                
-                # ลองหาจาก release_date (รูปแบบ "2023-11-25")
-                r_date = s_dict.get('release_date')
-                if r_date:
-                    try:
-                        song_year = int(str(r_date).split('-')[0])
-                    except:
-                        pass
-                
-                # ถ้าไม่มี ให้ลองหาจาก field 'year' ตรงๆ
-                if not song_year and s_dict.get('release_date_components'):
-                     try:
-                         song_year = s_dict['release_date_components'].get('year')
-                     except:
-                         pass
-
-                # --- 2. เช็คเงื่อนไขปี ---
-                if song_year and song_year >= MIN_YEAR:
-                    
-                    # เก็บข้อมูลลง List
-                    final_data = {
-                        "id": s_dict.get('id'),
-                        "title": title,
-                        "artist": artist_val,
-                        "album": s_dict.get('album', {}).get('name') if s_dict.get('album') else None,
-                        "year": song_year,
-                        "release_date": r_date,
-                        "lyrics": s_dict.get('lyrics'),
-                        "image_url": s_dict.get('song_art_image_url'),
-                        "url": s_dict.get('url'),
-                        "stats_pageviews": s_dict.get('stats', {}).get('pageviews', 0)
-                    }
-                    
-                    collected_songs.append(final_data)
-                    existing_keys.add(unique_key)
-                    added_count += 1
-                    
-                    # ปริ้นท์แค่ ID (ปลอดภัยกับ Windows จอดำ)
-                    print(f"   + Saved ID: {s_dict.get('id')} (Year: {song_year})")
-
-            # Save ทุกครั้งที่จบ 1 ศิลปิน
-            with open(FILENAME, 'w', encoding='utf-8') as f:
-                json.dump(collected_songs, f, ensure_ascii=False, indent=4)
-            
-            print(f"   >> Done with {artist_name}. Added {added_count} songs.")
-
-        except Exception as e:
-            # ดักจับ Error ทุกอย่างแล้วข้ามไป ไม่ให้โปรแกรมหยุด
-            print(f"   !!! Error with {artist_name}: {str(e)[:50]}...")
-            time.sleep(5)
-            continue
-
-    print(f"\nCompleted! Total songs collected: {len(collected_songs)}")
-    print(f"File saved to: {FILENAME}")
 
 if __name__ == "__main__":
-    scrape_genius_super_safe()
\ No newline at end of file
+    main()
@@ -2,10 +2,11 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import (
     User, UserProfile, Role, UserRole, UserSuspension,
-    Artist, Album, Category, Song,
-    Interaction, FavoriteSong, UserScanLog, PlayHistory,
+    Artist, Album, Category, Song, SongLyrics,
+    Interaction, FavoriteSong, UserScanLog, PlayHistory, UserTasteProfile,
     Playlist, PlaylistItem,
-    ModelVersion, Recommendation, RetrainJob, TrainingLog
+    ModelVersion, Recommendation, RetrainJob, TrainingLog,
+    ImportJob,
 )
 
 # ===================== INLINES =====================
@@ -19,6 +20,11 @@ class UserRoleInline(admin.TabularInline):
     model = UserRole
     extra = 1
 
+class SongLyricsInline(admin.StackedInline):
+    model = SongLyrics
+    can_delete = False
+    verbose_name_plural = 'Lyrics'
+
 class PlaylistItemInline(admin.TabularInline):
     model = PlaylistItem
     extra = 1
@@ -72,6 +78,7 @@ class SongAdmin(admin.ModelAdmin):
     list_filter = ('json_mood', 'category', 'created_at')
     search_fields = ('title', 'artist__name', 'album__title', 'json_mood')
     raw_id_fields = ('artist', 'album') 
+    inlines = [SongLyricsInline]
 
 # ===================== 3. USER ACTIVITY & OTHERS ADMIN =====================
 
@@ -89,6 +96,12 @@ class PlayHistoryAdmin(admin.ModelAdmin):
     list_display = ('user', 'song', 'detected_emotion', 'source', 'started_at')
     list_filter = ('source', 'detected_emotion')
 
+@admin.register(UserTasteProfile)
+class UserTasteProfileAdmin(admin.ModelAdmin):
+    list_display = ('user', 'like_count', 'top_genre', 'updated_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('updated_at',)
+
 @admin.register(Playlist)
 class PlaylistAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'user', 'is_public', 'created_at')
@@ -121,4 +134,10 @@ class RetrainJobAdmin(admin.ModelAdmin):
 @admin.register(TrainingLog)
 class TrainingLogAdmin(admin.ModelAdmin):
     list_display = ('model_version', 'epoch_number', 'training_loss', 'validation_loss')
-    list_filter = ('model_version',)
\ No newline at end of file
+    list_filter = ('model_version',)
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'source', 'status', 'processed', 'total_records', 'created', 'updated', 'failed', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('errors',)
@@ -0,0 +1,57 @@
+from django.db.models import Avg, Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import User, Interaction
+
+
+# ==========================================
+# 👥 DEMOGRAPHICS
+# ==========================================
+def user_demographics():
+    """ จำนวนผู้ใช้ / อายุเฉลี่ย / สัดส่วนเพศ ด้วย conditional aggregate query เดียว """
+    stats = User.objects.aggregate(
+        total=Count('id'),
+        avg_age=Avg('age'),
+        male=Count('id', filter=Q(gender='M')),
+        female=Count('id', filter=Q(gender='F')),
+    )
+    total = stats['total']
+    other = total - (stats['male'] + stats['female'])
+
+    def percent(n):
+        return round((n / total) * 100, 1) if total else 0
+
+    return {
+        'total_users': total,
+        'avg_age': round(stats['avg_age']) if stats['avg_age'] else 0,
+        'male_percent': percent(stats['male']),
+        'female_percent': percent(stats['female']),
+        'other_percent': percent(other),
+    }
+
+
+# ==========================================
+# 🎧 TOP GENRE PER USER
+# ==========================================
+def top_genres_for_users(user_ids=None):
+    """
+    แนวเพลงที่ user กด Like มากที่สุด ใช้ query เดียวด้วย
+    ROW_NUMBER() OVER (PARTITION BY user ORDER BY likes DESC)
+    คืน dict {user_id: genre}
+    """
+    likes = Interaction.objects.filter(type='like').exclude(song__json_genre__isnull=True).exclude(song__json_genre='')
+    if user_ids is not None:
+        likes = likes.filter(user_id__in=user_ids)
+
+    # annotate แยกสองชั้น: window ต้องมาหลัง aggregate ไม่งั้นจะถูกใส่ใน GROUP BY
+    ranked = likes.values('user_id', 'song__json_genre').annotate(
+        likes=Count('id'),
+    ).annotate(
+        rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('likes').desc(), F('song__json_genre').asc()],
+        ),
+    ).filter(rank=1)
+
+    return {row['user_id']: row['song__json_genre'] for row in ranked}
@@ -0,0 +1,207 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from django.conf import settings
+
+from .importer import chunked
+from .models import Song
+from .search import bump_catalog_version
+
+SPOTIFY_API_BASE = os.environ.get('SPOTIFY_API_BASE', 'https://api.spotify.com')
+SPOTIFY_AUTH_URL = os.environ.get('SPOTIFY_AUTH_URL', 'https://accounts.spotify.com/api/token')
+DEFAULT_CACHE_DIR = getattr(
+    settings, 'AUDIO_FEATURE_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'audio_features'),
+)
+
+MAX_IDS_PER_REQUEST = 100   # เพดานของ GET /v1/audio-features?ids=...
+SCAN_CHUNK_SIZE = 1000      # เพลงที่อ่านจาก DB ต่อรอบ
+REQUEST_TIMEOUT = 30
+
+FEATURES = ('valence', 'energy', 'tempo', 'danceability')
+# ค่า default ของ Song = ยังไม่เคยได้ feature จริง
+DEFAULT_FEATURES = {f: Song._meta.get_field(f).default for f in FEATURES}
+
+
+class AudioFeatureError(Exception):
+    pass
+
+
+def songs_needing_features():
+    """ เพลงที่มี spotify_id แต่ feature ยังเป็นค่า default ทั้งหมด """
+    return Song.objects.filter(spotify_id__isnull=False, **DEFAULT_FEATURES).exclude(spotify_id='')
+
+
+# ==========================================
+# 🔑 TOKEN
+# ==========================================
+def client_credentials_token(client_id, client_secret, auth_url=SPOTIFY_AUTH_URL):
+    res = requests.post(
+        auth_url, data={'grant_type': 'client_credentials'},
+        auth=(client_id, client_secret), timeout=REQUEST_TIMEOUT,
+    )
+    if res.status_code >= 400:
+        raise AudioFeatureError(f"ขอ token ไม่สำเร็จ (HTTP {res.status_code})")
+    return res.json()['access_token']
+
+
+# ==========================================
+# 💾 RAW RESPONSE CACHE
+# ==========================================
+class FeatureCache:
+    """
+    เก็บ object ดิบจาก API ต่อ 1 track (cache_dir/ab/<spotify_id>.json)
+    track ที่ API ตอบ null ก็เก็บไว้ด้วย -> รันซ้ำไม่ต้องยิง API อีก
+    """
+    MISSING = object()
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, spotify_id):
+        return os.path.join(self.cache_dir, spotify_id[:2], f'{spotify_id}.json')
+
+    def get(self, spotify_id):
+        try:
+            with open(self._path(spotify_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return self.MISSING
+
+    def put(self, spotify_id, raw):
+        path = self._path(spotify_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(raw, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+# ==========================================
+# 🌐 SPOTIFY CLIENT
+# ==========================================
+class AudioFeatureClient:
+    """ GET {api_base}/v1/audio-features?ids=... พร้อม retry แบบ exponential backoff (429 / 5xx / network) """
+
+    def __init__(self, api_base=SPOTIFY_API_BASE, token=None, retries=5, timeout=REQUEST_TIMEOUT):
+        self.api_base = api_base.rstrip('/')
+        self.token = token
+        self.retries = retries
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+            if self.token:
+                self._local.session.headers['Authorization'] = f'Bearer {self.token}'
+        return self._local.session
+
+    def fetch(self, spotify_ids):
+        """ คืน {spotify_id: raw object หรือ None} ของทุก id ที่ส่งไป """
+        url = f'{self.api_base}/v1/audio-features'
+        params = {'ids': ','.join(spotify_ids)}
+        for attempt in range(self.retries + 1):
+            try:
+                res = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error, retry_after = str(e), None
+            else:
+                if res.status_code < 400:
+                    items = res.json().get('audio_features') or []
+                    # API คืนตามลำดับ ids (null = ไม่พบ) แต่จับคู่ด้วย id ถ้ามี
+                    found = {item['id']: item for item in items if item and item.get('id')}
+                    return {sid: found.get(sid) for sid in spotify_ids}
+                if res.status_code != 429 and res.status_code < 500:
+                    raise AudioFeatureError(f"HTTP {res.status_code}: {res.text[:200]}")
+                error, retry_after = f"HTTP {res.status_code}", res.headers.get('Retry-After')
+            if attempt == self.retries:
+                raise AudioFeatureError(f"{error} (gave up after {self.retries} retries)")
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = min(30.0, 0.5 * 2 ** attempt) + random.uniform(0, 0.5)
+            time.sleep(delay)
+
+
+# ==========================================
+# 🎚️ ENRICHMENT
+# ==========================================
+def apply_features(song, raw):
+    """ ใส่ค่าจาก object ดิบลง Song คืน True ถ้ามีค่าเปลี่ยน """
+    if not raw:
+        return False
+    changed = False
+    for feature in FEATURES:
+        value = raw.get(feature)
+        if isinstance(value, (int, float)) and value != getattr(song, feature):
+            setattr(song, feature, float(value))
+            changed = True
+    return changed
+
+
+def enrich_audio_features(client, cache, batch_size=MAX_IDS_PER_REQUEST, workers=4, refresh=False,
+                          limit=None, log=print):
+    """
+    อ่านเพลงเป็น chunk (keyset บน song_id) -> ใช้ cache ก่อน -> id ที่เหลือยิง API เป็น batch พร้อมกัน
+    -> bulk_update ทีละ chunk (เขียน DB ใน thread หลักเท่านั้น)
+    """
+    batch_size = max(1, min(batch_size, MAX_IDS_PER_REQUEST))
+    stats = {'scanned': 0, 'cached': 0, 'fetched': 0, 'updated': 0, 'not_found': 0, 'failed': 0, 'requests': 0}
+    qs = songs_needing_features().only('song_id', 'spotify_id', *FEATURES).order_by('song_id')
+
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while limit is None or stats['scanned'] < limit:
+            size = SCAN_CHUNK_SIZE if limit is None else min(SCAN_CHUNK_SIZE, limit - stats['scanned'])
+            songs = list(qs.filter(song_id__gt=last_id)[:size])
+            if not songs:
+                break
+            last_id = songs[-1].song_id
+            stats['scanned'] += len(songs)
+
+            raw_by_id, missing = {}, []
+            for sid in dict.fromkeys(song.spotify_id for song in songs):
+                raw = cache.MISSING if refresh else cache.get(sid)
+                if raw is cache.MISSING:
+                    missing.append(sid)
+                else:
+                    raw_by_id[sid] = raw
+                    stats['cached'] += 1
+
+            futures = {pool.submit(client.fetch, batch): batch for batch in chunked(missing, batch_size)}
+            for future in as_completed(futures):
+                stats['requests'] += 1
+                try:
+                    result = future.result()
+                except AudioFeatureError as e:
+                    stats['failed'] += len(futures[future])
+                    log(f"!!! batch of {len(futures[future])} ids failed: {e}")
+                    continue
+                for sid, raw in result.items():
+                    cache.put(sid, raw)
+                    raw_by_id[sid] = raw
+                    stats['fetched'] += 1
+
+            to_update = []
+            for song in songs:
+                raw = raw_by_id.get(song.spotify_id, cache.MISSING)
+                if raw is cache.MISSING:
+                    continue
+                if raw is None:
+                    stats['not_found'] += 1
+                elif apply_features(song, raw):
+                    to_update.append(song)
+            if to_update:
+                Song.objects.bulk_update(to_update, FEATURES, batch_size=500)
+                stats['updated'] += len(to_update)
+            log(f"... scanned {stats['scanned']} | updated {stats['updated']} | requests {stats['requests']}")
+
+    if stats['updated']:
+        bump_catalog_version()  # bulk_update ไม่ยิง signal
+    return stats
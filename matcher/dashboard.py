@@ -0,0 +1,112 @@
+import datetime
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import User, FavoriteSong, UserScanLog, DashboardSnapshot
+from .upserts import upsert
+
+SNAPSHOT_NAME = 'admin_dashboard'
+MAX_AGE = getattr(settings, 'DASHBOARD_SNAPSHOT_MAX_AGE', 300)
+
+_refresh_lock = threading.Lock()
+
+
+# ==========================================
+# 📈 KPI COMPUTATION
+# ==========================================
+def compute_dashboard(now=None):
+    """
+    KPI ทั้งหมดของหน้า Admin ด้วย 3 queries:
+    1. User: conditional aggregate เดียว (total/active/banned/new 7d/new 30d/ก่อน 30d)
+    2. เพลงที่ถูก Favorite มากที่สุด 5 อันดับ (GROUP BY บน FavoriteSong ไม่ scan ทั้ง Song)
+    3. สรุปการสแกนใบหน้าตามอารมณ์ (รวมเป็นจำนวนสแกนทั้งหมดได้ด้วย)
+    """
+    now = now or timezone.now()
+    last_week = now - datetime.timedelta(days=7)
+    last_month = now - datetime.timedelta(days=30)
+
+    users = User.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+        banned=Count('id', filter=Q(is_active=False)),
+        new_7d=Count('id', filter=Q(date_joined__gte=last_week)),
+        new_30d=Count('id', filter=Q(date_joined__gte=last_month)),
+        before_30d=Count('id', filter=Q(date_joined__lt=last_month)),
+    )
+    growth_total = 0
+    if users['before_30d'] > 0:
+        growth_total = ((users['total'] - users['before_30d']) / users['before_30d']) * 100
+
+    most_liked = FavoriteSong.objects.values(
+        'song_id', 'song__title', 'song__artist__name'
+    ).annotate(like_count=Count('id')).order_by('-like_count', 'song_id')[:5]
+
+    scans = list(
+        UserScanLog.objects.values('detected_emotion').annotate(n=Count('scan_id')).order_by('-n')
+    )
+    top_mood = next((row['detected_emotion'] for row in scans if row['detected_emotion']), None)
+
+    return {
+        'total_users': users['total'],
+        'active_users': users['active'],
+        'banned_users': users['banned'],
+        'new_users_7d': users['new_7d'],
+        'new_users_30d': users['new_30d'],
+        'growth_total': round(growth_total, 1),
+        'most_liked_songs': [
+            {
+                'song_id': row['song_id'],
+                'title': row['song__title'],
+                'artist': row['song__artist__name'],
+                'like_count': row['like_count'],
+            }
+            for row in most_liked
+        ],
+        'total_scans': sum(row['n'] for row in scans),
+        'top_scanned_mood': top_mood,
+    }
+
+
+# ==========================================
+# 💾 SNAPSHOT STORE
+# ==========================================
+def refresh_dashboard():
+    """ คำนวณใหม่แล้วเขียนทับ snapshot (INSERT ... ON CONFLICT) """
+    now = timezone.now()
+    snapshot = DashboardSnapshot(name=SNAPSHOT_NAME, data=compute_dashboard(now), computed_at=now)
+    upsert(DashboardSnapshot, [snapshot], unique_fields=['name'], update_fields=['data', 'computed_at'])
+    return snapshot
+
+
+def _refresh_in_background():
+    if not _refresh_lock.acquire(blocking=False):
+        return  # มี thread กำลังรีเฟรชอยู่แล้ว
+
+    def run():
+        try:
+            refresh_dashboard()
+        except Exception as e:
+            print(f"❌ Dashboard refresh failed: {e}")
+        finally:
+            connection.close()  # connection ของ thread นี้
+            _refresh_lock.release()
+
+    threading.Thread(target=run, name='dashboard-refresh', daemon=True).start()
+
+
+def dashboard_snapshot(max_age=MAX_AGE):
+    """
+    อ่าน snapshot (query เดียวตาม unique name)
+    - ยังไม่มี -> คำนวณทันที
+    - เก่าเกิน max_age วินาที -> ส่งค่าเดิมไปก่อน แล้วรีเฟรชเบื้องหลัง
+    """
+    snapshot = DashboardSnapshot.objects.filter(name=SNAPSHOT_NAME).first()
+    if snapshot is None:
+        return refresh_dashboard()
+    if timezone.now() - snapshot.computed_at > datetime.timedelta(seconds=max_age):
+        _refresh_in_background()
+    return snapshot
@@ -0,0 +1,347 @@
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, When, Value, IntegerField
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .audio_features import FEATURES, DEFAULT_FEATURES
+from .events import event_buffer, redirect_songs
+from .models import (
+    Song, SongLyrics, Interaction, FavoriteSong, PlaylistItem, PlayHistory, LikeEvent, Recommendation,
+)
+from .search import bump_catalog_version
+from .taste import rebuild_taste_profiles
+
+DEFAULT_THRESHOLD = 0.85
+TITLE_WEIGHT = 0.7           # score = 0.7 * title sim + 0.3 * artist sim
+MAX_BLOCK_SIZE = 200         # block ที่ใหญ่กว่านี้ (ชื่อเพลงทั่วไปมาก ๆ) ไม่เทียบ -> กัน O(n²) ในบล็อกเดียว
+TITLE_PREFIX_LENGTH = 4
+MERGE_CHUNK_SIZE = 500
+
+MergeSuggestion = namedtuple('MergeSuggestion', 'keeper_id duplicate_id score keeper duplicate')
+
+# ตารางที่ชี้มาที่ Song: (model, field ที่ unique คู่กับ song หรือ None)
+MERGE_TARGETS = [
+    (Interaction, 'user_id'),
+    (FavoriteSong, 'user_id'),
+    (PlaylistItem, 'playlist_id'),
+    (PlayHistory, None),
+    (LikeEvent, None),
+    (Recommendation, None),
+]
+# field ที่ keeper ว่างอยู่ -> เติมจากเพลงซ้ำ
+FILL_FIELDS = ('album_id', 'release_date', 'image_url', 'genius_url', 'json_genre', 'spotify_id', 'spotify_link')
+
+
+# ==========================================
+# 🔤 NORMALIZATION
+# ==========================================
+BRACKET_RE = re.compile(r'[\(\[\{]([^\)\]\}]*)[\)\]\}]')
+TITLE_FEAT_RE = re.compile(r'\s+(?:feat|ft|featuring)\b\.?\s.*$', re.I)
+VERSION_RE = re.compile(
+    r'\b(?:remix|mix|live|acoustic|demo|instrumental|inst|version|ver|edit|cover|remaster(?:ed)?|unplugged|karaoke|reprise|sped up|slowed)\b',
+    re.I,
+)
+# แยกเฉพาะเครื่องหมายเครดิตที่ชัดเจน — "and" / "x" / "with" เป็นส่วนของชื่อวงได้ (Simon and Garfunkel)
+ARTIST_SPLIT_RE = re.compile(r'\s*(?:,|&|\bfeat\b\.?|\bft\b\.?|\bfeaturing\b)\s*', re.I)
+
+
+def _clean(text):
+    """ lower + ตัดเครื่องหมาย/สัญลักษณ์ (คงสระ/วรรณยุกต์ไทยไว้ -> ใช้ \\W ไม่ได้) + ยุบช่องว่าง """
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = ''.join(' ' if unicodedata.category(c)[0] in 'PSZ' else c for c in text)
+    return ' '.join(text.split())
+
+
+def normalize_title(title):
+    """
+    คืน (ชื่อหลัก, tag เวอร์ชัน)
+    - (Ft. X) / feat. X / (ชื่อโรมัน เช่น Paen Bpen) -> ตัดทิ้ง
+    - (Remix) / (Live) / - Acoustic ... -> เก็บเป็น tag (เพลงคนละเวอร์ชันห้าม merge)
+    """
+    text = unicodedata.normalize('NFKC', title or '')
+    tags = []
+
+    def bracket(match):
+        inner = match.group(1)
+        if VERSION_RE.search(inner):
+            tags.append(_clean(inner))
+        return ' '
+
+    text = BRACKET_RE.sub(bracket, text)
+    if ' - ' in text:
+        head, tail = text.rsplit(' - ', 1)
+        if VERSION_RE.search(tail):
+            tags.append(_clean(tail))
+            text = head
+    text = TITLE_FEAT_RE.sub('', text)
+    base = _clean(text) or _clean(title)
+    return base, ' '.join(sorted(tags))
+
+
+def normalize_artist(name):
+    """ ศิลปินหลักของเครดิต ("Bodyslam feat. Palmy" -> "bodyslam") """
+    text = unicodedata.normalize('NFKC', name or '')
+    primary = next((part for part in ARTIST_SPLIT_RE.split(text) if part and part.strip()), text)
+    return _clean(primary) or _clean(text)
+
+
+def blocking_keys(title, artist, full_artist=None):
+    """
+    เพลงจะถูกเทียบกันเฉพาะเมื่อมี key ร่วมกันอย่างน้อย 1 ตัว
+    full_artist = ชื่อเครดิตเต็ม (ไม่ตัด) เป็น key สำรอง เผื่อการตัดเครดิตตัดชื่อวงจริงผิด ("Earth, Wind & Fire")
+    """
+    prefix = title.replace(' ', '')[:TITLE_PREFIX_LENGTH]
+    keys = [('t', title), ('a', artist, prefix)]
+    if full_artist and full_artist != artist:
+        keys.append(('a', full_artist, prefix))
+    return keys
+
+
+# ==========================================
+# 🧮 CANDIDATES + VECTORIZED SCORING
+# ==========================================
+def _candidate_pairs(keys_per_song):
+    blocks = defaultdict(list)
+    for i, keys in enumerate(keys_per_song):
+        for key in keys:
+            blocks[key].append(i)
+
+    n = len(keys_per_song)
+    codes, skipped = set(), 0
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        if len(members) > MAX_BLOCK_SIZE:
+            skipped += 1
+            continue
+        idx = np.array(members, dtype=np.int64)
+        a, b = np.triu_indices(len(idx), k=1)
+        codes.update((idx[a] * n + idx[b]).tolist())
+    codes = np.fromiter(codes, dtype=np.int64, count=len(codes))
+    return codes // n, codes % n, skipped
+
+
+def _rowwise_cosine(matrix, I, J):
+    """ cosine ของคู่แถว (I[k], J[k]) ทั้งหมดในครั้งเดียว (TF-IDF normalize L2 แล้ว -> dot product) """
+    if not len(I):
+        return np.zeros(0)
+    return np.asarray(matrix[I].multiply(matrix[J]).sum(axis=1)).ravel()
+
+
+def _vectorize(texts):
+    vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 3), lowercase=False)
+    try:
+        return vectorizer.fit_transform(texts)
+    except ValueError:  # ทุกข้อความว่าง
+        return None
+
+
+def find_duplicates(threshold=DEFAULT_THRESHOLD, log=print):
+    """
+    normalize -> จัดกลุ่มด้วย blocking keys -> score ทุกคู่ในบล็อกแบบ vectorized
+    -> รวมคู่ที่ผ่าน threshold เป็นกลุ่ม (union-find) -> เลือก keeper ต่อกลุ่ม
+    คืน (list ของ MergeSuggestion, stats)
+    """
+    rows = list(Song.objects.order_by('song_id').values_list('song_id', 'title', 'artist__name', 'spotify_id', *FEATURES))
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    titles, tags, artists, full_artists = [], [], [], []
+    for _, title, artist, *_ in rows:
+        base, tag = normalize_title(title)
+        titles.append(base)
+        tags.append(tag)
+        artists.append(normalize_artist(artist))
+        full_artists.append(_clean(artist))
+
+    I, J, skipped = _candidate_pairs([blocking_keys(*names) for names in zip(titles, artists, full_artists)])
+    stats = {'songs': len(rows), 'candidate_pairs': int(len(I)), 'skipped_blocks': skipped}
+    log(f"{len(rows)} songs -> {len(I)} candidate pairs (skipped {skipped} oversized blocks)")
+
+    # เวอร์ชันต่างกัน (Remix vs ต้นฉบับ) ไม่ใช่เพลงซ้ำ
+    tag_arr = np.array(tags, dtype=object)
+    same_version = tag_arr[I] == tag_arr[J]
+    I, J = I[same_version], J[same_version]
+
+    title_matrix, artist_matrix = _vectorize(titles), _vectorize(artists)
+    if title_matrix is None or not len(I):
+        return [], {**stats, 'pairs': 0, 'groups': 0}
+    scores = TITLE_WEIGHT * _rowwise_cosine(title_matrix, I, J)
+    if artist_matrix is not None:
+        scores += (1 - TITLE_WEIGHT) * _rowwise_cosine(artist_matrix, I, J)
+    hit = scores >= threshold
+    I, J, scores = I[hit], J[hit], scores[hit]
+
+    # union-find
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    best_score = defaultdict(float)
+    for i, j, s in zip(I.tolist(), J.tolist(), scores.tolist()):
+        parent[find(i)] = find(j)
+        best_score[i] = max(best_score[i], s)
+        best_score[j] = max(best_score[j], s)
+    groups = defaultdict(list)
+    for i in parent:
+        groups[find(i)].append(i)
+
+    # keeper: มี spotify_id > มี audio feature จริง > มีเนื้อเพลง > song_id เก่าสุด
+    member_ids = [int(ids[i]) for members in groups.values() for i in members]
+    with_lyrics = set(
+        SongLyrics.objects.filter(song_id__in=member_ids).exclude(text='').values_list('song_id', flat=True)
+    )
+    defaults = tuple(DEFAULT_FEATURES[f] for f in FEATURES)
+
+    def rank(i):
+        _, _, _, spotify_id, *features = rows[i]
+        return (bool(spotify_id), tuple(features) != defaults, int(ids[i]) in with_lyrics, -int(ids[i]))
+
+    def label(i):
+        return f"{rows[i][1]} - {rows[i][2]}"
+
+    suggestions = []
+    for members in groups.values():
+        keeper = max(members, key=rank)
+        for i in sorted(members):
+            if i != keeper:
+                suggestions.append(MergeSuggestion(
+                    int(ids[keeper]), int(ids[i]), round(best_score[i], 4), label(keeper), label(i),
+                ))
+    suggestions.sort(key=lambda s: (s.keeper_id, s.duplicate_id))
+    return suggestions, {**stats, 'pairs': int(len(I)), 'groups': len(groups)}
+
+
+# ==========================================
+# 🔀 BULK MERGE
+# ==========================================
+def _resolve_mapping(mapping):
+    """ ตาม chain (A->B, B->C => A->C) และตัดคู่ที่ชี้หาตัวเอง """
+    resolved = {}
+    for dup, keeper in mapping.items():
+        seen = {dup}
+        while keeper in mapping and keeper not in seen:
+            seen.add(keeper)
+            keeper = mapping[keeper]
+        if keeper not in seen:  # วนกลับมาหาตัวเอง -> ข้าม
+            resolved[dup] = keeper
+    return resolved
+
+
+def _drop_conflicts(model, owner, mapping):
+    """
+    แถวที่จะชน unique (owner, song) หลัง repoint: เก็บแถวที่อยู่บน keeper อยู่แล้วก่อน
+    ไม่งั้นเก็บแถวล่าสุด (id มากสุด) ลบที่เหลือ
+    """
+    song_ids = set(mapping) | set(mapping.values())
+    best, doomed = {}, []
+    for pk, owner_id, song_id in model.objects.filter(song_id__in=song_ids).values_list('id', owner, 'song_id').iterator():
+        key = (owner_id, mapping.get(song_id, song_id))
+        rank = (song_id not in mapping, pk)
+        current = best.get(key)
+        if current is None:
+            best[key] = (rank, pk)
+        elif rank > current[0]:
+            doomed.append(current[1])
+            best[key] = (rank, pk)
+        else:
+            doomed.append(pk)
+    for start in range(0, len(doomed), MERGE_CHUNK_SIZE):
+        model.objects.filter(id__in=doomed[start:start + MERGE_CHUNK_SIZE]).delete()
+    return len(doomed)
+
+
+def _repoint(model, mapping):
+    """ UPDATE ... SET song_id = CASE ... ทีละ chunk (ไม่ใช่ 1 query ต่อเพลง) """
+    items = list(mapping.items())
+    moved = 0
+    for start in range(0, len(items), MERGE_CHUNK_SIZE):
+        chunk = items[start:start + MERGE_CHUNK_SIZE]
+        moved += model.objects.filter(song_id__in=[dup for dup, _ in chunk]).update(
+            song_id=Case(*[When(song_id=dup, then=Value(keeper)) for dup, keeper in chunk], output_field=IntegerField())
+        )
+    return moved
+
+
+def merge_songs(mapping):
+    """
+    mapping = {duplicate_song_id: keeper_song_id}
+    ย้าย Interaction / FavoriteSong / PlaylistItem / PlayHistory / LikeEvent / Recommendation ไปที่ keeper
+    (แถวที่จะชน unique constraint ถูกลบก่อน) เติม field ที่ keeper ว่างจากเพลงซ้ำ แล้วลบเพลงซ้ำ
+    ทั้งหมดใน transaction เดียว
+    event ที่ค้างใน buffer: flush ของ process นี้ก่อนรวม ส่วน worker อื่น / event ที่เข้ามาระหว่างรวม
+    ถูกย้ายไปที่ keeper ตอน flush (redirect_songs)
+    """
+    mapping = _resolve_mapping({int(d): int(k) for d, k in mapping.items()})
+    stats = {'merged': 0, 'moved': {}, 'dropped': {}}
+    if not mapping:
+        return stats
+
+    redirect_songs(mapping)
+    event_buffer.flush()
+
+    with transaction.atomic():
+        existing = set(Song.objects.filter(song_id__in=set(mapping) | set(mapping.values())).values_list('song_id', flat=True))
+        mapping = {d: k for d, k in mapping.items() if d in existing and k in existing}
+        if not mapping:
+            return stats
+
+        # user ที่ like เพลงซ้ำ -> taste profile ต้องคำนวณใหม่หลังย้าย
+        liked_users = set(
+            Interaction.objects.filter(song_id__in=list(mapping), type='like').values_list('user_id', flat=True)
+        )
+
+        for model, owner in MERGE_TARGETS:
+            name = model.__name__
+            if owner:
+                stats['dropped'][name] = _drop_conflicts(model, owner, mapping)
+            stats['moved'][name] = _repoint(model, mapping)
+
+        # เติมข้อมูลที่ keeper ยังไม่มี
+        songs = Song.objects.in_bulk(set(mapping) | set(mapping.values()))
+        has_lyrics = set(
+            SongLyrics.objects.filter(song_id__in=list(songs)).exclude(text='').values_list('song_id', flat=True)
+        )
+        defaults = tuple(DEFAULT_FEATURES[f] for f in FEATURES)
+        dirty = {}
+        for dup_id, keeper_id in sorted(mapping.items()):
+            dup, keeper = songs[dup_id], songs[keeper_id]
+            for field in FILL_FIELDS:
+                if not getattr(keeper, field) and getattr(dup, field):
+                    setattr(keeper, field, getattr(dup, field))
+                    dirty[keeper_id] = keeper
+            if not keeper.json_mood and dup.json_mood:
+                keeper.json_mood, keeper.mood_confidence = dup.json_mood, dup.mood_confidence
+                dirty[keeper_id] = keeper
+            if tuple(getattr(keeper, f) for f in FEATURES) == defaults and \
+                    tuple(getattr(dup, f) for f in FEATURES) != defaults:
+                for f in FEATURES:
+                    setattr(keeper, f, getattr(dup, f))
+                dirty[keeper_id] = keeper
+            if keeper_id not in has_lyrics and dup_id in has_lyrics:
+                SongLyrics.objects.filter(song_id=keeper_id).delete()
+                SongLyrics.objects.filter(song_id=dup_id).update(song_id=keeper_id)
+                has_lyrics.add(keeper_id)
+
+        Song.objects.filter(song_id__in=list(mapping)).delete()
+        if dirty:
+            # หลังลบเพลงซ้ำแล้ว -> spotify_id (unique) ย้ายมาได้
+            Song.objects.bulk_update(
+                dirty.values(),
+                [*FILL_FIELDS, 'json_mood', 'mood_confidence', *FEATURES],
+                batch_size=MERGE_CHUNK_SIZE,
+            )
+
+        if liked_users:
+            rebuild_taste_profiles(liked_users)
+        stats['merged'] = len(mapping)
+
+    bump_catalog_version()
+    return stats
@@ -0,0 +1,541 @@
+import atexit
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction, InterfaceError, OperationalError
+from django.db.models import Q
+
+from .models import Song, Interaction, FavoriteSong, PlayHistory, LikeEvent
+from .upserts import upsert
+from .taste import like_deltas, apply_like_deltas
+
+# ค่า default ปรับได้จาก settings.py
+MAX_PENDING_EVENTS = getattr(settings, 'EVENT_BUFFER_MAX_EVENTS', 500)
+FLUSH_INTERVAL = getattr(settings, 'EVENT_BUFFER_FLUSH_INTERVAL', 5.0)
+# DB ล่มนาน ๆ: event ที่คืนกลับเข้า buffer เกินนี้จะถูกทิ้ง (กัน memory โตไม่จำกัด)
+MAX_BACKLOG_EVENTS = getattr(settings, 'EVENT_BUFFER_MAX_BACKLOG', 50000)
+DEAD_LETTER_LIMIT = 1000        # event ที่เขียนไม่ได้ เก็บไว้ดูย้อนหลังล่าสุดกี่รายการ
+# อายุสำเนาสถานะที่ยังไม่ flush ใน cache กลาง (ต้องนานกว่ารอบ flush มาก ๆ)
+SHARED_STATE_TTL = getattr(settings, 'EVENT_BUFFER_SHARED_TTL', 600)
+
+# error ชั่วคราว (ต่อ DB ไม่ได้) -> คืน event เข้า buffer รอรอบหน้า
+# error อื่น (ค่าไม่ถูกต้อง / FK หาย) -> แยกเขียนทีละ user/แถว แล้วทิ้งแถวที่เสีย
+TRANSIENT_DB_ERRORS = (OperationalError, InterfaceError)
+
+logger = logging.getLogger(__name__)
+
+# Playback beacon
+MAX_BEACON_BYTES = 256 * 1024   # ขนาดหลัง decompress
+MAX_BEACON_EVENTS = 200
+PLAY_EVENTS = {'play', 'skip'}
+
+# ค่าแทน "ลบ interaction ออก" (เช่นกด Like ซ้ำ = Un-like)
+REMOVED = None
+
+# type ที่ Interaction รับได้ (ตาม choices ของ model)
+INTERACTION_TYPES = frozenset(value for value, _ in Interaction._meta.get_field('type').choices)
+
+
+def is_interaction_type(value):
+    return value in INTERACTION_TYPES
+
+
+# ==========================================
+# 🔗 SHARED PENDING STATE (ข้าม worker process)
+# ==========================================
+# buffer อยู่ใน memory ของแต่ละ process -> สถานะ Interaction ที่ยังไม่ flush ถูกสำเนาไว้ใน Django cache ด้วย
+# (key ต่อ (user, song) + index ต่อ user) ให้ worker อื่นอ่านเห็นก่อน flush และใช้ตัดสินตอน flush ว่า
+# สถานะของใครใหม่กว่า (stamp มากกว่าชนะ) — ต้องตั้ง REDIS_URL เมื่อรันหลาย process
+# ถ้าใช้ LocMemCache (default) จะถูกต้องเฉพาะกรณี process เดียว
+def _state_key(user_id, song_id):
+    return f'matcher:pending:{user_id}:{song_id}'
+
+
+def _index_key(user_id):
+    return f'matcher:pending:{user_id}'
+
+
+def _share_state(user_id, song_id, state, stamp):
+    try:
+        cache.set(_state_key(user_id, song_id), (state, stamp), SHARED_STATE_TTL)
+        # index แบบ best effort (read-modify-write) ใช้เฉพาะ overlay_likes ตอนไม่ระบุเพลง
+        index = set(cache.get(_index_key(user_id)) or ())
+        if song_id not in index:
+            index.add(song_id)
+            cache.set(_index_key(user_id), sorted(index), SHARED_STATE_TTL)
+    except Exception as e:
+        logger.warning("Shared event state unavailable: %s", e)
+
+
+def _shared_states(user_id, song_ids=None):
+    """ {song_id: (state, stamp)} ที่ยังค้างใน cache กลาง """
+    try:
+        if song_ids is None:
+            song_ids = cache.get(_index_key(user_id)) or ()
+        found = cache.get_many([_state_key(user_id, song_id) for song_id in song_ids])
+    except Exception as e:
+        logger.warning("Shared event state unavailable: %s", e)
+        return {}
+    return {song_id: found[_state_key(user_id, song_id)] for song_id in song_ids
+            if _state_key(user_id, song_id) in found}
+
+
+def _redirect_key(song_id):
+    return f'matcher:song-redirect:{song_id}'
+
+
+def redirect_songs(mapping):
+    """ หลังรวมเพลงซ้ำ (dedup.merge_songs): event ที่ยังค้างในทุก worker ของ song_id เดิม -> เขียนไปที่ keeper แทน """
+    try:
+        cache.set_many({_redirect_key(dup_id): keeper_id for dup_id, keeper_id in mapping.items()}, SHARED_STATE_TTL)
+    except Exception as e:
+        logger.warning("Shared event state unavailable: %s", e)
+
+
+def _song_redirects(song_ids):
+    try:
+        found = cache.get_many([_redirect_key(song_id) for song_id in song_ids])
+    except Exception as e:
+        logger.warning("Shared event state unavailable: %s", e)
+        return {}
+    return {song_id: found[_redirect_key(song_id)] for song_id in song_ids if _redirect_key(song_id) in found}
+
+
+def _unshare_state(user_id, song_id):
+    try:
+        cache.delete(_state_key(user_id, song_id))
+    except Exception as e:
+        logger.warning("Shared event state unavailable: %s", e)
+
+
+# ==========================================
+# 📨 WRITE-BEHIND EVENT BUFFER
+# ==========================================
+class EventBuffer:
+    """
+    รับ event Like/Dislike/Skip และ Play แล้วเขียนลง DB เป็น batch
+
+    - Interaction ถูก coalesce ต่อ (user, song): กดสลับกี่ครั้งก็เหลือสถานะสุดท้ายอันเดียว
+    - PlayHistory ถูกสะสมเป็น list แล้ว bulk_create
+    - flush เมื่อจำนวน event ถึง MAX_PENDING_EVENTS หรือทุก FLUSH_INTERVAL วินาที
+    - การอ่าน (เช่น liked ids) ต้อง overlay สถานะใน buffer ทับค่าจาก DB
+    - flush ล้มทั้ง batch -> เขียนแยกทีละ user / แถว; แถวที่เสียถาวรไปอยู่ใน dead_letters
+      (ไม่คืนกลับ buffer) เฉพาะ error ชั่วคราวของ DB เท่านั้นที่คืนกลับไปรอรอบหน้า
+    - หลาย worker: สถานะ Interaction ถูกสำเนาใน cache กลาง (ดู SHARED PENDING STATE ด้านบน)
+      toggle ใน record_interaction จึงอ่านสถานะล่าสุดได้แม้ event แรกยังค้างอยู่ใน worker อื่น
+      และตอน flush worker ที่ถือสถานะเก่ากว่าจะไม่เขียนทับ
+    """
+
+    def __init__(self, max_events=MAX_PENDING_EVENTS, interval=FLUSH_INTERVAL):
+        self.max_events = max_events
+        self.interval = interval
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        # user_id -> {song_id: (type, rating) | REMOVED}
+        self._interactions = defaultdict(dict)
+        self._stamps = {}  # (user_id, song_id) -> เวลาที่ตั้งสถานะ (ใช้เทียบกับ worker อื่น)
+        self._plays = []
+        self._pending = 0
+        self._flusher = None
+        self.dead_letters = deque(maxlen=DEAD_LETTER_LIMIT)
+
+    # ---------- Interaction ----------
+    def get_interaction(self, user_id, song_id):
+        """ คืน (found, state) — found=False แปลว่าต้องไปอ่านจาก DB (สถานะที่ใหม่กว่าระหว่าง buffer นี้กับ cache กลางชนะ) """
+        with self._lock:
+            user_events = self._interactions.get(user_id)
+            local = None
+            if user_events and song_id in user_events:
+                local = (user_events[song_id], self._stamps.get((user_id, song_id), 0))
+        shared = _shared_states(user_id, [song_id]).get(song_id)
+        latest = max((x for x in (local, shared) if x is not None), key=lambda x: x[1], default=None)
+        if latest is None:
+            return False, None
+        return True, latest[0]
+
+    def set_interaction(self, user_id, song_id, type=None, rating=0):
+        """ type=None หมายถึงลบ interaction ของเพลงนี้ทิ้ง """
+        if type is not None and not is_interaction_type(type):
+            raise ValueError(f"Unknown interaction type: {type!r}")
+        state = REMOVED if type is None else (type, rating)
+        stamp = time.time()
+        with self._lock:
+            user_events = self._interactions[user_id]
+            if song_id not in user_events:
+                self._pending += 1
+            user_events[song_id] = state
+            self._stamps[(user_id, song_id)] = stamp
+        _share_state(user_id, song_id, state, stamp)
+        self._after_add()
+
+    def discard_interaction(self, user_id, song_id):
+        """ ทิ้งสถานะใน buffer (ใช้เมื่อเขียน DB ตรงไปแล้ว) """
+        with self._lock:
+            user_events = self._interactions.get(user_id)
+            if user_events and user_events.pop(song_id, False) is not False:
+                self._pending -= 1
+            self._stamps.pop((user_id, song_id), None)
+        _unshare_state(user_id, song_id)
+
+    def overlay_likes(self, user_id, liked_ids):
+        """ ปรับ set ของ song_id ที่ user ชอบ ตามสถานะที่ยังไม่ถูก flush """
+        with self._lock:
+            states = {song_id: (state, self._stamps.get((user_id, song_id), 0))
+                      for song_id, state in (self._interactions.get(user_id) or {}).items()}
+        for song_id, shared in _shared_states(user_id).items():
+            if song_id not in states or shared[1] > states[song_id][1]:
+                states[song_id] = shared
+        for song_id, (state, _) in states.items():
+            if state is not REMOVED and state[0] == 'like':
+                liked_ids.add(song_id)
+            else:
+                liked_ids.discard(song_id)
+        return liked_ids
+
+    # ---------- PlayHistory ----------
+    def add_play(self, user_id, song_id, detected_emotion=None, source='manual', **extra):
+        with self._lock:
+            self._plays.append(dict(
+                user_id=user_id,
+                song_id=song_id,
+                detected_emotion=detected_emotion,
+                source=source,
+                **extra
+            ))
+            self._pending += 1
+        self._after_add()
+
+    def add_plays(self, plays):
+        """ เพิ่ม play event หลายรายการในครั้งเดียว (จาก beacon) """
+        if not plays:
+            return
+        with self._lock:
+            self._plays.extend(plays)
+            self._pending += len(plays)
+        self._after_add()
+
+    # ---------- Flush ----------
+    def _after_add(self):
+        self._ensure_flusher()
+        if self._pending >= self.max_events:
+            self.flush()
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run_flusher, name='event-buffer-flusher', daemon=True)
+                self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.interval)
+            if self._pending:
+                close_old_connections()
+                self.flush()
+
+    def _swap(self):
+        with self._lock:
+            interactions, plays, stamps = self._interactions, self._plays, self._stamps
+            self._interactions, self._plays, self._stamps = defaultdict(dict), [], {}
+            self._pending = 0
+        return interactions, plays, stamps
+
+    def _restore(self, interactions, plays, stamps):
+        """ flush ไม่สำเร็จเพราะ DB ชั่วคราว: คืน event กลับเข้า buffer (สถานะใหม่กว่าชนะ) """
+        with self._lock:
+            for user_id, user_events in interactions.items():
+                current = self._interactions[user_id]
+                for song_id, state in user_events.items():
+                    if song_id not in current:
+                        current[song_id] = state
+                        self._stamps[(user_id, song_id)] = stamps.get((user_id, song_id), 0)
+                        self._pending += 1
+            self._plays = plays + self._plays
+            self._pending += len(plays)
+            overflow = self._pending - MAX_BACKLOG_EVENTS
+            if overflow > 0 and self._plays:
+                dropped = self._plays[:overflow]
+                del self._plays[:overflow]
+                self._pending -= len(dropped)
+                logger.error("Event buffer backlog full: dropped %d oldest play events", len(dropped))
+
+    def _dead_letter(self, kind, payload, error):
+        self.dead_letters.append({'kind': kind, 'event': payload, 'error': str(error)[:200]})
+        logger.error("Dropped %s event %r: %s", kind, payload, error)
+
+    def _drop_superseded(self, interactions, stamps):
+        """ สถานะที่ worker อื่นตั้งใหม่กว่า (stamp ใน cache มากกว่า) -> ไม่เขียนทับ ให้ worker นั้น flush เอง """
+        kept = defaultdict(dict)
+        for user_id, user_events in interactions.items():
+            shared = _shared_states(user_id, list(user_events))
+            for song_id, state in user_events.items():
+                other = shared.get(song_id)
+                if other is None or other[1] <= stamps.get((user_id, song_id), 0):
+                    kept[user_id][song_id] = state
+        return kept
+
+    def _drop_missing_songs(self, interactions, plays):
+        """
+        event ของเพลงที่ถูกลบไปแล้ว (FK จะพัง) -> ทิ้งก่อนเขียน ด้วย query เดียว
+        ยกเว้นเพลงที่ถูกรวมเข้ากับ keeper (redirect_songs) -> ย้าย event ไปที่ keeper
+        """
+        song_ids = {p['song_id'] for p in plays}
+        for user_events in interactions.values():
+            song_ids.update(user_events)
+        known = set(Song.objects.filter(song_id__in=song_ids).values_list('song_id', flat=True))
+        if known == song_ids:
+            return interactions, plays
+
+        redirects = _song_redirects(song_ids - known)
+        if redirects:
+            known.update(Song.objects.filter(song_id__in=set(redirects.values())).values_list('song_id', flat=True))
+
+        kept_interactions = defaultdict(dict)
+        for user_id, user_events in interactions.items():
+            for song_id, state in user_events.items():
+                if song_id in known:
+                    kept_interactions[user_id][song_id] = state
+        for user_id, user_events in interactions.items():
+            for song_id, state in user_events.items():
+                if song_id in known:
+                    continue
+                keeper_id = redirects.get(song_id)
+                if keeper_id in known:
+                    # สถานะที่ user ตั้งกับ keeper โดยตรงชนะ
+                    kept_interactions[user_id].setdefault(keeper_id, state)
+                elif state is not REMOVED:  # ลบ interaction ของเพลงที่ไม่มีแล้ว = ไม่ต้องทำอะไร
+                    self._dead_letter('interaction', (user_id, song_id, state), 'song no longer exists')
+        kept_plays = []
+        for play in plays:
+            if play['song_id'] not in known and redirects.get(play['song_id']) in known:
+                play = {**play, 'song_id': redirects[play['song_id']]}
+            if play['song_id'] in known:
+                kept_plays.append(play)
+            else:
+                self._dead_letter('play', play, 'song no longer exists')
+        return kept_interactions, kept_plays
+
+    def flush(self):
+        """ เขียนทุก event ที่ค้างอยู่ลง DB ใน transaction เดียว (ล้ม -> แยกเขียนทีละส่วน) """
+        with self._flush_lock:
+            interactions, plays, stamps = self._swap()
+            if not interactions and not plays:
+                return 0
+            interactions = self._drop_superseded(interactions, stamps)
+            try:
+                interactions, plays = self._drop_missing_songs(interactions, plays)
+                with transaction.atomic():
+                    return write_interactions(interactions) + write_plays(plays)
+            except TRANSIENT_DB_ERRORS as e:
+                logger.warning("Event flush failed (will retry): %s", e)
+                self._restore(interactions, plays, stamps)
+                return 0
+            except Exception:
+                logger.exception("Event batch flush failed; retrying per user / row")
+            return self._flush_isolated(interactions, plays, stamps)
+
+    def _flush_isolated(self, interactions, plays, stamps):
+        """
+        เขียนทีละ user (ล้มอีก -> ทีละแถว) และ play ทั้งก้อน (ล้ม -> ทีละแถว)
+        แถวที่ยังล้ม = dead letter; error ชั่วคราวระหว่างทาง -> คืนส่วนที่เหลือเข้า buffer
+        """
+        written = 0
+        units = [('interaction', {user_id: user_events}) for user_id, user_events in interactions.items()]
+        if plays:
+            units.append(('play', plays))
+
+        for n, (kind, unit) in enumerate(units):
+            try:
+                written += self._write_unit(kind, unit)
+            except TRANSIENT_DB_ERRORS as e:
+                logger.warning("Event flush failed (will retry): %s", e)
+                rest = units[n:]
+                self._restore(
+                    {u: events for k, part in rest if k == 'interaction' for u, events in part.items()},
+                    [p for k, part in rest if k == 'play' for p in part],
+                    stamps,
+                )
+                break
+        return written
+
+    def _write_unit(self, kind, unit):
+        try:
+            with transaction.atomic():
+                return write_interactions(unit) if kind == 'interaction' else write_plays(unit)
+        except TRANSIENT_DB_ERRORS:
+            raise
+        except Exception as e:
+            if kind == 'interaction':
+                rows = [({user_id: {song_id: state}}, (user_id, song_id, state))
+                        for user_id, user_events in unit.items() for song_id, state in user_events.items()]
+            else:
+                rows = [([play], play) for play in unit]
+            if len(rows) == 1:
+                self._dead_letter(kind, rows[0][1], e)
+                return 0
+            written = 0
+            for row, payload in rows:
+                try:
+                    with transaction.atomic():
+                        written += write_interactions(row) if kind == 'interaction' else write_plays(row)
+                except TRANSIENT_DB_ERRORS:
+                    raise
+                except Exception as row_error:
+                    self._dead_letter(kind, payload, row_error)
+            return written
+
+
+def write_plays(plays):
+    if plays:
+        PlayHistory.objects.bulk_create([PlayHistory(**p) for p in plays], batch_size=1000)
+    return len(plays)
+
+
+def write_interactions(interactions):
+    """
+    สถานะสุดท้ายของแต่ละ (user, song):
+    - ลบ -> DELETE ด้วย filter เดียว
+    - like/dislike/skip -> INSERT ... ON CONFLICT (user, song) DO UPDATE
+    - UserTasteProfile ถูกปรับตามการเปลี่ยนสถานะ like ก่อนเขียน และบันทึก LikeEvent ของทุกการเปลี่ยน
+    """
+    deltas = like_deltas({
+        (user_id, song_id): None if state is REMOVED else state[0]
+        for user_id, user_events in interactions.items()
+        for song_id, state in user_events.items()
+    })
+    apply_like_deltas(deltas)
+    if deltas:
+        LikeEvent.objects.bulk_create([
+            LikeEvent(user_id=user_id, song_id=song_id, liked=delta > 0)
+            for (user_id, song_id), delta in deltas.items()
+        ], batch_size=1000)
+
+    removed = Q()
+    new_rows = []
+    for user_id, user_events in interactions.items():
+        removed_ids = [song_id for song_id, state in user_events.items() if state is REMOVED]
+        if removed_ids:
+            removed |= Q(user_id=user_id, song_id__in=removed_ids)
+        for song_id, state in user_events.items():
+            if state is not REMOVED:
+                new_rows.append(Interaction(user_id=user_id, song_id=song_id, type=state[0], rating=state[1]))
+
+    if removed:
+        Interaction.objects.filter(removed).delete()
+    if new_rows:
+        upsert(Interaction, new_rows, unique_fields=['user', 'song'], update_fields=['type', 'rating'])
+    return sum(len(user_events) for user_events in interactions.values())
+
+
+event_buffer = EventBuffer()
+atexit.register(event_buffer.flush)
+
+
+# ==========================================
+# 🔎 READ HELPERS (consistent with the buffer)
+# ==========================================
+def current_interaction_type(user_id, song_id):
+    """ สถานะ interaction ปัจจุบัน (buffer ก่อน แล้วค่อย DB) """
+    found, state = event_buffer.get_interaction(user_id, song_id)
+    if found:
+        return None if state is REMOVED else state[0]
+    return Interaction.objects.filter(user_id=user_id, song_id=song_id).values_list('type', flat=True).first()
+
+
+def liked_song_ids(user, song_ids=None):
+    """
+    song_id ที่ user ชอบ (Interaction 'like' รวม FavoriteSong)
+    ส่ง song_ids มาเพื่อจำกัดเฉพาะเพลงที่กำลังแสดงผล
+    """
+    interactions = Interaction.objects.filter(user=user, type='like')
+    favorites = FavoriteSong.objects.filter(user=user)
+    if song_ids is not None:
+        interactions = interactions.filter(song_id__in=song_ids)
+        favorites = favorites.filter(song_id__in=song_ids)
+
+    liked_ids = event_buffer.overlay_likes(user.pk, set(interactions.values_list('song_id', flat=True)))
+    if song_ids is not None:
+        liked_ids &= set(song_ids)
+    liked_ids.update(favorites.values_list('song_id', flat=True))
+    return liked_ids
+
+
+# ==========================================
+# 📡 PLAYBACK BEACON
+# ==========================================
+class BeaconError(ValueError):
+    pass
+
+
+def decode_beacon(body, content_encoding=''):
+    """ อ่าน body ของ beacon (JSON หรือ gzip/deflate JSON) แบบจำกัดขนาด """
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('gzip', 'deflate'):
+        wbits = zlib.MAX_WBITS | 16 if encoding == 'gzip' else zlib.MAX_WBITS
+        decompressor = zlib.decompressobj(wbits)
+        try:
+            body = decompressor.decompress(body, MAX_BEACON_BYTES)
+        except zlib.error as e:
+            raise BeaconError(f"Bad compressed payload: {e}")
+        if decompressor.unconsumed_tail:
+            raise BeaconError("Payload too large")
+    elif encoding not in ('', 'identity'):
+        raise BeaconError(f"Unsupported encoding: {encoding}")
+
+    if len(body) > MAX_BEACON_BYTES:
+        raise BeaconError("Payload too large")
+    try:
+        payload = json.loads(body or b'{}')
+    except ValueError as e:
+        raise BeaconError(f"Invalid JSON: {e}")
+
+    events = payload.get('events') if isinstance(payload, dict) else None
+    if not isinstance(events, list):
+        raise BeaconError("'events' must be a list")
+    return events[:MAX_BEACON_EVENTS]
+
+
+def record_play_events(user_id, events, source='manual'):
+    """
+    ตรวจ event จาก beacon แล้วส่งเข้า buffer (flush เป็น bulk insert)
+    คืนจำนวน event ที่รับไว้
+    """
+    plays = []
+    for e in events:
+        if not isinstance(e, dict):
+            continue
+        try:
+            song_id = int(e.get('song_id'))
+        except (TypeError, ValueError):
+            continue
+        event = e.get('event') or 'play'
+        if event not in PLAY_EVENTS:
+            continue
+        try:
+            position = max(0, int(e['position'])) if e.get('position') is not None else None
+        except (TypeError, ValueError):
+            position = None
+        emotion = e.get('emotion')
+        plays.append(dict(
+            user_id=user_id,
+            song_id=song_id,
+            event=event,
+            position=position,
+            detected_emotion=str(emotion)[:50] if emotion else None,
+            source=str(e.get('source') or source)[:50],
+        ))
+
+    # ตัดเพลงที่ไม่มีอยู่จริงออกด้วย query เดียว
+    known_ids = set(Song.objects.filter(song_id__in={p['song_id'] for p in plays}).values_list('song_id', flat=True))
+    plays = [p for p in plays if p['song_id'] in known_ids]
+
+    event_buffer.add_plays(plays)
+    return len(plays)
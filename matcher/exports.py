@@ -0,0 +1,196 @@
+import csv
+from collections import namedtuple
+
+from django.db.models.constants import LOOKUP_SEP
+
+from .models import Song, Interaction, PlayHistory, UserScanLog
+
+# --- PARQUET (optional) ---
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+EXPORT_CHUNK_SIZE = 5000
+
+ExportSpec = namedtuple('ExportSpec', 'model pk columns time_field')
+
+# ชื่อ export -> ตาราง + คอลัมน์ (ชื่อ lookup แบบ values_list)
+EXPORTS = {
+    'interactions': ExportSpec(
+        Interaction, 'id',
+        ['id', 'user_id', 'song_id', 'type', 'rating', 'created_at'],
+        'created_at',
+    ),
+    'plays': ExportSpec(
+        PlayHistory, 'id',
+        ['id', 'user_id', 'song_id', 'event', 'position', 'source', 'detected_emotion', 'started_at'],
+        'started_at',
+    ),
+    'scans': ExportSpec(
+        UserScanLog, 'scan_id',
+        ['scan_id', 'user_id', 'detected_emotion', 'input_image', 'created_at'],
+        'created_at',
+    ),
+    'songs': ExportSpec(
+        Song, 'song_id',
+        [
+            'song_id', 'title', 'artist__name', 'album__title', 'json_genre', 'json_mood',
+            'spotify_id', 'valence', 'energy', 'tempo', 'danceability', 'created_at',
+        ],
+        'created_at',
+    ),
+}
+FORMATS = ('csv', 'parquet')
+
+
+# ==========================================
+# 📤 CHUNKED ROW READER
+# ==========================================
+def export_chunks(name, since=None, until=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    อ่านทีละ chunk ด้วย keyset บน primary key (WHERE pk > last ORDER BY pk LIMIT n)
+    แต่ละ chunk เป็น query สั้น ๆ แยกกัน จึงไม่ค้าง transaction/cursor ยาวระหว่างสตรีม
+    และใช้หน่วยความจำคงที่ไม่ว่าตารางจะใหญ่แค่ไหน
+    """
+    spec = EXPORTS[name]
+    qs = spec.model.objects.order_by(spec.pk)
+    if since:
+        qs = qs.filter(**{f'{spec.time_field}__gte': since})
+    if until:
+        qs = qs.filter(**{f'{spec.time_field}__lt': until})
+
+    pk_index = spec.columns.index(spec.pk)
+    last_pk = None
+    while True:
+        chunk = qs if last_pk is None else qs.filter(**{f'{spec.pk}__gt': last_pk})
+        rows = list(chunk.values_list(*spec.columns)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][pk_index]
+
+
+# ==========================================
+# 🧾 CSV
+# ==========================================
+class _Echo:
+    """ file-like ที่คืนค่าที่เขียนกลับมาเลย (สำหรับ csv.writer ใน generator) """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(name, **options):
+    """ Generator ของ CSV ทีละ chunk (BOM นำหน้าให้ Excel อ่านภาษาไทยถูก) """
+    spec = EXPORTS[name]
+    writer = csv.writer(_Echo())
+    yield '\ufeff' + writer.writerow(spec.columns)
+    for rows in export_chunks(name, **options):
+        yield ''.join(writer.writerow(row) for row in rows)
+
+
+# ==========================================
+# 🧱 PARQUET
+# ==========================================
+class _ByteSink:
+    """ Output stream ให้ ParquetWriter เขียนลง แล้วเราดึง bytes ออกไป yield ทีละ row group """
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _resolve_field(model, lookup):
+    """ หา field ปลายทางของ lookup แบบ values_list (เช่น 'artist__name', 'user_id') """
+    parts = lookup.split(LOOKUP_SEP)
+    for part in parts[:-1]:
+        model = model._meta.get_field(part).related_model
+    for field in model._meta.concrete_fields:
+        if parts[-1] in (field.name, field.attname):
+            return field.target_field if field.is_relation else field
+    return model._meta.get_field(parts[-1])
+
+
+def _arrow_type(model, lookup):
+    """ แปลงชนิด field ของ Django เป็นชนิดคอลัมน์ Arrow """
+    field = _resolve_field(model, lookup)
+    internal = field.get_internal_type()
+    if internal in ('AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField',
+                    'PositiveIntegerField', 'SmallIntegerField', 'PositiveSmallIntegerField'):
+        return pa.int64()
+    if internal == 'FloatField':
+        return pa.float64()
+    if internal == 'BooleanField':
+        return pa.bool_()
+    if internal == 'DateTimeField':
+        return pa.timestamp('us', tz='UTC')
+    if internal == 'DateField':
+        return pa.date32()
+    return pa.string()
+
+
+def parquet_schema(name):
+    spec = EXPORTS[name]
+    return pa.schema([(column, _arrow_type(spec.model, column)) for column in spec.columns])
+
+
+def stream_parquet(name, **options):
+    """ Generator ของไฟล์ Parquet: 1 chunk = 1 row group เขียนแล้ว yield ทันที """
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("Parquet export ต้องติดตั้ง pyarrow (pip install pyarrow)")
+
+    schema = parquet_schema(name)
+    sink = _ByteSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for rows in export_chunks(name, **options):
+            columns = list(zip(*rows))
+            table = pa.Table.from_arrays(
+                [pa.array(values, type=schema.field(i).type) for i, values in enumerate(columns)],
+                schema=schema,
+            )
+            writer.write_table(table)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(name, fmt='csv', **options):
+    """ options ส่งต่อให้ export_chunks (since / until / chunk_size) """
+    if name not in EXPORTS:
+        raise ValueError(f"Unknown export: {name}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    if fmt == 'parquet':
+        if not PYARROW_AVAILABLE:
+            raise ValueError("Parquet export ต้องติดตั้ง pyarrow")
+        return stream_parquet(name, **options)
+    return stream_csv(name, **options)
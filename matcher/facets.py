@@ -0,0 +1,100 @@
+import hashlib
+import json
+from collections import Counter
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
+from django.utils.functional import cached_property
+
+from .models import Song
+from .search import catalog_version
+
+FACET_CACHE_TIMEOUT = 60 * 30
+
+
+# ==========================================
+# 📊 MOOD / GENRE FACETS
+# ==========================================
+def filter_songs(qs, q='', genre='', mood=''):
+    """ ตัวกรองเดียวกับหน้า Song Database """
+    if q:
+        qs = qs.filter(
+            Q(title__icontains=q) |
+            Q(artist__name__icontains=q) |
+            Q(album__title__icontains=q)
+        )
+    if genre:
+        qs = qs.filter(json_genre__icontains=genre)
+    if mood:
+        qs = qs.filter(json_mood__icontains=mood)
+    return qs
+
+
+def compute_facets(qs):
+    """
+    นับจำนวนเพลงต่อ mood และ genre ด้วย grouped aggregate เดียว
+    (GROUP BY json_mood, json_genre) แล้วรวมผลใน Python
+    """
+    moods = Counter()
+    genres = Counter()
+    total = 0
+
+    rows = qs.order_by().values('json_mood', 'json_genre').annotate(n=Count('pk'))
+    for row in rows:
+        total += row['n']
+        if row['json_mood']:
+            moods[row['json_mood']] += row['n']
+        if row['json_genre']:
+            genres[row['json_genre']] += row['n']
+
+    return {
+        'total': total,
+        'moods': dict(moods),
+        'genres': dict(genres),
+    }
+
+
+def catalog_facets(**filters):
+    """
+    Facet counts ของเพลงที่ผ่านตัวกรอง (q / genre / mood) แบบ cache
+    cache key ผูกกับ catalog version จึงถูก invalidate อัตโนมัติเมื่อเพลงเปลี่ยน
+    """
+    filters = {k: v for k, v in filters.items() if v}
+    digest = hashlib.md5(json.dumps(filters, sort_keys=True).encode('utf-8')).hexdigest()
+    key = f"matcher:facets:{catalog_version()}:{digest}"
+
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filter_songs(Song.objects.all(), **filters))
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
+
+
+def count_matching(counts, name):
+    """
+    จำนวนเพลงที่ค่า facet มีคำว่า name อยู่ (ความหมายเดียวกับ icontains)
+    ใช้นับเพลงต่อ Category จาก facet counts ที่ cache ไว้ โดยไม่ต้อง query ต่อหมวด
+    """
+    needle = (name or '').lower()
+    return sum(n for value, n in counts.items() if needle in value.lower())
+
+
+def facet_options(all_counts, filtered_counts):
+    """ รายการ dropdown: ทุกค่าในแคตตาล็อก + จำนวนในผลลัพธ์ที่กรองอยู่ """
+    return [
+        {'value': value, 'count': filtered_counts.get(value, 0)}
+        for value in sorted(all_counts)
+    ]
+
+
+class CountedPaginator(Paginator):
+    """ Paginator ที่รู้จำนวนทั้งหมดอยู่แล้ว (จาก facet total) ไม่ต้องยิง COUNT(*) ซ้ำ """
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._known_count = count
+
+    @cached_property
+    def count(self):
+        return self._known_count
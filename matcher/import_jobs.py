@@ -0,0 +1,150 @@
+import datetime
+import threading
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ImportJob
+from .importer import IMPORT_BATCH_SIZE, SongImporter, iter_records
+
+STALE_AFTER = datetime.timedelta(minutes=10)  # worker ไม่ส่ง heartbeat นานเกินนี้ = ตายไปแล้ว
+MAX_JOB_ERRORS = 50                           # เก็บ error ราย batch ไว้ใน job สูงสุดเท่านี้
+
+_start_lock = threading.Lock()
+
+
+# ==========================================
+# 🚀 START / CANCEL
+# ==========================================
+def expire_stale_jobs():
+    """ job ที่ค้างสถานะ active แต่ไม่มีความคืบหน้า (เช่น server restart ระหว่างรัน) -> failed """
+    return ImportJob.objects.filter(
+        status__in=ImportJob.ACTIVE_STATUSES, updated_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status='failed', message='Worker stopped responding', finished_at=timezone.now())
+
+
+def start_import_job(path, user=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    สร้าง ImportJob แล้วรันใน thread เบื้องหลัง คืน (job, started)
+    รันได้ทีละ job — ถ้ามี job active อยู่แล้วคืน job นั้นกับ started=False
+    """
+    with _start_lock:
+        expire_stale_jobs()
+        active = ImportJob.objects.filter(status__in=ImportJob.ACTIVE_STATUSES).order_by('-id').first()
+        if active is not None:
+            return active, False
+        job = ImportJob.objects.create(source=path, created_by=user, batch_size=max(1, batch_size))
+
+    worker = threading.Thread(target=run_import_job, args=(job.pk,), name=f'import-job-{job.pk}', daemon=True)
+    transaction.on_commit(worker.start)  # ให้ thread เห็นแถว job ที่ commit แล้วเสมอ
+    return job, True
+
+
+def request_cancel(job):
+    """ ขอให้หยุด: worker เช็คธงนี้หลังทุก batch (batch ที่ commit ไปแล้วยังอยู่) """
+    if not job.is_active:
+        return False
+    ImportJob.objects.filter(pk=job.pk).update(cancel_requested=True)
+    job.cancel_requested = True
+    return True
+
+
+# ==========================================
+# 🧵 WORKER
+# ==========================================
+def _progress_fields(importer):
+    stats = importer.stats
+    return {
+        'processed': importer.processed,
+        'created': stats['created'],
+        'updated': stats['updated'],
+        'unchanged': stats['unchanged'],
+        'skipped': stats['skipped'],
+        'failed': stats['failed'],
+    }
+
+
+def run_import_job(job_id):
+    """ entry point ของ thread: 1 batch = 1 transaction + UPDATE ความคืบหน้า 1 ครั้ง """
+    try:
+        _run(job_id)
+    except Exception as e:
+        print(f"❌ Import job {job_id} crashed: {e}")
+    finally:
+        connection.close()  # connection ของ thread นี้
+
+
+def _run(job_id):
+    job = ImportJob.objects.get(pk=job_id)
+    jobs = ImportJob.objects.filter(pk=job_id)
+
+    def save(**fields):
+        # QuerySet.update ไม่แตะ auto_now -> ใส่ heartbeat เอง
+        jobs.update(updated_at=timezone.now(), **fields)
+
+    if job.cancel_requested:
+        save(status='cancelled', finished_at=timezone.now())
+        return
+    save(status='running', started_at=timezone.now())
+
+    importer = SongImporter(batch_size=job.batch_size, log=lambda msg: None)
+    errors = []
+    cancelled = False
+
+    def on_batch(offset, size, error):
+        nonlocal cancelled
+        if error is not None:
+            print(f"⚠️ Import job {job_id}: records {offset}-{offset + size - 1} failed: {error}")
+            if len(errors) < MAX_JOB_ERRORS:
+                errors.append({'offset': offset, 'records': size, 'error': str(error)[:500]})
+        save(errors=errors, **_progress_fields(importer))
+        cancelled = jobs.filter(cancel_requested=True).exists()
+        return not cancelled
+
+    try:
+        # นับจำนวน record ก่อน (สตรีมผ่านไฟล์ ไม่แตะ DB) เพื่อแสดงเป็น %
+        save(total_records=sum(1 for _ in iter_records(job.source)))
+        result = importer.run(iter_records(job.source), on_batch=on_batch, stop_on_error=False)
+    except Exception as e:
+        save(
+            status='failed', message=str(e)[:1000], finished_at=timezone.now(),
+            errors=errors, **_progress_fields(importer),
+        )
+        return
+
+    if cancelled:
+        status, message = 'cancelled', f"Cancelled after {result['processed']} records"
+    elif result['failed'] and result['failed'] >= result['processed']:
+        status, message = 'failed', "Every batch failed"
+    else:
+        status = 'succeeded'
+        message = (
+            f"Created: {result['created']}, Updated: {result['updated']}, "
+            f"Unchanged: {result['unchanged']}, Skipped: {result['skipped']}"
+        )
+        if result['failed']:
+            message += f", Failed: {result['failed']} ({len(errors)} batches)"
+    save(status=status, message=message, finished_at=timezone.now(), errors=errors, **_progress_fields(importer))
+
+
+def job_payload(job):
+    """ JSON ของสถานะ job สำหรับหน้า Admin (poll) """
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'source': job.source,
+        'total_records': job.total_records,
+        'processed': job.processed,
+        'percent': job.percent,
+        'created': job.created,
+        'updated': job.updated,
+        'unchanged': job.unchanged,
+        'skipped': job.skipped,
+        'failed': job.failed,
+        'errors': job.errors,
+        'cancel_requested': job.cancel_requested,
+        'message': job.message,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,422 @@
+import datetime
+import hashlib
+import json
+import re
+import time
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Artist, Album, Song, SongLyrics
+from .search import bump_catalog_version
+from .upserts import upsert, copy_insert, copy_update
+
+IMPORT_BATCH_SIZE = 500
+READ_CHUNK_SIZE = 64 * 1024   # อ่านไฟล์ทีละ 64KB
+
+# field ของ Song ที่ importer เขียน (นอกจาก title / artist)
+SONG_FIELDS = [
+    'album', 'release_date', 'image_url', 'genius_url',
+    'json_mood', 'json_genre', 'spotify_id', 'spotify_link',
+    'valence', 'energy', 'tempo', 'danceability', 'content_hash', 'mood_confidence',
+]
+AUDIO_FEATURE_FIELDS = ('valence', 'energy', 'tempo', 'danceability')
+
+
+def parse_release_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def content_hash(record):
+    """
+    sha256 ของ record ที่ parse แล้ว (JSON แบบ sort_keys -> ลำดับ key ในไฟล์ไม่มีผล)
+    ใช้เทียบกับ Song.content_hash ว่าเพลงเปลี่ยนจาก import ครั้งก่อนหรือไม่
+    """
+    payload = {
+        'title': record['title'],
+        'artist': record['artist'],
+        'album': record['album'],
+        'lyrics': record['lyrics'],
+        'fields': {k: v for k, v in record['fields'].items() if k not in ('content_hash', 'mood_confidence')},
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def parse_record(item):
+    """ แปลง 1 record ของ songdata.json เป็น dict ที่ importer ใช้ (None = ข้าม) """
+    if not isinstance(item, dict) or not item.get('title'):
+        return None
+    spotify_data = item.get('spotify') or {}
+    audio_features = item.get('audio_features') or {}
+    record = {
+        'title': item['title'],
+        'artist': item.get('artist') or 'Unknown Artist',
+        'album': item.get('album') or None,
+        'lyrics': item.get('lyrics') or '',
+        'fields': {
+            'release_date': parse_release_date(item.get('release_date')),
+            'image_url': item.get('image_url', ''),
+            'genius_url': item.get('url', ''),
+            'json_mood': item.get('mood', ''),
+            'json_genre': item.get('genre', ''),
+            'spotify_id': spotify_data.get('id') or None,
+            'spotify_link': spotify_data.get('link'),
+            'valence': audio_features.get('valence', 0.5),
+            'energy': audio_features.get('energy', 0.5),
+            'tempo': audio_features.get('tempo', 120.0),
+            'danceability': audio_features.get('danceability', 0.5),
+            'mood_confidence': None,  # mood จากไฟล์ต้นทาง ไม่ใช่ค่าที่โมเดลทาย
+        },
+    }
+    record['fields']['content_hash'] = content_hash(record)
+
+    # ไฟล์ต้นทางไม่มีค่า -> ไม่ส่ง field นั้นไปเขียน (ไม่ทับ feature จาก enrich_audio_features
+    # หรือ mood ที่ backfill_moods ทายไว้) — hash ยังคิดจากค่า default เหมือนเดิม
+    if not item.get('mood'):
+        del record['fields']['json_mood'], record['fields']['mood_confidence']
+    for feature in AUDIO_FEATURE_FIELDS:
+        if audio_features.get(feature) is None:
+            del record['fields'][feature]
+    return record
+
+
+def song_update_fields(fields):
+    """ field ของ Song ที่ record นี้เขียน (ตามลำดับ SONG_FIELDS) """
+    return ('title', 'artist', *[f for f in SONG_FIELDS if f in fields or f == 'album'])
+
+
+def chunked(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ==========================================
+# 📜 STREAMING JSON / JSONL READER
+# ==========================================
+_WHITESPACE = re.compile(r'\s*')
+
+
+def iter_json_array(fh, chunk_size=READ_CHUNK_SIZE):
+    """
+    อ่าน JSON array ทีละ element ด้วย JSONDecoder.raw_decode บน buffer ที่เลื่อนไปเรื่อย ๆ
+    หน่วยความจำใช้แค่ขนาด buffer + record เดียว ไม่ว่าไฟล์จะใหญ่แค่ไหน
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+
+    def read_more():
+        nonlocal buf, pos, eof
+        more = fh.read(chunk_size)
+        if not more:
+            eof = True
+            return False
+        buf, pos = buf[pos:] + more, 0
+        return True
+
+    def next_char():
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if not read_more():
+                raise ValueError("Unexpected end of JSON array")
+
+    if next_char() != '[':
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    if next_char() == ']':
+        return
+
+    while True:
+        next_char()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # ค่าจบพอดีขอบ buffer (เช่นตัวเลข) อาจยังอ่านไม่ครบ
+                if end < len(buf) or eof or not read_more():
+                    break
+            except json.JSONDecodeError:
+                if eof or not read_more():
+                    raise
+        pos = end
+        yield value
+
+        ch = next_char()
+        if ch == ']':
+            return
+        if ch != ',':
+            raise ValueError(f"Expected ',' or ']' but found {ch!r}")
+        pos += 1
+
+
+def iter_json_lines(fh):
+    """ JSON Lines: 1 record ต่อบรรทัด (ข้ามบรรทัดว่าง) """
+    for line in fh:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_records(path):
+    """ เปิดไฟล์แล้วเลือก parser ตามตัวอักษรแรก: '[' = JSON array, อื่น ๆ = JSON Lines """
+    with open(path, 'r', encoding='utf-8-sig') as fh:
+        first = ''
+        while not first.strip():
+            first = fh.read(1)
+            if not first:
+                return
+        fh.seek(0)
+        if first == '[':
+            yield from iter_json_array(fh)
+        else:
+            yield from iter_json_lines(fh)
+
+
+# ==========================================
+# 📥 BULK SONG IMPORTER
+# ==========================================
+class SongImporter:
+    """
+    นำเข้าเพลงเป็น batch (ใช้ร่วมกันทั้ง view import_songs_from_json และ importsongs.py)
+
+    - preload Artist / Album / Song key เข้า dict ครั้งเดียว แล้ว resolve ใน memory
+    - จับคู่เพลงด้วย spotify_id ก่อน ถ้าไม่มีใช้ (artist, title)
+    - แต่ละ batch: bulk_create ของใหม่ + bulk_update ของเดิม + upsert เนื้อเพลง
+      ใน transaction สั้น ๆ ของ batch นั้น
+    - เพลงเดิมที่ content_hash ตรงกับ record ไม่ถูกเขียนซ้ำ (นับเป็น unchanged)
+      re-import dump เดิมจึงเขียนเฉพาะส่วนที่เปลี่ยนจริง
+    - copy=True: แถวใหม่/แถวที่แก้เขียนด้วย Postgres COPY (ใช้กับงานโหลดก้อนใหญ่แบบ offline
+      ที่ไม่มีใครเขียน catalog พร้อมกัน เพราะ COPY ไม่มี ON CONFLICT)
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, log=print, copy=False):
+        self.batch_size = max(1, batch_size)
+        self.log = log
+        self.copy = copy
+        self.stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0}
+        self.processed = 0
+        self.started_at = None
+        self._loaded = False
+
+    # ---------- preload ----------
+    def preload(self):
+        self.artists = dict(Artist.objects.values_list('name', 'artist_id'))
+        self.albums = {
+            (artist_id, title): album_id
+            for album_id, artist_id, title in Album.objects.values_list('album_id', 'artist_id', 'title')
+        }
+        self.songs_by_spotify = {}
+        self.songs_by_key = {}
+        self.hashes = {}
+        rows = Song.objects.values_list('song_id', 'artist_id', 'title', 'spotify_id', 'content_hash')
+        for song_id, artist_id, title, spotify_id, digest in rows:
+            if spotify_id:
+                self.songs_by_spotify[spotify_id] = song_id
+            self.songs_by_key[(artist_id, title)] = song_id
+            if digest:
+                self.hashes[song_id] = digest
+        self.spotify_of = {song_id: sid for sid, song_id in self.songs_by_spotify.items()}
+        self._loaded = True
+
+    # ---------- run ----------
+    def run(self, items, on_batch=None, stop_on_error=True):
+        """
+        items = iterable ของ record ดิบ (list หรือ generator ก็ได้)
+        on_batch(offset, size, error) ถูกเรียกหลังทุก batch — คืน False เพื่อหยุดกลางทาง (เช่นถูกยกเลิก)
+        stop_on_error=False: batch ที่พังถูก rollback แล้วทำ batch ถัดไปต่อ (นับเป็น failed)
+        """
+        if not self._loaded:
+            self.preload()
+        self.started_at = time.monotonic()
+        try:
+            for batch in chunked(items, self.batch_size):
+                offset, error = self.processed, None
+                before = dict(self.stats)
+                try:
+                    self.import_batch(batch)
+                except Exception as e:
+                    if stop_on_error:
+                        raise
+                    error = e
+                    self.stats = before
+                    self.stats['failed'] += len(batch)
+                    self.preload()  # id ที่ cache ไว้จาก batch ที่ rollback ใช้ไม่ได้แล้ว
+                self.processed += len(batch)
+                self.log(f"   ⏳ Processed {self.processed} records ({self.records_per_sec:.0f} rec/s)")
+                if on_batch is not None and on_batch(offset, len(batch), error) is False:
+                    break
+        finally:
+            if self.stats['created'] or self.stats['updated']:
+                bump_catalog_version()  # bulk ops ไม่ยิง signal
+        return self.summary()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at if self.started_at else 0.0
+
+    @property
+    def records_per_sec(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return {
+            **self.stats,
+            'processed': self.processed,
+            'seconds': round(self.elapsed, 2),
+            'records_per_sec': round(self.records_per_sec, 1),
+        }
+
+    # ---------- batch ----------
+    def import_batch(self, items):
+        records = []
+        for item in items:
+            record = parse_record(item)
+            if record is None:
+                self.stats['skipped'] += 1
+            else:
+                records.append(record)
+        if not records:
+            return
+
+        with transaction.atomic():
+            self._ensure_artists({r['artist'] for r in records})
+            self._ensure_albums({(self.artists[r['artist']], r['album']) for r in records if r['album']})
+            self._write_songs(records)
+
+    def _ensure_artists(self, names):
+        missing = [name for name in names if name not in self.artists]
+        if not missing:
+            return
+        if self.copy:
+            copy_insert(Artist, [Artist(name=name) for name in missing])
+        else:
+            Artist.objects.bulk_create([Artist(name=name) for name in missing], ignore_conflicts=True)
+        # ignore_conflicts / COPY ไม่คืน pk -> อ่าน id กลับมาครั้งเดียว
+        self.artists.update(Artist.objects.filter(name__in=missing).values_list('name', 'artist_id'))
+
+    def _ensure_albums(self, keys):
+        missing = [key for key in keys if key not in self.albums]
+        if not missing:
+            return
+        albums = [Album(artist_id=artist_id, title=title) for artist_id, title in missing]
+        if self.copy:
+            copy_insert(Album, albums)
+            rows = Album.objects.filter(
+                artist_id__in={a for a, _ in missing}, title__in={t for _, t in missing},
+            ).order_by('album_id').values_list('artist_id', 'title', 'album_id')
+            self.albums.update(((artist_id, title), album_id) for artist_id, title, album_id in rows)
+            return
+        for album in Album.objects.bulk_create(albums):
+            self.albums[(album.artist_id, album.title)] = album.album_id
+
+    def _write_songs(self, records):
+        new_songs, new_spotify_songs, changed = {}, {}, {}
+        lyrics, update_fields = {}, {}
+        unchanged = 0
+
+        for r in records:
+            artist_id = self.artists[r['artist']]
+            fields = dict(r['fields'])
+            fields['album_id'] = self.albums.get((artist_id, r['album'])) if r['album'] else None
+            key = (artist_id, r['title'])
+            sid = fields['spotify_id']
+
+            song_id = (sid and self.songs_by_spotify.get(sid)) or self.songs_by_key.get(key)
+            if song_id and self.hashes.get(song_id) == fields['content_hash']:
+                # เหมือน import ครั้งก่อนทุก field -> ไม่ต้องเขียน
+                # (record ซ้ำก่อนหน้าใน batch เดียวกันที่ต่างออกไปก็ถูกยกเลิก: ตัวหลังชนะ)
+                changed.pop(song_id, None)
+                unchanged += 1
+                continue
+            if song_id and not sid:
+                # record ไม่มี spotify_id -> ไม่ลบค่าเดิมของเพลงทิ้ง
+                fields['spotify_id'] = self.spotify_of.get(song_id)
+            song = Song(song_id=song_id, title=r['title'], artist_id=artist_id, **fields)
+            if song_id:
+                changed[song_id] = song
+            elif sid:
+                new_spotify_songs[sid] = song   # record ซ้ำใน batch เดียวกัน: ตัวหลังชนะ
+            else:
+                new_songs[key] = song
+            lyrics[id(song)] = r['lyrics']
+            update_fields[id(song)] = song_update_fields(fields)
+
+        created = list(new_songs.values())
+        if created and self.copy:
+            copy_insert(Song, created)
+            self._reselect_song_ids(created)
+        elif created:
+            Song.objects.bulk_create(created)
+        upserted = []
+        if new_spotify_songs:
+            # spotify_id unique: ถ้ามี import อื่นเพิ่งใส่ไปก่อน ก็อัปเดตแทน (นับเป็น updated ไม่ใช่ created)
+            existing = set(
+                Song.objects.filter(spotify_id__in=list(new_spotify_songs)).values_list('spotify_id', flat=True)
+            )
+            for fields, songs in self._group_by_fields(new_spotify_songs.values(), update_fields):
+                for song in upsert(
+                    Song, songs, unique_fields=['spotify_id'], update_fields=fields, batch_size=self.batch_size,
+                ):
+                    (upserted if song.spotify_id in existing else created).append(song)
+        for fields, songs in self._group_by_fields(changed.values(), update_fields):
+            if self.copy:
+                copy_update(Song, songs, fields)
+            else:
+                Song.objects.bulk_update(songs, fields, batch_size=self.batch_size)
+
+        written = [*created, *upserted, *changed.values()]
+        for song in written:
+            if song.spotify_id:
+                self.songs_by_spotify[song.spotify_id] = song.song_id
+                self.spotify_of[song.song_id] = song.spotify_id
+            self.songs_by_key[(song.artist_id, song.title)] = song.song_id
+            self.hashes[song.song_id] = song.content_hash
+
+        # เนื้อเพลงเก็บแยกตาราง SongLyrics -> INSERT ... ON CONFLICT (song) DO UPDATE
+        rows = {
+            song.song_id: SongLyrics(song_id=song.song_id, text=lyrics[id(song)])
+            for song in written if song.song_id
+        }
+        if rows and self.copy:
+            # เพลงที่เพิ่ง COPY เข้าไปยังไม่มีเนื้อเพลงแน่นอน -> COPY ได้ / ที่เหลือยังต้อง upsert
+            new_ids = {song.song_id for song in new_songs.values()}
+            copy_insert(SongLyrics, [row for song_id, row in rows.items() if song_id in new_ids])
+            rows = {song_id: row for song_id, row in rows.items() if song_id not in new_ids}
+        if rows:
+            upsert(SongLyrics, list(rows.values()), unique_fields=['song'], update_fields=['text'], batch_size=self.batch_size)
+
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(changed) + len(upserted)
+        self.stats['unchanged'] += unchanged
+
+    @staticmethod
+    def _group_by_fields(songs, update_fields):
+        """ แยกเพลงตามชุด field ที่ต้องเขียน (record ที่ไม่มี mood / audio feature เขียนน้อยกว่า) """
+        groups = defaultdict(list)
+        for song in songs:
+            groups[update_fields[id(song)]].append(song)
+        return [(list(fields), group) for fields, group in groups.items()]
+
+    def _reselect_song_ids(self, songs):
+        """ COPY ไม่คืน pk -> อ่าน song_id ของเพลงที่เพิ่งเพิ่มกลับมาด้วย (artist, title) """
+        ids = {}
+        rows = Song.objects.filter(
+            artist_id__in={song.artist_id for song in songs}, title__in={song.title for song in songs},
+        ).order_by('song_id').values_list('artist_id', 'title', 'song_id')
+        for artist_id, title, song_id in rows:
+            ids[(artist_id, title)] = song_id  # ใหม่สุดชนะ
+        for song in songs:
+            song.song_id = ids[(song.artist_id, song.title)]
@@ -0,0 +1,111 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+# ==========================================
+# 🔑 KEYSET (SEEK) PAGINATION
+# ==========================================
+def _cursor_value(value):
+    # isoformat เต็ม (DjangoJSONEncoder ตัด microsecond ทำให้เทียบค่าเท่ากันไม่ได้)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=_cursor_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """ คืน list ค่าของ cursor หรือ None ถ้า token เสีย/ถูกแก้ """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def seek_filter(fields, values, descending=True):
+    """
+    (a, b) < (va, vb)  ->  a < va OR (a = va AND b < vb)
+    ใช้ index (a, b) ได้ตรง ๆ และไม่ต้อง OFFSET
+    """
+    op = 'lt' if descending else 'gt'
+    condition = Q()
+    for i, field in enumerate(fields):
+        step = Q(**{f'{field}__{op}': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            step &= Q(**{prev_field: prev_value})
+        condition |= step
+    return condition
+
+
+class KeysetPage:
+    """ หน้าหนึ่งของผลลัพธ์ + cursor สำหรับหน้าถัดไป/ก่อนหน้า """
+
+    def __init__(self, object_list, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def keyset_page(qs, fields, per_page, after=None, before=None):
+    """
+    แบ่งหน้าแบบ keyset เรียงจากใหม่ไปเก่าตาม fields (เช่น ('date_joined', 'id'))
+    - after:  cursor ของแถวสุดท้ายในหน้าก่อน -> หน้าถัดไป
+    - before: cursor ของแถวแรกในหน้าปัจจุบัน -> หน้าก่อนหน้า
+    ใช้ query เดียวต่อหน้า (ดึงเกิน 1 แถวเพื่อรู้ว่ามีหน้าต่อไหม) ไม่มี COUNT(*)
+    """
+    fields = list(fields)
+    after_values = decode_cursor(after, len(fields))
+    before_values = None if after_values else decode_cursor(before, len(fields))
+    try:
+        if after_values:
+            qs = qs.filter(seek_filter(fields, after_values, descending=True))
+        elif before_values:
+            qs = qs.filter(seek_filter(fields, before_values, descending=False))
+    except (ValidationError, ValueError, TypeError):
+        after_values = before_values = None  # cursor ใช้ไม่ได้ -> กลับไปหน้าแรก
+
+    if before_values:
+        rows = list(qs.order_by(*fields)[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next, has_previous = True, has_more
+    else:
+        rows = list(qs.order_by(*[f'-{f}' for f in fields])[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = after_values is not None
+
+    def cursor_of(row):
+        return encode_cursor(getattr(row, f) if not isinstance(row, dict) else row[f] for f in fields)
+
+    return KeysetPage(
+        rows,
+        next_cursor=cursor_of(rows[-1]) if rows and has_next else None,
+        prev_cursor=cursor_of(rows[0]) if rows and has_previous else None,
+    )
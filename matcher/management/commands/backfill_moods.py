@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from matcher.mood_model import PREDICT_BATCH_SIZE, MoodModelError, backfill_lyrics_moods
+
+
+class Command(BaseCommand):
+    help = "ทาย json_mood ของเพลงที่ยังไม่มี mood จากเนื้อเพลง (TF-IDF + Logistic Regression) แล้วเขียนกลับพร้อม mood_confidence"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, help="จำนวน process ตัดคำ (default = จำนวน CPU)")
+        parser.add_argument("--batch-size", type=int, default=PREDICT_BATCH_SIZE, help="เพลงต่อรอบ predict")
+        parser.add_argument("--min-confidence", type=float, default=0.0, help="เขียนเฉพาะผลที่ความมั่นใจ >= ค่านี้ (0-1)")
+        parser.add_argument("--holdout", type=float, default=0.0, help="แบ่งสัดส่วนนี้ไว้วัด accuracy ก่อน (เช่น 0.2)")
+        parser.add_argument("--repredict", action="store_true", help="ทายใหม่ทับ mood ที่โมเดลเคยทายไว้ด้วย")
+        parser.add_argument("--dry-run", action="store_true", help="สอน + ทาย แต่ไม่เขียน DB")
+
+    def handle(self, *args, **opts):
+        if not 0 <= opts["holdout"] < 1:
+            raise CommandError("--holdout ต้องอยู่ในช่วง 0 ถึง <1")
+        try:
+            stats = backfill_lyrics_moods(
+                workers=opts["workers"], batch_size=max(1, opts["batch_size"]),
+                min_confidence=opts["min_confidence"], holdout=opts["holdout"],
+                include_predicted=opts["repredict"], dry_run=opts["dry_run"], log=self.stdout.write,
+            )
+        except (MoodModelError, RuntimeError) as e:
+            raise CommandError(str(e))
+
+        prefix = "[dry-run] " if opts["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Predicted {stats['written']} / scanned {stats['scanned']} "
+            f"(below --min-confidence: {stats['low_confidence']})"
+        ))
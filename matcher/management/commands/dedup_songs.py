@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from matcher.dedup import DEFAULT_THRESHOLD, find_duplicates, merge_songs
+
+
+class Command(BaseCommand):
+    help = "หาเพลงซ้ำ (normalize ชื่อ/ศิลปิน + blocking keys + char n-gram similarity) แล้วเสนอหรือ merge"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="score ขั้นต่ำ (0-1)")
+        parser.add_argument("--output", help="เขียนคำแนะนำเป็น JSON Lines (แก้/ลบบรรทัดก่อน merge ได้)")
+        parser.add_argument("--merge", action="store_true", help="merge ตามคำแนะนำที่หาได้ทันที")
+        parser.add_argument("--from", dest="from_file", help="merge ตามไฟล์ JSON Lines จาก --output (ไม่หาใหม่)")
+        parser.add_argument("--show", type=int, default=50, help="จำนวนคำแนะนำที่แสดง")
+
+    def handle(self, *args, **opts):
+        if opts["from_file"]:
+            mapping = self.read_suggestions(opts["from_file"])
+        else:
+            if not 0 < opts["threshold"] <= 1:
+                raise CommandError("--threshold ต้องอยู่ในช่วง (0, 1]")
+            suggestions, stats = find_duplicates(opts["threshold"], log=self.stdout.write)
+            self.stdout.write(
+                f"{stats['pairs']} pairs >= {opts['threshold']} -> {stats['groups']} groups, "
+                f"{len(suggestions)} songs to merge"
+            )
+            for s in suggestions[:max(0, opts["show"])]:
+                self.stdout.write(f"  [{s.score:.2f}] #{s.duplicate_id} {s.duplicate}  ->  #{s.keeper_id} {s.keeper}")
+            if len(suggestions) > opts["show"]:
+                self.stdout.write(f"  ... และอีก {len(suggestions) - opts['show']} รายการ")
+
+            if opts["output"]:
+                with open(opts["output"], "w", encoding="utf-8") as f:
+                    for s in suggestions:
+                        f.write(json.dumps(s._asdict(), ensure_ascii=False) + "\n")
+                self.stdout.write(f"Suggestions saved to {opts['output']}")
+            if not opts["merge"]:
+                return
+            mapping = {s.duplicate_id: s.keeper_id for s in suggestions}
+
+        stats = merge_songs(mapping)
+        moved = ", ".join(f"{name} {n}" for name, n in stats["moved"].items())
+        dropped = ", ".join(f"{name} {n}" for name, n in stats["dropped"].items() if n)
+        self.stdout.write(self.style.SUCCESS(
+            f"Merged {stats['merged']} songs (moved: {moved or '-'}; dropped duplicates: {dropped or '-'})"
+        ))
+
+    def read_suggestions(self, path):
+        mapping = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for n, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                        mapping[int(row["duplicate_id"])] = int(row["keeper_id"])
+                    except (ValueError, KeyError, TypeError):
+                        raise CommandError(f"{path}:{n}: ต้องมี duplicate_id และ keeper_id")
+        except OSError as e:
+            raise CommandError(str(e))
+        return mapping
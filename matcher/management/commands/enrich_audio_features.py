@@ -0,0 +1,59 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from matcher.audio_features import (
+    SPOTIFY_API_BASE, SPOTIFY_AUTH_URL, DEFAULT_CACHE_DIR, MAX_IDS_PER_REQUEST,
+    AudioFeatureClient, AudioFeatureError, FeatureCache,
+    client_credentials_token, enrich_audio_features, songs_needing_features,
+)
+
+
+class Command(BaseCommand):
+    help = "เติม valence / energy / tempo / danceability จาก Spotify ให้เพลงที่มี spotify_id แต่ยังเป็นค่า default"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--api-base", default=SPOTIFY_API_BASE, help="เช่น http://127.0.0.1:8000 สำหรับ mock server")
+        parser.add_argument("--token", default=os.environ.get("SPOTIFY_ACCESS_TOKEN"),
+                            help="Bearer token (ไม่ใส่ = ขอด้วย SPOTIFY_CLIENT_ID / SPOTIFY_CLIENT_SECRET)")
+        parser.add_argument("--batch-size", type=int, default=MAX_IDS_PER_REQUEST, help=f"id ต่อ request (สูงสุด {MAX_IDS_PER_REQUEST})")
+        parser.add_argument("--workers", type=int, default=4, help="request พร้อมกัน")
+        parser.add_argument("--retries", type=int, default=5)
+        parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="ที่เก็บ response ดิบ")
+        parser.add_argument("--refresh", action="store_true", help="ไม่ใช้ cache (ยิง API ใหม่ทั้งหมด)")
+        parser.add_argument("--limit", type=int, help="จำนวนเพลงสูงสุดที่ตรวจในรอบนี้")
+
+    def handle(self, *args, **opts):
+        pending = songs_needing_features().count()
+        if not pending:
+            self.stdout.write(self.style.SUCCESS("ไม่มีเพลงที่ต้องเติม audio features"))
+            return
+
+        token = opts["token"]
+        client_id, client_secret = os.environ.get("SPOTIFY_CLIENT_ID"), os.environ.get("SPOTIFY_CLIENT_SECRET")
+        if not token and client_id and client_secret:
+            try:
+                token = client_credentials_token(client_id, client_secret, SPOTIFY_AUTH_URL)
+            except AudioFeatureError as e:
+                raise CommandError(str(e))
+        if not token and opts["api_base"].rstrip("/") == SPOTIFY_API_BASE.rstrip("/"):
+            raise CommandError("ต้องมี --token / SPOTIFY_ACCESS_TOKEN หรือ SPOTIFY_CLIENT_ID + SPOTIFY_CLIENT_SECRET")
+
+        self.stdout.write(f"Songs pending: {pending}")
+        client = AudioFeatureClient(opts["api_base"], token=token, retries=max(0, opts["retries"]))
+        stats = enrich_audio_features(
+            client, FeatureCache(opts["cache_dir"]),
+            batch_size=opts["batch_size"], workers=opts["workers"], refresh=opts["refresh"],
+            limit=opts["limit"], log=self.stdout.write,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {stats['updated']} / scanned {stats['scanned']} "
+            f"(cache hits {stats['cached']}, fetched {stats['fetched']} in {stats['requests']} requests, "
+            f"not found {stats['not_found']}, failed {stats['failed']})"
+        ))
+        if stats["updated"]:
+            self.stdout.write("Tip: รัน `python manage.py rebuild_taste_profiles` เพื่ออัปเดตค่าเฉลี่ย feature ของ user"
+                              " และ `python manage.py score_audio_moods` เพื่อคำนวณ mood_probs ใหม่")
+        if stats["failed"]:
+            raise CommandError(f"{stats['failed']} ids ดึงไม่สำเร็จ — รันซ้ำเพื่อทำต่อ (ที่สำเร็จแล้วอยู่ใน cache)")
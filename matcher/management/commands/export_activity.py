@@ -0,0 +1,53 @@
+# matcher/management/commands/export_activity.py
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from matcher.exports import EXPORTS, FORMATS, EXPORT_CHUNK_SIZE, stream_export
+from matcher.rollups import parse_range_bound
+
+
+class Command(BaseCommand):
+    help = "Export ข้อมูล (" + ", ".join(EXPORTS) + ") เป็น CSV หรือ Parquet แบบสตรีม (หน่วยความจำคงที่)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=list(EXPORTS), help="ชุดข้อมูลที่ต้องการ export")
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--output", "-o", help="ไฟล์ปลายทาง (CSV ไม่ระบุ = stdout)")
+        parser.add_argument("--since", help="เริ่มตั้งแต่วันที่ (YYYY-MM-DD หรือ ISO datetime)")
+        parser.add_argument("--until", help="ก่อนวันที่ (YYYY-MM-DD หรือ ISO datetime)")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="จำนวนแถวต่อ query")
+
+    def handle(self, *args, **opts):
+        try:
+            filters = {
+                "since": parse_range_bound(opts["since"]),
+                "until": parse_range_bound(opts["until"]),
+            }
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        fmt, output = opts["format"], opts["output"]
+        if fmt == "parquet" and not output:
+            raise CommandError("Parquet ต้องระบุ --output")
+
+        try:
+            stream = stream_export(opts["name"], fmt, chunk_size=max(1, opts["chunk_size"]), **filters)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if fmt == "parquet":
+            fh = open(output, "wb")
+        elif output:
+            fh = open(output, "w", encoding="utf-8", newline="")
+        else:
+            fh = sys.stdout
+        try:
+            for part in stream:
+                fh.write(part)
+        finally:
+            if fh is not sys.stdout:
+                fh.close()
+
+        if output:
+            self.stderr.write(self.style.SUCCESS(f"Exported {opts['name']} -> {output}"))
@@ -0,0 +1,41 @@
+# matcher/management/commands/import_songs.py
+import itertools
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from matcher.importer import IMPORT_BATCH_SIZE, SongImporter, iter_records
+
+
+class Command(BaseCommand):
+    help = "นำเข้าเพลงจากไฟล์ JSON array หรือ JSON Lines แบบสตรีม (หน่วยความจำคงที่ ต่อจากจุดที่พังได้ด้วย --start-at)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default=os.path.join(settings.BASE_DIR, "songdata.json"),
+                            help="ไฟล์ .json (array) หรือ .jsonl (default: songdata.json)")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="จำนวน record ต่อ batch/transaction")
+        parser.add_argument("--start-at", type=int, default=0, help="ข้าม N record แรก (ใช้ resume หลังพัง)")
+
+    def handle(self, *args, **opts):
+        path, start_at = opts["path"], max(0, opts["start_at"])
+        if not os.path.exists(path):
+            raise CommandError(f"ไม่พบไฟล์ {path}")
+
+        importer = SongImporter(batch_size=opts["batch_size"], log=self.stdout.write)
+        records = itertools.islice(iter_records(path), start_at, None)
+        if start_at:
+            self.stdout.write(f"⏩ เริ่มที่ record #{start_at}")
+
+        try:
+            result = importer.run(records)
+        except Exception as e:
+            # batch ที่ commit แล้วไม่ต้องทำซ้ำ: ต่อจาก record ถัดไปได้เลย
+            resume_at = start_at + importer.processed
+            raise CommandError(f"{e}\n   ↪ resume ด้วย --start-at {resume_at}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Created: {result['created']} | Updated: {result['updated']} "
+            f"| Unchanged: {result['unchanged']} | Skipped: {result['skipped']} "
+            f"| {result['processed']} records in {result['seconds']}s ({result['records_per_sec']} rec/s)"
+        ))
@@ -1,373 +1,421 @@
 # matcher/management/commands/import_workbook.py
+import re
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
+from django.db import connections, transaction
 from django.utils import timezone
-from django.utils.dateparse import parse_datetime, parse_date
+from django.utils.dateparse import parse_datetime
 
 from openpyxl import load_workbook # type: ignore
 
-from matcher.models import AppUser, Artist, Album, Genre, Song, SongGenre
-
-# Optional (มีค่อย import)
-try:
-    from matcher.models import Emotion, SongEmotion
-    HAS_EMOTION = True
-except Exception:
-    HAS_EMOTION = False
+from matcher.models import User, Artist, Album, Category, Song
+from matcher.importer import IMPORT_BATCH_SIZE, SongImporter, chunked
+from matcher.search import bump_catalog_version
+from matcher.upserts import copy_insert, copy_update
+from matcher.workbook import SHEET_ORDER, stage_workbook, read_staged
 
 
 # -------------------- utils --------------------
-def norm_key(s: str) -> str:
-    return "".join(c for c in (str(s or "")).lower() if c.isalnum())
-
-def pick(row: dict, candidates, default=""):
-    """หยิบค่าแรกที่พบตามชื่อคอลัมน์ที่เป็นไปได้ (ยืดหยุ่น)"""
-    keys = {norm_key(k): k for k in row.keys()}
-    for cand in candidates:
-        k = keys.get(norm_key(cand))
-        if k in row:
-            v = row.get(k)
-            if v is None:
-                return default
-            return str(v).strip() if not isinstance(v, (int, float)) else str(v)
-    return default
-
-def as_int(val, default=None):
+def password_value(raw):
+    """hash แบบ Django ใช้ได้ตรง ๆ / ค่าอื่นถือเป็นรหัสผ่านดิบแล้ว hash ให้"""
     try:
-        if val is None or val == "":
-            return default
-        return int(float(val))
-    except Exception:
-        return default
-
-def as_bool(val, default=None):
-    if val is None or val == "":
-        return default
-    s = str(val).strip().lower()
-    if s in {"1","true","t","yes","y"}: return True
-    if s in {"0","false","f","no","n"}: return False
-    return default
-
-def parse_dt(val):
-    """รองรับค่าจาก Excel (datetime) หรือสตริง"""
-    if not val:
-        return timezone.now()
-    if hasattr(val, "year") and hasattr(val, "month") and hasattr(val, "day"):
-        dt = val
-    else:
-        dt = parse_datetime(str(val))
-        if not dt:
-            d = parse_date(str(val))
-            if d:
-                from datetime import datetime
-                dt = datetime(d.year, d.month, d.day)
-    if not dt:
-        return timezone.now()
-    return dt if timezone.is_aware(dt) else timezone.make_aware(dt)
+        identify_hasher(raw)
+        return raw
+    except ValueError:
+        return make_password(raw)
 
-def sheet_dicts(ws):
-    rows = ws.iter_rows(values_only=True)
+def password_matches(raw, encoded):
+    """ค่าในไฟล์ตรงกับรหัสผ่านที่เก็บอยู่แล้วหรือไม่ (hash เทียบตรง ๆ / รหัสดิบตรวจด้วย check_password)"""
     try:
-        headers = [str(h).strip() if h is not None else "" for h in next(rows)]
-    except StopIteration:
-        return []
-    for r in rows:
-        yield {headers[i]: (r[i] if i < len(r) else None) for i in range(len(headers))}
-
-
-# -------------------- helpers สำหรับ users --------------------
-from uuid import UUID
-
-def find_existing_user(uid_str, email, username):
-    """พยายามหา user เดิม: user_id -> email -> username"""
-    if uid_str:
-        try:
-            return AppUser.objects.get(user_id=UUID(str(uid_str)))
-        except Exception:
-            pass
-    if email:
-        try:
-            return AppUser.objects.get(email=email)
-        except AppUser.DoesNotExist:
-            pass
-    if username:
-        try:
-            return AppUser.objects.get(username=username)
-        except AppUser.DoesNotExist:
-            pass
-    return None
-
-def unique_username(desired, exclude_id=None):
-    """คืนค่า username ที่ไม่ซ้ำ: alice -> alice_2 -> alice_3 ..."""
-    base = (desired or "user").strip() or "user"
-    uname = base
-    i = 2
-    qs = AppUser.objects.all()
-    if exclude_id:
-        qs = qs.exclude(user_id=exclude_id)
-    while qs.filter(username=uname).exists():
-        uname = f"{base}_{i}"
-        i += 1
-    return uname
-
-
-# -------------------- importers --------------------
-def import_users(ws):
-    seen = created = updated = renamed = 0
-    for i, row in enumerate(sheet_dicts(ws), start=2):
-        seen += 1
-        uid_str    = pick(row, ["user_id","id","uuid"])
-        email      = pick(row, ["email"])
-        username   = pick(row, ["username","user","login","name"])
-        pwd_hash   = pick(row, ["password_hash","password","passhash"])
-        status     = pick(row, ["status","state"], "active").lower()
-        created_at = parse_dt(pick(row, ["created_at","created","joined"]))
-
-        if not email or not username:
-            raise CommandError(f"[users] row {i}: ต้องมี email และ username")
-
-        status = status if status in {"active","suspended"} else "active"
-        existing = find_existing_user(uid_str, email, username)
-
-        if existing:
-            old_username = existing.username
-            new_username = username if username == old_username else unique_username(username, exclude_id=existing.user_id)
-            if new_username != old_username:
-                renamed += 1
-            existing.email = email or existing.email
-            existing.username = new_username
-            if pwd_hash:
-                existing.password_hash = pwd_hash
-            existing.status = status
-            if created_at:
-                existing.created_at = created_at
-            existing.save()
-            updated += 1
-        else:
-            final_username = unique_username(username)
-            defaults = {
-                "email": email,
-                "username": final_username,
-                "password_hash": pwd_hash,
-                "status": status,
-                "created_at": created_at,
-            }
-            if uid_str:
-                try:
-                    uid = UUID(uid_str)
-                except Exception:
-                    raise CommandError(f"[users] row {i}: user_id ไม่ใช่ UUID: {uid_str}")
-                AppUser.objects.create(user_id=uid, **defaults)
-            else:
-                AppUser.objects.create(**defaults)
-            created += 1
+        identify_hasher(raw)
+        return raw == encoded
+    except ValueError:
+        return check_password(raw, encoded)
+
+def aware(value):
+    """ISO datetime จากไฟล์ staged -> aware datetime"""
+    if not value:
+        return None
+    dt = parse_datetime(value)
+    return dt if timezone.is_aware(dt) else timezone.make_aware(dt)
 
+def field_limits():
+    """max_length ของ field ข้อความแต่ละ sheet (ส่งให้ worker ใช้ validate โดยไม่ต้อง import models)"""
+    models = {
+        "users": {"email": (User, "email"), "username": (User, "username"), "gender": (User, "gender")},
+        "artists": {"name": (Artist, "name"), "image_url": (Artist, "image_url")},
+        "albums": {"title": (Album, "title"), "artist": (Artist, "name"), "image_url": (Album, "image_url")},
+        "songs": {
+            "title": (Song, "title"), "artist": (Artist, "name"), "album": (Album, "title"),
+            "image_url": (Song, "image_url"), "url": (Song, "genius_url"), "mood": (Song, "json_mood"),
+            "genre": (Song, "json_genre"), "spotify_id": (Song, "spotify_id"), "spotify_link": (Song, "spotify_link"),
+        },
+        "genres": {"name": (Category, "name")},
+        "song_genres": {"name": (Song, "json_genre")},
+        "emotions": {"name": (Category, "name")},
+        "song_emotions": {"name": (Song, "json_mood")},
+    }
     return {
-        "users_seen": seen,
-        "users_created": created,
-        "users_updated": updated,
-        "users_renamed": renamed,
+        sheet: {field: model._meta.get_field(name).max_length for field, (model, name) in fields.items()}
+        for sheet, fields in models.items()
     }
 
-def import_artists(ws):
-    seen = created = 0
-    for i, row in enumerate(sheet_dicts(ws), start=2):
-        name = pick(row, ["name","artist","artist_name"])
-        if not name: 
-            continue
-        _, c = Artist.objects.get_or_create(name=name)
-        seen += 1; created += 1 if c else 0
-    return {"artists_seen": seen, "artists_created": created}
-
-def import_albums(ws):
-    seen = created = updated = 0
-    for i, row in enumerate(sheet_dicts(ws), start=2):
-        title = pick(row, ["title","album","album_title"])
-        if not title: 
-            continue
-        artist_name = pick(row, ["artist","artist_name"])
-        year = as_int(pick(row, ["year","release_year"]))
-        cover_url = pick(row, ["cover_url","cover"])  # โมเดลคุณอาจไม่มี ฟังก์ชันจะข้ามให้
-        if not artist_name:
-            continue
-        artist, _ = Artist.objects.get_or_create(name=artist_name)
-        alb, c = Album.objects.get_or_create(artist=artist, title=title, defaults={"year": year})
-        if not c:
-            changed = False
-            if year is not None and getattr(alb, "year", None) != year:
-                alb.year = year; changed = True
-            if cover_url and hasattr(alb, "cover_url") and getattr(alb, "cover_url", None) != cover_url:
-                alb.cover_url = cover_url; changed = True
-            if changed: 
-                alb.save()
-                updated += 1
-        else:
-            created += 1
-        seen += 1
-    return {"albums_seen": seen, "albums_created": created, "albums_updated": updated}
-
-def import_genres(ws):
-    seen = created = 0
-    for i, row in enumerate(sheet_dicts(ws), start=2):
-        name = pick(row, ["name","genre"])
-        if not name:
-            continue
-        _, c = Genre.objects.get_or_create(name=name)
-        seen += 1; created += 1 if c else 0
-    return {"genres_seen": seen, "genres_created": created}
-
-def import_songs(ws):
-    seen = created = updated = 0
-    for i, row in enumerate(sheet_dicts(ws), start=2):
-        title = pick(row, ["title","song","song_title"])
-        artist_name = pick(row, ["artist","artist_name"])
-        album_title = pick(row, ["album","album_title"])
-        if not title or not artist_name:
-            continue
-        artist, _ = Artist.objects.get_or_create(name=artist_name)
-        album = None
-        if album_title:
-            album, _ = Album.objects.get_or_create(artist=artist, title=album_title)
-
-        obj, c = Song.objects.get_or_create(title=title, artist=artist, album=album)
-
-        # ฟิลด์เสริม (มีในโมเดลค่อยเซฟ)
-        for attr, val in [
-            ("duration_sec", as_int(pick(row, ["duration","duration_sec","length_sec"]))),
-            ("platform", pick(row, ["platform"])),
-            ("external_id", pick(row, ["external_id","ext_id"])),
-            ("is_active", as_bool(pick(row, ["is_active","active"]), True)),
-            ("lyrics", pick(row, ["lyrics","lyric"])),
-        ]:
-            if hasattr(obj, attr) and val not in (None, "") and getattr(obj, attr, None) != val:
-                setattr(obj, attr, val)
-
-        created_at = parse_dt(pick(row, ["created_at","added_at","created"]))
-        if hasattr(obj, "created_at") and created_at and getattr(obj, "created_at", None) in (None, ""):
-            obj.created_at = created_at
-
-        # บันทึกถ้ามีการเปลี่ยน
-        obj.save()
-
-        seen += 1; created += 1 if c else 0; updated += 0 if c else 1
-    return {"songs_seen": seen, "songs_created": created, "songs_updated": updated}
-
-def import_song_genres(ws):
-    seen = created = 0
-    for i, row in enumerate(sheet_dicts(ws), start=2):
-        title = pick(row, ["song_title","title","song"])
-        artist_name = pick(row, ["artist","artist_name"])
-        genre_name = pick(row, ["genre","genre_name","name"])
-        if not title or not artist_name or not genre_name:
-            continue
-        artist, _ = Artist.objects.get_or_create(name=artist_name)
-        try:
-            song = Song.objects.get(title=title, artist=artist)
-        except Song.DoesNotExist:
-            continue
-        genre, _ = Genre.objects.get_or_create(name=genre_name)
-        _, c = SongGenre.objects.get_or_create(song=song, genre=genre)
-        seen += 1; created += 1 if c else 0
-    return {"song_genres_seen": seen, "song_genres_created": created}
-
-def import_emotions(ws):
-    if not HAS_EMOTION:
-        return {"emotions_seen": 0, "emotions_created": 0}
-    seen = created = 0
-    for i, row in enumerate(sheet_dicts(ws), start=2):
-        name = pick(row, ["name","emotion"])
-        if not name:
-            continue
-        _, c = Emotion.objects.get_or_create(name=name)
-        seen += 1; created += 1 if c else 0
-    return {"emotions_seen": seen, "emotions_created": created}
-
-def import_song_emotions(ws):
-    if not HAS_EMOTION:
-        return {"song_emotions_seen": 0, "song_emotions_created": 0}
-    from decimal import Decimal, InvalidOperation
-    seen = created = 0
-    for i, row in enumerate(sheet_dicts(ws), start=2):
-        title = pick(row, ["song_title","title","song"])
-        artist_name = pick(row, ["artist","artist_name"])
-        emotion_name = pick(row, ["emotion","emotion_name"])
-        conf = pick(row, ["confidence","conf"])
-        source = pick(row, ["source"], "manual").lower()
-        if not title or not artist_name or not emotion_name:
-            continue
-        artist, _ = Artist.objects.get_or_create(name=artist_name)
-        try:
-            song = Song.objects.get(title=title, artist=artist)
-        except Song.DoesNotExist:
-            continue
-        emo, _ = Emotion.objects.get_or_create(name=emotion_name)
-        try:
-            conf_val = Decimal(str(conf)) if conf not in ("", None) else None
-        except InvalidOperation:
-            conf_val = None
-        _, c = SongEmotion.objects.update_or_create(
-            song=song, emotion=emo,
-            defaults={
-                "confidence": conf_val or 0.800,
-                "source": source if source in {"ml","rule","manual"} else "manual",
-            }
-        )
-        seen += 1; created += 1 if c else 0
-    return {"song_emotions_seen": seen, "song_emotions_created": created}
 
+USER_UPDATE_FIELDS = ["email", "username", "password", "is_active", "status", "date_joined", "age", "gender"]
+
+
+# -------------------- loader --------------------
+class WorkbookImporter:
+    """
+    โหลด record ที่ผ่านการ parse/validate แล้ว (ไฟล์ staged) เข้า DB ทีละ sheet เป็น batch
+    - lookup ทั้งหมด (artist / album / song / username / email / category) โหลดเข้า dict ครั้งเดียว
+    - แถวใหม่เขียนด้วย COPY (Postgres) แล้วอ่าน id กลับ / แถวเดิมอัปเดตผ่านตารางชั่วคราว + UPDATE ... FROM
+    - เพลงใช้ SongImporter ตัวเดียวกับ import_songs (copy=True, content hash)
+    - sheet genres / emotions -> Category (GENRE / MOOD), song_genres / song_emotions -> Song.json_genre / json_mood
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, log=print):
+        self.batch_size = max(1, batch_size)
+        self.log = log
+        self.songs = SongImporter(batch_size=self.batch_size, log=lambda msg: None, copy=True)
+        self.songs.preload()
+        self.users_by_email = {}
+        self.users_by_username = {}
+        for user_id, email, username in User.objects.values_list("id", "email", "username"):
+            if email:
+                self.users_by_email.setdefault(email.lower(), user_id)
+            self.users_by_username[username] = user_id
+        self.usernames = set(self.users_by_username)
+        self.categories = {
+            (ctype, name.lower()): cat_id
+            for cat_id, ctype, name in Category.objects.values_list("category_id", "type", "name")
+        }
+        self.catalog_changed = False
+
+    # artists / albums ใช้ cache ของ SongImporter ร่วมกัน
+    @property
+    def artists(self):
+        return self.songs.artists
+
+    @property
+    def albums(self):
+        return self.songs.albums
+
+    def load(self, sheet, records):
+        """โหลด 1 sheet ใน transaction ของตัวเอง"""
+        with transaction.atomic():
+            return getattr(self, f"import_{sheet}")(records)
+
+    # ---------- users ----------
+    def unique_username(self, desired, current=None):
+        """
+        alice -> alice_2 -> alice_3 ... (เช็คจาก set ใน memory)
+        current = username ปัจจุบันของ user ที่กำลังอัปเดต: ถ้าเป็น alice / alice_N อยู่แล้วก็ใช้ชื่อเดิม
+        (import ซ้ำจะไม่สลับชื่อไปมา)
+        """
+        base = (desired or "user").strip() or "user"
+        if current and (current == base or re.fullmatch(rf"{re.escape(base)}_\d+", current)):
+            return current
+        uname, i = base, 2
+        while uname in self.usernames and uname != current:
+            uname = f"{base}_{i}"
+            i += 1
+        return uname
+
+    def import_users(self, records):
+        seen = created = updated = renamed = 0
+        for batch in chunked(records, self.batch_size):
+            existing = User.objects.in_bulk({
+                self.users_by_email.get(r["email"].lower()) or self.users_by_username.get(r["username"])
+                for r in batch
+            } - {None})
+            new_users, touched, original = {}, {}, {}
+            for r in batch:
+                seen += 1
+                email, username = r["email"], r["username"]
+                user_id = self.users_by_email.get(email.lower()) or self.users_by_username.get(username)
+                user = existing.get(user_id) or new_users.get(email.lower())
+                if user is None:
+                    user = User(username=self.unique_username(username), email=email, password=make_password(None))
+                    new_users[email.lower()] = user
+                    self.usernames.add(user.username)
+                elif user.pk:
+                    touched[user.pk] = user
+                    original.setdefault(user.pk, [getattr(user, f) for f in USER_UPDATE_FIELDS])
+                if username != user.username and user.pk:
+                    # เปลี่ยน username ของ user เดิม: ชนกับคนอื่นก็ต่อท้ายเลข
+                    owner = self.users_by_username.get(username)
+                    new_name = username if owner in (None, user.pk) else self.unique_username(username, user.username)
+                    if new_name != user.username:
+                        self.usernames.discard(user.username)
+                        self.users_by_username.pop(user.username, None)
+                        user.username = new_name
+                        self.usernames.add(new_name)
+                        self.users_by_username[new_name] = user.pk
+                        renamed += 1
+                user.email = email
+                if r["password"] and not (user.pk and password_matches(r["password"], user.password)):
+                    user.password = password_value(r["password"])
+                active = r["status"].lower() != "suspended"
+                user.is_active = active
+                user.status = "Active" if active else "Suspended"
+                if r["created_at"]:
+                    user.date_joined = aware(r["created_at"])
+                if r["age"] is not None:
+                    user.age = r["age"]
+                if r["gender"]:
+                    user.gender = r["gender"]
+
+            if new_users:
+                copy_insert(User, new_users.values())
+                # COPY ไม่คืน pk -> อ่าน id กลับด้วย username (unique)
+                for user_id, username, email in User.objects.filter(
+                    username__in=[u.username for u in new_users.values()]
+                ).values_list("id", "username", "email"):
+                    self.users_by_email.setdefault(email.lower(), user_id)
+                    self.users_by_username[username] = user_id
+            # นับ/เขียนเฉพาะ user ที่มีค่าเปลี่ยนจริง
+            changed = [
+                user for pk, user in touched.items()
+                if [getattr(user, f) for f in USER_UPDATE_FIELDS] != original[pk]
+            ]
+            if changed:
+                copy_update(User, changed, USER_UPDATE_FIELDS)
+            created += len(new_users)
+            updated += len(changed)
+
+        return {
+            "users_seen": seen,
+            "users_created": created,
+            "users_updated": updated,
+            "users_renamed": renamed,
+        }
+
+    # ---------- artists / albums ----------
+    def import_artists(self, records):
+        seen = created = updated = 0
+        for batch in chunked(records, self.batch_size):
+            images = {}
+            for r in batch:
+                seen += 1
+                images[r["name"]] = r["image_url"] or images.get(r["name"])
+            missing = {name for name in images if name not in self.artists}
+            self.songs._ensure_artists(images)
+            created += len(missing)
+
+            artists = Artist.objects.in_bulk([self.artists[name] for name, url in images.items() if url])
+            changed = []
+            for artist in artists.values():
+                if artist.image_url != images[artist.name]:
+                    artist.image_url = images[artist.name]
+                    changed.append(artist)
+            copy_update(Artist, changed, ["image_url"])
+            updated += len([a for a in changed if a.name not in missing])
+        return {"artists_seen": seen, "artists_created": created, "artists_updated": updated}
+
+    def import_albums(self, records):
+        seen = created = updated = 0
+        for batch in chunked(records, self.batch_size):
+            values = {}
+            for r in batch:
+                seen += 1
+                values[(r["artist"], r["title"])] = {
+                    "release_date": r["release_date"],
+                    "image_url": r["image_url"] or None,
+                }
+            self.songs._ensure_artists({artist_name for artist_name, _ in values})
+            keys = {(self.artists[artist_name], title): v for (artist_name, title), v in values.items()}
+            missing = {key for key in keys if key not in self.albums}
+            self.songs._ensure_albums(keys)
+            created += len(missing)
+
+            albums = Album.objects.in_bulk([self.albums[key] for key in keys])
+            changed = []
+            for album in albums.values():
+                v = keys[(album.artist_id, album.title)]
+                dirty = False
+                for attr in ("release_date", "image_url"):
+                    value = v[attr]
+                    if value is not None and str(getattr(album, attr)) != value:
+                        setattr(album, attr, value)
+                        dirty = True
+                if dirty:
+                    changed.append(album)
+            copy_update(Album, changed, ["release_date", "image_url"])
+            updated += len([a for a in changed if (a.artist_id, a.title) not in missing])
+        return {"albums_seen": seen, "albums_created": created, "albums_updated": updated}
+
+    # ---------- songs ----------
+    def import_songs(self, records):
+        def items():
+            for r in records:
+                # แปลงเป็นรูปแบบเดียวกับ songdata.json แล้วให้ SongImporter จัดการ
+                yield {
+                    "title": r["title"],
+                    "artist": r["artist"],
+                    "album": r["album"] or None,
+                    "lyrics": r["lyrics"],
+                    "release_date": r["release_date"],
+                    "image_url": r["image_url"],
+                    "url": r["url"],
+                    "mood": r["mood"],
+                    "genre": r["genre"],
+                    "spotify": {"id": r["spotify_id"] or None, "link": r["spotify_link"] or None},
+                    "audio_features": {
+                        key: r[key] for key in ("valence", "energy", "tempo", "danceability") if r[key] is not None
+                    },
+                }
+
+        before = dict(self.songs.stats)
+        self.songs.run(items())
+        stats = {k: self.songs.stats[k] - before[k] for k in before}
+        return {
+            "songs_seen": stats["created"] + stats["updated"] + stats["unchanged"],
+            "songs_created": stats["created"],
+            "songs_updated": stats["updated"],
+            "songs_unchanged": stats["unchanged"],
+        }
+
+    # ---------- categories ----------
+    def ensure_categories(self, ctype, names):
+        missing = {}
+        for name in names:
+            if (ctype, name.lower()) not in self.categories:
+                missing.setdefault(name.lower(), name)
+        if missing:
+            for cat in Category.objects.bulk_create([Category(name=name, type=ctype) for name in missing.values()]):
+                self.categories[(ctype, cat.name.lower())] = cat.category_id
+        return len(missing)
+
+    def import_categories(self, records, ctype, prefix):
+        seen = created = 0
+        for batch in chunked(records, self.batch_size):
+            seen += len(batch)
+            created += self.ensure_categories(ctype, [r["name"] for r in batch])
+        return {f"{prefix}_seen": seen, f"{prefix}_created": created}
+
+    def import_song_links(self, records, ctype, field, prefix):
+        """ผูกเพลงกับ genre/mood: เขียน Song.json_genre / json_mood (COPY ลงตารางชั่วคราว + UPDATE ... FROM)"""
+        seen = linked = unmatched = 0
+        for batch in chunked(records, self.batch_size):
+            values = {}
+            for r in batch:
+                seen += 1
+                song_id = self.songs.songs_by_key.get((self.artists.get(r["artist"]), r["title"]))
+                if song_id:
+                    values[song_id] = r["name"]
+                else:
+                    unmatched += 1
+            self.ensure_categories(ctype, set(values.values()))
+            if values:
+                copy_update(Song, [Song(song_id=song_id, **{field: name}) for song_id, name in values.items()], [field])
+                self.catalog_changed = True
+            linked += len(values)
+        return {f"{prefix}_seen": seen, f"{prefix}_linked": linked, f"{prefix}_unmatched": unmatched}
+
+    def import_genres(self, records):
+        return self.import_categories(records, "GENRE", "genres")
+
+    def import_song_genres(self, records):
+        return self.import_song_links(records, "GENRE", "json_genre", "song_genres")
+
+    def import_emotions(self, records):
+        return self.import_categories(records, "MOOD", "emotions")
+
+    def import_song_emotions(self, records):
+        return self.import_song_links(records, "MOOD", "json_mood", "song_emotions")
 
-# -------------------- command --------------------
-SHEET_FUNCS = {
-    "users": import_users,
-    "artists": import_artists,
-    "albums": import_albums,
-    "songs": import_songs,
-    "genres": import_genres,
-    "song_genres": import_song_genres,
-    "emotions": import_emotions,
-    "song_emotions": import_song_emotions,
-}
 
+# -------------------- command --------------------
 class Command(BaseCommand):
-    help = "Import supported sheets from an Excel workbook (.xlsx). Sheets: " + ", ".join(SHEET_FUNCS.keys())
+    help = (
+        "Import supported sheets from an Excel workbook (.xlsx). Sheets: " + ", ".join(SHEET_ORDER)
+        + " — parse ทุก sheet พร้อมกันใน process pool เป็นไฟล์ staged แล้วโหลดเข้า DB ตามลำดับ dependency"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument("xlsx_path", help="Path to .xlsx file")
         parser.add_argument("--only", nargs="*", help="Import only these sheets (e.g. users artists songs)")
-        parser.add_argument("--dry-run", action="store_true", help="Parse only, no DB writes")
+        parser.add_argument("--dry-run", action="store_true", help="Parse + validate only, no DB access")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="จำนวนแถวต่อ batch")
+        parser.add_argument("--workers", type=int, default=None, help="จำนวน process สำหรับ parse (default: จำนวน CPU)")
+        parser.add_argument("--stage-dir", help="โฟลเดอร์เก็บไฟล์ staged (default: โฟลเดอร์ชั่วคราว ลบทิ้งเมื่อเสร็จ)")
+        parser.add_argument("--skip-invalid", action="store_true", help="โหลดต่อโดยข้ามแถวที่ validate ไม่ผ่าน")
 
-    @transaction.atomic
     def handle(self, *args, **opts):
         path = opts["xlsx_path"]
         only = set([s.lower() for s in (opts["only"] or [])])
         dry  = opts["dry_run"]
 
         try:
-            wb = load_workbook(filename=path, data_only=True, read_only=True)
+            wb = load_workbook(filename=path, read_only=True)
+            sheetnames = set(wb.sheetnames)
+            wb.close()
         except FileNotFoundError:
             raise CommandError(f"ไม่พบไฟล์: {path}")
         except Exception as e:
             raise CommandError(f"เปิดไฟล์ไม่ได้: {e}")
 
-        # ลำดับที่ปลอดภัย (users -> artists -> albums -> songs -> genres -> song_genres -> emotions -> song_emotions)
-        order = [k for k in ["users","artists","albums","songs","genres","song_genres","emotions","song_emotions"] if k in SHEET_FUNCS]
-        summary = {}
-        for name in order:
-            if only and name not in only:
-                continue
-            if name not in wb.sheetnames:
-                continue
-            ws = wb[name]
-            res = SHEET_FUNCS[name](ws)
-            summary.update(res)
+        sheets = [name for name in SHEET_ORDER if name in sheetnames and (not only or name in only)]
+        if not sheets:
+            raise CommandError("ไม่พบ sheet ที่รองรับ: " + ", ".join(SHEET_ORDER))
 
-        lines = ["=== Import summary ==="] + [f"{k}: {summary[k]}" for k in sorted(summary.keys())]
-        out = "\n".join(lines)
+        stage_dir = opts["stage_dir"] or tempfile.mkdtemp(prefix="workbook_")
+        try:
+            self.run(path, sheets, stage_dir, opts, dry)
+        finally:
+            if not opts["stage_dir"]:
+                shutil.rmtree(stage_dir, ignore_errors=True)
+
+    def run(self, path, sheets, stage_dir, opts, dry):
+        # ---------- 1) stage: parse + validate ขนานกัน (ไม่แตะ DB) ----------
+        started = time.monotonic()
+        limits = field_limits()
+        connections.close_all()  # ไม่ส่ง connection ที่เปิดค้างต่อให้ process ลูก
+        staged = stage_workbook(path, sheets, stage_dir, limits, workers=opts["workers"])
+        self.stdout.write(f"📦 Staged {len(sheets)} sheets in {time.monotonic() - started:.1f}s -> {stage_dir}")
+
+        invalid = 0
+        for sheet in sheets:
+            result = staged[sheet]
+            invalid += result["invalid"]
+            self.stdout.write(f"   {sheet}: {result['rows']} rows, {result['invalid']} invalid ({result['seconds']}s)")
+            for error in result["errors"]:
+                self.stdout.write(self.style.ERROR(f"      [{sheet}] row {error['row']}: {error['error']}"))
+            if result["invalid"] > len(result["errors"]):
+                self.stdout.write(f"      ... และอีก {result['invalid'] - len(result['errors'])} แถว")
 
         if dry:
-            self.stdout.write(self.style.WARNING("[DRY-RUN] ไม่ได้เขียน DB"))
-            self.stdout.write(out)
-            transaction.set_rollback(True)
+            style = self.style.WARNING if invalid else self.style.SUCCESS
+            self.stdout.write(style(f"[DRY-RUN] ไม่ได้เขียน DB — พบแถวไม่ผ่าน validation {invalid} แถว"))
             return
+        if invalid and not opts["skip_invalid"]:
+            raise CommandError(f"พบแถวไม่ผ่าน validation {invalid} แถว (แก้ไฟล์ หรือใช้ --skip-invalid)")
+
+        # ---------- 2) load: ตามลำดับ dependency, 1 sheet = 1 transaction ----------
+        importer = WorkbookImporter(batch_size=opts["batch_size"], log=self.stdout.write)
+        summary, loaded = {}, []
+        for sheet in sheets:
+            t = time.monotonic()
+            try:
+                summary.update(importer.load(sheet, read_staged(staged[sheet]["file"])))
+            except Exception as e:
+                remaining = " ".join(s for s in sheets if s not in loaded)
+                raise CommandError(
+                    f"[{sheet}] โหลดไม่สำเร็จ: {e}\n"
+                    f"   ↪ sheet ที่โหลดแล้ว: {', '.join(loaded) or '-'} — ทำต่อด้วย --only {remaining}"
+                )
+            finally:
+                if importer.catalog_changed:
+                    bump_catalog_version()  # COPY / UPDATE ... FROM ไม่ยิง signal
+                    importer.catalog_changed = False
+            loaded.append(sheet)
+            self.stdout.write(f"   ✅ {sheet} loaded in {time.monotonic() - t:.1f}s")
 
-        self.stdout.write(self.style.SUCCESS(out))
+        lines = ["=== Import summary ==="] + [f"{k}: {summary[k]}" for k in sorted(summary.keys())]
+        lines.append(f"total: {time.monotonic() - started:.1f}s")
+        self.stdout.write(self.style.SUCCESS("\n".join(lines)))
@@ -0,0 +1,32 @@
+# matcher/management/commands/rebuild_taste_profiles.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from matcher.models import User
+from matcher.taste import rebuild_taste_profiles
+
+
+class Command(BaseCommand):
+    help = "Reconcile UserTasteProfile จาก Interaction (ควรรันเป็นระยะ เช่น cron รายวัน)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, nargs="*", help="Rebuild เฉพาะ user id เหล่านี้")
+        parser.add_argument("--batch-size", type=int, default=1000, help="จำนวน user ต่อ batch")
+
+    def handle(self, *args, **opts):
+        batch_size = max(1, opts["batch_size"])
+        users = User.objects.order_by("id").values_list("id", flat=True)
+        if opts["user"]:
+            users = users.filter(id__in=opts["user"])
+
+        total, last_id = 0, 0
+        while True:
+            batch = list(users.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                total += rebuild_taste_profiles(batch)
+            last_id = batch[-1]
+            self.stdout.write(f"... {total} profiles")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} taste profiles"))
@@ -0,0 +1,16 @@
+# matcher/management/commands/refresh_dashboard.py
+from django.core.management.base import BaseCommand
+
+from matcher.dashboard import refresh_dashboard
+
+
+class Command(BaseCommand):
+    help = "คำนวณ KPI ของหน้า Admin ใหม่แล้วเก็บเป็น snapshot (ตั้ง cron ทุก ๆ 5 นาที)"
+
+    def handle(self, *args, **opts):
+        snapshot = refresh_dashboard()
+        data = snapshot.data
+        self.stdout.write(self.style.SUCCESS(
+            f"Dashboard refreshed at {snapshot.computed_at:%Y-%m-%d %H:%M:%S} "
+            f"(users={data['total_users']}, active={data['active_users']}, banned={data['banned_users']})"
+        ))
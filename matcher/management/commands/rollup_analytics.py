@@ -0,0 +1,24 @@
+# matcher/management/commands/rollup_analytics.py
+from django.core.management.base import BaseCommand, CommandError
+
+from matcher.rollups import ROLLUP_SOURCES, ROLLUP_BATCH_IDS, ROLLUP_SAFETY_LAG, rollup_all
+
+
+class Command(BaseCommand):
+    help = "Rollup scans / likes / favorites / new users เป็นรายชั่วโมง+รายวัน เฉพาะแถวใหม่หลัง watermark (ตั้ง cron ทุก 5 นาที)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", nargs="*", help="Rollup เฉพาะ metric เหล่านี้: " + ", ".join(ROLLUP_SOURCES))
+        parser.add_argument("--batch-ids", type=int, default=ROLLUP_BATCH_IDS, help="ช่วง id ต่อ transaction")
+        parser.add_argument("--safety-lag", type=int, default=ROLLUP_SAFETY_LAG,
+                            help="นับเฉพาะแถวที่เก่ากว่ากี่วินาที (กันข้ามแถวที่ commit ช้า)")
+
+    def handle(self, *args, **opts):
+        metrics = opts["only"] or list(ROLLUP_SOURCES)
+        unknown = [m for m in metrics if m not in ROLLUP_SOURCES]
+        if unknown:
+            raise CommandError(f"Unknown metric(s): {', '.join(unknown)}")
+
+        results = rollup_all(metrics, batch_ids=max(1, opts["batch_ids"]), safety_lag=max(0, opts["safety_lag"]))
+        out = " | ".join(f"{metric}: +{n} ids" for metric, n in results.items())
+        self.stdout.write(self.style.SUCCESS(out))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from matcher.mood_model import PREDICT_BATCH_SIZE, MoodModelError, score_audio_moods
+
+
+class Command(BaseCommand):
+    help = "สอนโมเดล mood จาก audio features แล้วคำนวณ Song.mood_probs ทั้งแคตตาล็อก (ใช้จัดอันดับหน้า Match Result)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=PREDICT_BATCH_SIZE, help="แถวต่อ bulk_update")
+        parser.add_argument("--holdout", type=float, default=0.0, help="แบ่งสัดส่วนนี้ไว้วัด accuracy ก่อน (เช่น 0.2)")
+        parser.add_argument("--dry-run", action="store_true", help="สอน + score แต่ไม่เขียน DB")
+
+    def handle(self, *args, **opts):
+        if not 0 <= opts["holdout"] < 1:
+            raise CommandError("--holdout ต้องอยู่ในช่วง 0 ถึง <1")
+        try:
+            stats = score_audio_moods(
+                batch_size=max(1, opts["batch_size"]), holdout=opts["holdout"],
+                dry_run=opts["dry_run"], log=self.stdout.write,
+            )
+        except MoodModelError as e:
+            raise CommandError(str(e))
+
+        prefix = "[dry-run] " if opts["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Scored {stats['scored']} songs "
+            f"(model: {stats['from_model']}, from labels: {stats['from_label']})"
+        ))
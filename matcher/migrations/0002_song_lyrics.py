@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def copy_lyrics_forward(apps, schema_editor):
+    Song = apps.get_model("matcher", "Song")
+    SongLyrics = apps.get_model("matcher", "SongLyrics")
+
+    rows = (
+        Song.objects.exclude(lyrics__isnull=True)
+        .exclude(lyrics="")
+        .values_list("song_id", "lyrics")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for song_id, text in rows:
+        batch.append(SongLyrics(song_id=song_id, text=text))
+        if len(batch) >= BATCH_SIZE:
+            SongLyrics.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        SongLyrics.objects.bulk_create(batch)
+
+
+def copy_lyrics_backward(apps, schema_editor):
+    # Song.lyrics กับ reverse accessor "lyrics" ชนกันใน state นี้ จึงใช้ SQL ตรง
+    song_table = apps.get_model("matcher", "Song")._meta.db_table
+    lyrics_table = apps.get_model("matcher", "SongLyrics")._meta.db_table
+    qn = schema_editor.quote_name
+    schema_editor.execute(
+        f"UPDATE {qn(song_table)} SET {qn('lyrics')} = ("
+        f"SELECT {qn('text')} FROM {qn(lyrics_table)} "
+        f"WHERE {qn(lyrics_table)}.{qn('song_id')} = {qn(song_table)}.{qn('song_id')})"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SongLyrics",
+            fields=[
+                (
+                    "song",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="lyrics",
+                        serialize=False,
+                        to="matcher.song",
+                    ),
+                ),
+                ("text", models.TextField(blank=True, default="")),
+            ],
+        ),
+        migrations.RunPython(copy_lyrics_forward, copy_lyrics_backward),
+        migrations.RemoveField(
+            model_name="song",
+            name="lyrics",
+        ),
+    ]
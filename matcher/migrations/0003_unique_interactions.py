@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:59
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def delete_duplicates(model, fields, keep=Max):
+    """Keep one row per unique key (the newest by default) and delete the rest."""
+    groups = (
+        model.objects.values(*fields)
+        .annotate(n=Count("id"), keep_id=keep("id"))
+        .filter(n__gt=1)
+    )
+    for group in groups.iterator():
+        key = {f: group[f] for f in fields}
+        model.objects.filter(**key).exclude(id=group["keep_id"]).delete()
+
+
+def merge_duplicate_playlists(Playlist, PlaylistItem):
+    """Move items of duplicate (user, name) playlists into the oldest one."""
+    groups = (
+        Playlist.objects.values("user", "name")
+        .annotate(n=Count("id"), keep_id=Min("id"))
+        .filter(n__gt=1)
+    )
+    for group in groups.iterator():
+        duplicates = Playlist.objects.filter(
+            user=group["user"], name=group["name"]
+        ).exclude(id=group["keep_id"])
+        PlaylistItem.objects.filter(playlist__in=duplicates).update(
+            playlist_id=group["keep_id"]
+        )
+        duplicates.delete()
+
+
+def remove_duplicates(apps, schema_editor):
+    Interaction = apps.get_model("matcher", "Interaction")
+    FavoriteSong = apps.get_model("matcher", "FavoriteSong")
+    Playlist = apps.get_model("matcher", "Playlist")
+    PlaylistItem = apps.get_model("matcher", "PlaylistItem")
+
+    # the latest interaction is the user's current state
+    delete_duplicates(Interaction, ["user", "song"])
+    # the first favorite keeps its original added_at
+    delete_duplicates(FavoriteSong, ["user", "song"], keep=Min)
+    merge_duplicate_playlists(Playlist, PlaylistItem)
+    delete_duplicates(PlaylistItem, ["playlist", "song"], keep=Min)
+
+
+class Migration(migrations.Migration):
+    # The cleanup deletes / repoints FK rows. On PostgreSQL the FKs are DEFERRABLE
+    # INITIALLY DEFERRED, so doing it in the same transaction as ALTER TABLE fails with
+    # "pending trigger events". Commit the cleanup on its own, then add the constraints.
+    atomic = False
+
+    dependencies = [
+        ("matcher", "0002_song_lyrics"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop, atomic=True),
+        migrations.AddConstraint(
+            model_name="favoritesong",
+            constraint=models.UniqueConstraint(
+                fields=("user", "song"), name="uniq_favorite_user_song"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="interaction",
+            constraint=models.UniqueConstraint(
+                fields=("user", "song"), name="uniq_interaction_user_song"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="playlist",
+            constraint=models.UniqueConstraint(
+                fields=("user", "name"), name="uniq_playlist_user_name"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="playlistitem",
+            constraint=models.UniqueConstraint(
+                fields=("playlist", "song"), name="uniq_playlist_item"
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0003_unique_interactions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="playhistory",
+            name="event",
+            field=models.CharField(
+                choices=[("play", "Play"), ("skip", "Skip")],
+                default="play",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="playhistory",
+            name="position",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
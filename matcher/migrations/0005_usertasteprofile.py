@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0004_playhistory_event"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserTasteProfile",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="taste_profile",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("like_count", models.IntegerField(default=0)),
+                ("genre_counts", models.JSONField(blank=True, default=dict)),
+                ("mood_counts", models.JSONField(blank=True, default=dict)),
+                ("valence_sum", models.FloatField(default=0.0)),
+                ("energy_sum", models.FloatField(default=0.0)),
+                ("tempo_sum", models.FloatField(default=0.0)),
+                ("danceability_sum", models.FloatField(default=0.0)),
+                ("top_genre", models.CharField(blank=True, max_length=100, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0005_usertasteprofile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("data", models.JSONField(default=dict)),
+                (
+                    "computed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:07
+
+from django.db import migrations, models
+
+# ค้นหา user แบบ prefix (username/email __istartswith) บน PostgreSQL
+# Django สร้าง SQL เป็น UPPER("col"::text) LIKE UPPER('q%') จึงต้องใช้ functional index
+# ที่ expression ตรงกัน + text_pattern_ops (ใช้กับ LIKE ได้ทุก collation)
+SEARCH_INDEXES = {
+    "user_username_upper_idx": "username",
+    "user_email_upper_idx": "email",
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    qn = schema_editor.quote_name
+    table = apps.get_model("matcher", "User")._meta.db_table
+    for name, column in SEARCH_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {qn(name)} ON {qn(table)} "
+            f"(UPPER({qn(column)}::text) text_pattern_ops)"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in SEARCH_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("matcher", "0006_dashboardsnapshot"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["-date_joined", "-id"], name="user_joined_id_idx"
+            ),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0007_user_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source", models.CharField(max_length=30, unique=True)),
+                ("last_id", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="MetricRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("metric", models.CharField(max_length=30)),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=10
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("dimension", models.CharField(blank=True, default="", max_length=100)),
+                ("count", models.IntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("metric", "granularity", "bucket", "dimension"),
+                        name="uniq_metric_rollup",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0008_metric_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="song",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True
+            ),
+        ),
+    ]
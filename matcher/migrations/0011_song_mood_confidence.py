@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0010_import_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="song",
+            name="mood_confidence",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0011_song_mood_confidence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="song",
+            name="mood_probs",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def backfill_like_events(apps, schema_editor):
+    """Seed the like log from current likes and rebuild the 'likes' rollup from it."""
+    Interaction = apps.get_model("matcher", "Interaction")
+    LikeEvent = apps.get_model("matcher", "LikeEvent")
+    MetricRollup = apps.get_model("matcher", "MetricRollup")
+    RollupWatermark = apps.get_model("matcher", "RollupWatermark")
+
+    likes = (
+        Interaction.objects.filter(type="like")
+        .order_by("id")
+        .values_list("user_id", "song_id", "created_at")
+    )
+    batch = []
+    for user_id, song_id, created_at in likes.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        batch.append(LikeEvent(user_id=user_id, song_id=song_id, created_at=created_at))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            LikeEvent.objects.bulk_create(batch)
+            batch = []
+    LikeEvent.objects.bulk_create(batch)
+
+    # the old watermark points at Interaction ids -> recount from the log
+    MetricRollup.objects.filter(metric="likes").delete()
+    RollupWatermark.objects.filter(source="likes").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matcher", "0012_song_mood_probs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LikeEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("liked", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "song",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="matcher.song"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill_like_events, migrations.RunPython.noop),
+    ]
@@ -16,6 +16,12 @@ class User(AbstractUser):
     ]
     gender = models.CharField(max_length=10, choices=gender_choices, null=True, blank=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # keyset pagination หน้า User Management (ORDER BY date_joined DESC, id DESC)
+            models.Index(fields=['-date_joined', '-id'], name='user_joined_id_idx'),
+        ]
+
 class UserProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     province = models.CharField(max_length=100, null=True, blank=True)
@@ -68,19 +74,27 @@ class Category(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.type})"
-    
+
+class SongQuerySet(models.QuerySet):
+    def with_lyrics(self):
+        """ Opt-in: join ตาราง SongLyrics มาด้วย (ปกติไม่โหลดเนื้อเพลง) """
+        return self.select_related('lyrics')
+
 class Song(models.Model):
     song_id = models.AutoField(primary_key=True)
     title = models.CharField(max_length=255)
     artist = models.ForeignKey(Artist, on_delete=models.CASCADE)
     album = models.ForeignKey(Album, on_delete=models.SET_NULL, null=True, blank=True)
     release_date = models.DateField(null=True, blank=True)
-    lyrics = models.TextField(null=True, blank=True)
     image_url = models.URLField(null=True, blank=True)
     genius_url = models.URLField(null=True, blank=True)
     
     # Metadata
     json_mood = models.CharField(max_length=50, null=True, blank=True) 
+    # ความมั่นใจของ mood ที่โมเดลทายให้ (null = mood มาจากข้อมูลต้นทาง/admin)
+    mood_confidence = models.FloatField(null=True, blank=True)
+    # ความน่าจะเป็นของแต่ละ mood เช่น {"sad": 0.61, "relax": 0.22, ...} (คำนวณโดย score_audio_moods)
+    mood_probs = models.JSONField(null=True, blank=True)
     json_genre = models.CharField(max_length=100, null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
 
@@ -94,11 +108,35 @@ class Song(models.Model):
     tempo = models.FloatField(default=120.0)
     danceability = models.FloatField(default=0.5)
 
+    # sha256 ของ record ต้นทางตอน import ล่าสุด (importer ข้ามเพลงที่ hash ไม่เปลี่ยน)
+    content_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = SongQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.title} - {self.artist.name}"
 
+    @property
+    def lyrics_text(self):
+        """ เนื้อเพลง (ควรโหลดผ่าน Song.objects.with_lyrics() เพื่อไม่ให้ query ซ้ำ) """
+        try:
+            return self.lyrics.text
+        except SongLyrics.DoesNotExist:
+            return ""
+
+class SongLyrics(models.Model):
+    """
+    เนื้อเพลงแยกออกจากตาราง Song เพื่อให้ query หน้า Browse/Match/Admin
+    อ่านเฉพาะแถวที่แคบ ๆ — โหลดเมื่อจำเป็นผ่าน with_lyrics()
+    """
+    song = models.OneToOneField(Song, on_delete=models.CASCADE, primary_key=True, related_name='lyrics')
+    text = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f"Lyrics of song {self.song_id}"
+
 # ===================== 3. USER ACTIVITY =====================
 
 class Interaction(models.Model):
@@ -108,11 +146,21 @@ class Interaction(models.Model):
     rating = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'song'], name='uniq_interaction_user_song'),
+        ]
+
 class FavoriteSong(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     song = models.ForeignKey(Song, on_delete=models.CASCADE)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'song'], name='uniq_favorite_user_song'),
+        ]
+
 class UserScanLog(models.Model):
     scan_id = models.AutoField(primary_key=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -125,8 +173,52 @@ class PlayHistory(models.Model):
     song = models.ForeignKey(Song, on_delete=models.CASCADE)
     detected_emotion = models.CharField(max_length=50, null=True)
     source = models.CharField(max_length=50, default='manual') 
+    event = models.CharField(max_length=10, choices=[('play', 'Play'), ('skip', 'Skip')], default='play')
+    position = models.PositiveIntegerField(null=True, blank=True)  # ลำดับเพลงในหน้าที่แสดง
     started_at = models.DateTimeField(auto_now_add=True)
 
+class LikeEvent(models.Model):
+    """
+    Log แบบ append-only ของการเปลี่ยนสถานะ like (เขียนโดย event buffer ตอน flush)
+    ใช้เป็นต้นทางของ rollup 'likes' — Interaction ถูก upsert ทับ (id / created_at เดิม) จึงนับ like ที่เปลี่ยนใจทีหลังไม่ได้
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    song = models.ForeignKey(Song, on_delete=models.CASCADE)
+    liked = models.BooleanField(default=True)  # False = เลิก like (ลบ / เปลี่ยนเป็น dislike, skip)
+    created_at = models.DateTimeField(default=timezone.now)
+
+class UserTasteProfile(models.Model):
+    """
+    Read model ของรสนิยม user (สรุปจาก Interaction 'like')
+    อัปเดตแบบ incremental ทุกครั้งที่เขียน Interaction และ reconcile ด้วย
+    `python manage.py rebuild_taste_profiles`
+    """
+    AUDIO_FEATURES = ('valence', 'energy', 'tempo', 'danceability')
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='taste_profile')
+    like_count = models.IntegerField(default=0)
+    genre_counts = models.JSONField(default=dict, blank=True)  # {"Pop": 3, ...}
+    mood_counts = models.JSONField(default=dict, blank=True)   # {"Happy": 2, ...}
+    valence_sum = models.FloatField(default=0.0)
+    energy_sum = models.FloatField(default=0.0)
+    tempo_sum = models.FloatField(default=0.0)
+    danceability_sum = models.FloatField(default=0.0)
+    top_genre = models.CharField(max_length=100, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def mean(self, feature):
+        """ ค่าเฉลี่ยของ audio feature จากเพลงที่ชอบ (None ถ้ายังไม่มี like) """
+        if self.like_count <= 0:
+            return None
+        return getattr(self, f'{feature}_sum') / self.like_count
+
+    @property
+    def audio_means(self):
+        return {feature: self.mean(feature) for feature in self.AUDIO_FEATURES}
+
+    def __str__(self):
+        return f"Taste of {self.user_id}"
+
 # ===================== 4. PLAYLIST =====================
 
 class Playlist(models.Model):
@@ -135,11 +227,21 @@ class Playlist(models.Model):
     is_public = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='uniq_playlist_user_name'),
+        ]
+
 class PlaylistItem(models.Model):
     playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE)
     song = models.ForeignKey(Song, on_delete=models.CASCADE)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['playlist', 'song'], name='uniq_playlist_item'),
+        ]
+
 
 # ===================== 5. AI MODEL SYSTEM =====================
 
@@ -211,4 +313,98 @@ class TrainingLog(models.Model):
     validation_acc = models.FloatField(null=True, blank=True)
 
     class Meta:
-        ordering = ['epoch_number']
\ No newline at end of file
+        ordering = ['epoch_number']
+
+# ===================== 6. ADMIN DASHBOARD =====================
+
+class DashboardSnapshot(models.Model):
+    """
+    KPI ของหน้า Admin ที่คำนวณไว้ล่วงหน้า (matcher/dashboard.py)
+    รีเฟรชด้วย `python manage.py refresh_dashboard` หรืออัตโนมัติเมื่อเก่าเกินกำหนด
+    """
+    name = models.CharField(max_length=50, unique=True)
+    data = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} @ {self.computed_at:%Y-%m-%d %H:%M}"
+
+# ===================== 7. ANALYTICS ROLLUPS =====================
+
+class MetricRollup(models.Model):
+    """
+    จำนวน event ต่อช่วงเวลา (hour/day) แยกตาม dimension (อารมณ์ / แนวเพลง)
+    สร้างแบบ incremental โดย `python manage.py rollup_analytics` (matcher/rollups.py)
+    """
+    GRANULARITY_CHOICES = [('hour', 'Hour'), ('day', 'Day')]
+
+    metric = models.CharField(max_length=30)          # scans / likes / favorites / new_users
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()                   # ต้นชั่วโมง / ต้นวัน
+    dimension = models.CharField(max_length=100, blank=True, default='')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'granularity', 'bucket', 'dimension'], name='uniq_metric_rollup'),
+        ]
+
+class RollupWatermark(models.Model):
+    """ id ล่าสุดของตารางต้นทางที่ถูก rollup แล้ว (แถว id มากกว่านี้ = ยังไม่ได้นับ) """
+    source = models.CharField(max_length=30, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.last_id}"
+
+# ===================== 8. DATA IMPORT =====================
+
+class ImportJob(models.Model):
+    """
+    งานนำเข้าเพลงที่รันเบื้องหลัง (matcher/import_jobs.py)
+    อัปเดตความคืบหน้าทุก batch — หน้า Admin poll สถานะจากตารางนี้
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    ACTIVE_STATUSES = ('queued', 'running')
+
+    source = models.CharField(max_length=500)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    batch_size = models.PositiveIntegerField(default=500)
+
+    total_records = models.PositiveIntegerField(null=True, blank=True)  # นับก่อนเริ่ม (ใช้คำนวณ %)
+    processed = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # [{offset, records, error}] ราย batch ที่พัง
+
+    cancel_requested = models.BooleanField(default=False)
+    message = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # heartbeat ของ worker
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+    @property
+    def percent(self):
+        if not self.total_records:
+            return 100 if self.status == 'succeeded' else 0
+        return min(100, round(self.processed * 100 / self.total_records))
+
+    def __str__(self):
+        return f"Import #{self.pk} ({self.status})"
@@ -0,0 +1,222 @@
+import numpy as np
+from django.db import connections
+from django.db.models import Q
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+
+from .audio_features import FEATURES, DEFAULT_FEATURES
+from .models import Song
+from .search import bump_catalog_version
+from .thai_text import make_pool, tokenize_all
+
+PREDICT_BATCH_SIZE = 1000   # เพลงต่อรอบ predict + bulk_update
+MIN_TRAINING_SONGS = 20
+
+
+class MoodModelError(Exception):
+    pass
+
+
+def normalize_mood(value):
+    return (value or '').strip().lower()
+
+
+def labeled_songs():
+    """ เพลงที่มี mood จากข้อมูลจริง (ไม่นับ mood ที่โมเดลทายไว้เอง -> ไม่เอาผลทายมาสอนตัวเอง) """
+    return Song.objects.exclude(json_mood__isnull=True).exclude(json_mood='').filter(mood_confidence__isnull=True)
+
+
+def unlabeled_songs(include_predicted=False):
+    cond = Q(json_mood__isnull=True) | Q(json_mood='')
+    if include_predicted:
+        cond |= Q(mood_confidence__isnull=False)
+    return Song.objects.filter(cond)
+
+
+def with_lyrics(qs):
+    return qs.exclude(lyrics__text__isnull=True).exclude(lyrics__text='')
+
+
+# ==========================================
+# 📝 LYRICS MODEL (TF-IDF + LOGISTIC REGRESSION)
+# ==========================================
+def _lyrics_pipeline(n_docs):
+    return make_pipeline(
+        TfidfVectorizer(
+            tokenizer=str.split, token_pattern=None, lowercase=False,  # ตัดคำไว้แล้วด้วย pythainlp
+            ngram_range=(1, 2), min_df=2 if n_docs >= 100 else 1, sublinear_tf=True, max_features=100000,
+        ),
+        LogisticRegression(max_iter=1000, class_weight='balanced'),
+    )
+
+
+def train_lyrics_model(pool=None, holdout=0.0):
+    """ สอนจากเพลงที่มี mood + เนื้อเพลง คืน (pipeline, report) """
+    rows = list(with_lyrics(labeled_songs()).values_list('json_mood', 'lyrics__text'))
+    labels = [normalize_mood(mood) for mood, _ in rows]
+    if len(rows) < MIN_TRAINING_SONGS or len(set(labels)) < 2:
+        raise MoodModelError(
+            f"ข้อมูลสอนไม่พอ: {len(rows)} เพลง / {len(set(labels))} mood "
+            f"(ต้องมีอย่างน้อย {MIN_TRAINING_SONGS} เพลง และ 2 mood)"
+        )
+
+    docs = tokenize_all([text for _, text in rows], pool)
+    report = {'songs': len(rows), 'classes': sorted(set(labels))}
+    try:
+        if holdout:
+            train_docs, test_docs, y_train, y_test = train_test_split(
+                docs, labels, test_size=holdout, random_state=42,
+            )
+            model = _lyrics_pipeline(len(train_docs)).fit(train_docs, y_train)
+            report['holdout_accuracy'] = round(float(model.score(test_docs, y_test)), 4)
+        model = _lyrics_pipeline(len(docs)).fit(docs, labels)
+    except ValueError as e:  # เช่น vocabulary ว่าง
+        raise MoodModelError(str(e))
+    return model, report
+
+
+def backfill_lyrics_moods(workers=None, batch_size=PREDICT_BATCH_SIZE, min_confidence=0.0, holdout=0.0,
+                          include_predicted=False, dry_run=False, log=print):
+    """
+    ตัดคำใน process pool -> สอนโมเดล -> ทายเพลงที่ไม่มี mood ทีละ batch (predict_proba ทั้ง batch)
+    -> bulk_update json_mood + mood_confidence
+    """
+    stats = {'scanned': 0, 'written': 0, 'low_confidence': 0}
+    connections.close_all()  # ไม่ส่ง connection ที่เปิดค้างต่อให้ process ลูก (เหมือน import_workbook)
+    with make_pool(workers) as pool:
+        model, report = train_lyrics_model(pool, holdout)
+        log(f"Trained on {report['songs']} songs, classes: {', '.join(report['classes'])}"
+            + (f", holdout accuracy {report['holdout_accuracy']:.1%}" if 'holdout_accuracy' in report else ""))
+
+        classes = model.classes_
+        qs = with_lyrics(unlabeled_songs(include_predicted)).order_by('song_id')
+        last_id = 0
+        while True:
+            rows = list(qs.filter(song_id__gt=last_id).values_list('song_id', 'lyrics__text')[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            stats['scanned'] += len(rows)
+
+            probs = model.predict_proba(tokenize_all([text for _, text in rows], pool))
+            best = probs.argmax(axis=1)
+            confidence = probs[np.arange(len(rows)), best]
+            songs = [
+                Song(song_id=song_id, json_mood=classes[i], mood_confidence=round(float(c), 4))
+                for (song_id, _), i, c in zip(rows, best, confidence)
+                if c >= min_confidence
+            ]
+            stats['low_confidence'] += len(rows) - len(songs)
+            if songs and not dry_run:
+                Song.objects.bulk_update(songs, ['json_mood', 'mood_confidence'], batch_size=500)
+            stats['written'] += len(songs)
+            log(f"... scanned {stats['scanned']} | written {stats['written']}")
+
+    if stats['written'] and not dry_run:
+        bump_catalog_version()  # bulk_update ไม่ยิง signal
+    return {**report, **stats}
+
+
+# ==========================================
+# 🎚️ AUDIO FEATURE MODEL (NUMPY SCORING)
+# ==========================================
+class AudioMoodModel:
+    """ Softmax regression บน valence / energy / tempo / danceability (standardize แล้ว) — score ด้วย NumPy ล้วน """
+
+    def __init__(self, classes, coef, intercept, mean, std):
+        self.classes = list(classes)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.mean = mean
+        self.std = std
+
+    @classmethod
+    def from_logistic(cls, clf, mean, std):
+        coef, intercept = clf.coef_, clf.intercept_
+        if len(clf.classes_) == 2:
+            # binary: sklearn เก็บแค่ logit ของ class ที่ 2 -> softmax([0, z]) = sigmoid(z)
+            coef = np.vstack([np.zeros_like(coef), coef])
+            intercept = np.concatenate([[0.0], intercept])
+        return cls(clf.classes_, coef, intercept, mean, std)
+
+    def predict_proba(self, X):
+        z = ((X - self.mean) / self.std) @ self.coef.T + self.intercept
+        z -= z.max(axis=1, keepdims=True)
+        e = np.exp(z)
+        return e / e.sum(axis=1, keepdims=True)
+
+
+def _feature_matrix(rows):
+    return np.array(rows, dtype=np.float64).reshape(-1, len(FEATURES))
+
+
+def train_audio_model(holdout=0.0):
+    """ สอนจากเพลงที่มี mood จริง + audio feature จริง (ไม่ใช่ค่า default) คืน (AudioMoodModel, report) """
+    rows = list(labeled_songs().exclude(**DEFAULT_FEATURES).values_list('json_mood', *FEATURES))
+    labels = np.array([normalize_mood(row[0]) for row in rows])
+    if len(rows) < MIN_TRAINING_SONGS or len(set(labels)) < 2:
+        raise MoodModelError(
+            f"ข้อมูลสอนไม่พอ: {len(rows)} เพลง / {len(set(labels))} mood "
+            f"(ต้องมีอย่างน้อย {MIN_TRAINING_SONGS} เพลง และ 2 mood)"
+        )
+    X = _feature_matrix([row[1:] for row in rows])
+
+    def fit(X, y):
+        mean, std = X.mean(axis=0), X.std(axis=0)
+        std[std == 0] = 1.0
+        clf = LogisticRegression(max_iter=1000, class_weight='balanced').fit((X - mean) / std, y)
+        return AudioMoodModel.from_logistic(clf, mean, std)
+
+    report = {'songs': len(rows), 'classes': sorted(set(labels))}
+    if holdout:
+        X_train, X_test, y_train, y_test = train_test_split(X, labels, test_size=holdout, random_state=42)
+        model = fit(X_train, y_train)
+        predicted = np.asarray(model.classes)[model.predict_proba(X_test).argmax(axis=1)]
+        report['holdout_accuracy'] = round(float((predicted == y_test).mean()), 4)
+    return fit(X, labels), report
+
+
+def score_audio_moods(batch_size=PREDICT_BATCH_SIZE, holdout=0.0, dry_run=False, log=print):
+    """
+    คำนวณ Song.mood_probs ทั้งแคตตาล็อก:
+    - เพลงที่มี audio feature จริง -> ความน่าจะเป็นจากโมเดล (predict_proba ครั้งเดียวทั้งแคตตาล็อก)
+    - เพลงที่มี mood จากข้อมูลจริง -> one-hot ของ mood นั้น (ข้อมูลจริงชนะโมเดล)
+    - เพลงที่ feature เป็นค่า default แต่มี mood ที่ทายจากเนื้อเพลง -> {mood: mood_confidence}
+    """
+    model, report = train_audio_model(holdout)
+    log(f"Trained on {report['songs']} songs, classes: {', '.join(report['classes'])}"
+        + (f", holdout accuracy {report['holdout_accuracy']:.1%}" if 'holdout_accuracy' in report else ""))
+
+    rows = list(Song.objects.order_by('song_id').values_list('song_id', 'json_mood', 'mood_confidence', *FEATURES))
+    if not rows:
+        return {**report, 'scored': 0, 'from_model': 0, 'from_label': 0}
+    X = _feature_matrix([row[3:] for row in rows])
+    defaults = np.array([DEFAULT_FEATURES[f] for f in FEATURES], dtype=np.float64)
+    has_features = ~(X == defaults).all(axis=1)
+    probs = model.predict_proba(X)  # ทั้งแคตตาล็อกใน pass เดียว
+    classes = model.classes
+
+    songs, from_model, from_label = [], 0, 0
+    for (song_id, mood, confidence, *_), row_probs, usable in zip(rows, probs, has_features):
+        mood = normalize_mood(mood)
+        if mood and confidence is None:
+            vector = {mood: 1.0}
+            from_label += 1
+        elif usable:
+            vector = {c: round(float(p), 4) for c, p in zip(classes, row_probs)}
+            from_model += 1
+        elif mood:
+            vector = {mood: round(float(confidence), 4)}
+            from_label += 1
+        else:
+            vector = None
+        songs.append(Song(song_id=song_id, mood_probs=vector))
+
+    if not dry_run:
+        for start in range(0, len(songs), batch_size):
+            Song.objects.bulk_update(songs[start:start + batch_size], ['mood_probs'])
+            log(f"... written {min(start + batch_size, len(songs))} / {len(songs)}")
+        bump_catalog_version()  # bulk_update ไม่ยิง signal
+    return {**report, 'scored': from_model + from_label, 'from_model': from_model, 'from_label': from_label}
@@ -0,0 +1,180 @@
+import datetime
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, F
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import (
+    User, LikeEvent, FavoriteSong, UserScanLog,
+    MetricRollup, RollupWatermark,
+)
+from .upserts import upsert
+
+GRANULARITIES = ('hour', 'day')
+ROLLUP_BATCH_IDS = 50000      # ช่วง id ต่อ 1 transaction
+MAX_SERIES_BUCKETS = 24 * 93  # กันขอช่วงเวลายาวเกินไปในครั้งเดียว
+# นับเฉพาะแถวที่เก่ากว่านี้ (วินาที): id ถูกจองตอน INSERT แต่ commit ทีหลังได้ (flush / import ก้อนใหญ่)
+# ถ้า watermark วิ่งผ่าน id ที่ยังไม่ commit แถวนั้นจะไม่ถูกนับอีกเลย
+ROLLUP_SAFETY_LAG = getattr(settings, 'ROLLUP_SAFETY_LAG', 300)
+
+RollupSource = namedtuple('RollupSource', 'model id_field time_field dimension condition')
+
+# metric -> ตารางต้นทาง (ทุกตารางเป็น append-only ตาม id)
+ROLLUP_SOURCES = {
+    'scans': RollupSource(UserScanLog, 'scan_id', 'created_at', 'detected_emotion', None),
+    'likes': RollupSource(LikeEvent, 'id', 'created_at', 'song__json_genre', Q(liked=True)),  # รวมการ like ซ้ำหลังเลิก like
+    'favorites': RollupSource(FavoriteSong, 'id', 'added_at', 'song__json_genre', None),
+    'new_users': RollupSource(User, 'id', 'date_joined', None, None),
+}
+
+
+# ==========================================
+# 🧮 INCREMENTAL AGGREGATION
+# ==========================================
+def _aggregate_range(source, low, high):
+    """ GROUP BY (bucket, dimension) ของแถว id ในช่วง (low, high] สำหรับทุก granularity """
+    qs = source.model.objects.filter(**{f'{source.id_field}__gt': low, f'{source.id_field}__lte': high})
+    if source.condition is not None:
+        qs = qs.filter(source.condition)
+
+    counts = {}
+    for granularity in GRANULARITIES:
+        group = {'bucket': Trunc(source.time_field, granularity)}
+        if source.dimension:
+            group['dim'] = F(source.dimension)
+        rows = qs.order_by().values(**group).annotate(n=Count(source.id_field))
+        for row in rows:
+            key = (granularity, row['bucket'], row.get('dim') or '')
+            counts[key] = counts.get(key, 0) + row['n']
+    return counts
+
+
+def _merge_counts(metric, counts):
+    """ บวกจำนวนใหม่เข้ากับ rollup เดิม (อ่านแถวเดิมครั้งเดียว แล้ว upsert) """
+    if not counts:
+        return 0
+    buckets = {bucket for _, bucket, _ in counts}
+    existing = {
+        (granularity, bucket, dimension): count
+        for granularity, bucket, dimension, count in MetricRollup.objects.filter(
+            metric=metric, bucket__in=buckets,
+        ).values_list('granularity', 'bucket', 'dimension', 'count')
+    }
+    rows = [
+        MetricRollup(
+            metric=metric, granularity=granularity, bucket=bucket, dimension=dimension,
+            count=existing.get((granularity, bucket, dimension), 0) + n,
+        )
+        for (granularity, bucket, dimension), n in counts.items()
+    ]
+    upsert(MetricRollup, rows, unique_fields=['metric', 'granularity', 'bucket', 'dimension'], update_fields=['count'])
+    return len(rows)
+
+
+def rollup_metric(metric, batch_ids=ROLLUP_BATCH_IDS, safety_lag=ROLLUP_SAFETY_LAG):
+    """
+    นับเฉพาะแถวใหม่หลัง watermark เป็นช่วง id ละ batch_ids
+    แต่ละช่วงใช้ transaction สั้น ๆ ของตัวเอง (lock แถว watermark กัน job ซ้อนกัน)
+    watermark หยุดที่ id สูงสุดของแถวที่เก่ากว่า safety_lag วินาที -> transaction ที่ยังค้างอยู่
+    (จอง id ไปแล้วแต่ยังไม่ commit) จะถูกนับในรอบถัดไป แทนที่จะถูกข้ามไปตลอด
+    หมายเหตุ: นับตอนแถวถูกสร้าง — การเลิก like / ลบภายหลังไม่ถูกหักออก
+    """
+    source = ROLLUP_SOURCES[metric]
+    cutoff = timezone.now() - datetime.timedelta(seconds=safety_lag)
+    max_id = source.model.objects.filter(**{f'{source.time_field}__lt': cutoff}).aggregate(
+        m=Max(source.id_field),
+    )['m'] or 0
+    processed = 0
+
+    while True:
+        with transaction.atomic():
+            mark, _ = RollupWatermark.objects.select_for_update().get_or_create(source=metric)
+            low = mark.last_id
+            if low >= max_id:
+                break
+            high = min(low + batch_ids, max_id)
+            _merge_counts(metric, _aggregate_range(source, low, high))
+            mark.last_id = high
+            mark.save(update_fields=['last_id', 'updated_at'])
+        processed += high - low
+    return processed
+
+
+def rollup_all(metrics=None, batch_ids=ROLLUP_BATCH_IDS, safety_lag=ROLLUP_SAFETY_LAG):
+    return {metric: rollup_metric(metric, batch_ids, safety_lag) for metric in (metrics or ROLLUP_SOURCES)}
+
+
+# ==========================================
+# 📈 CHART SERIES
+# ==========================================
+def parse_range_bound(value):
+    """ รับ 'YYYY-MM-DD' หรือ ISO datetime -> aware datetime (None ถ้าไม่ได้ส่งมา) """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _floor(dt, granularity):
+    dt = timezone.localtime(dt) if timezone.is_aware(dt) else dt
+    dt = dt.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        dt = dt.replace(hour=0)
+    return dt
+
+
+def metric_series(metric, granularity, start, end):
+    """
+    Series พร้อมวาดกราฟ: buckets (ISO) + counts แยกตาม dimension (เติม 0 ช่องว่าง)
+    อ่านจาก MetricRollup อย่างเดียว (index unique (metric, granularity, bucket, ...))
+    """
+    if metric not in ROLLUP_SOURCES:
+        raise ValueError(f"Unknown metric: {metric}")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+
+    step = datetime.timedelta(hours=1) if granularity == 'hour' else datetime.timedelta(days=1)
+    start, end = _floor(start, granularity), _floor(end, granularity)
+    if end < start:
+        raise ValueError("end must be after start")
+    if (end - start) / step >= MAX_SERIES_BUCKETS:
+        raise ValueError(f"Range too long (max {MAX_SERIES_BUCKETS} {granularity} buckets)")
+
+    buckets = []
+    current = start
+    while current <= end:
+        buckets.append(current)
+        current += step
+    index = {bucket: i for i, bucket in enumerate(buckets)}
+
+    rows = MetricRollup.objects.filter(
+        metric=metric, granularity=granularity, bucket__gte=start, bucket__lte=end,
+    ).values_list('bucket', 'dimension', 'count')
+
+    series = {}
+    for bucket, dimension, count in rows:
+        i = index.get(_floor(bucket, granularity))
+        if i is None:
+            continue
+        series.setdefault(dimension or 'all', [0] * len(buckets))[i] += count
+
+    watermark = RollupWatermark.objects.filter(source=metric).values_list('updated_at', flat=True).first()
+    return {
+        'metric': metric,
+        'granularity': granularity,
+        'buckets': [bucket.isoformat() for bucket in buckets],
+        'series': series,
+        'totals': {dimension: sum(counts) for dimension, counts in series.items()},
+        'updated_at': watermark.isoformat() if watermark else None,
+    }
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import random
+import time
+
+from django.core.cache import cache
+from django.db.models import F, Q, Value, FloatField
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.http import HttpResponse
+
+from .models import Song
+from .events import liked_song_ids
+
+# --- FAST JSON (optional) ---
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+PLACEHOLDER_COVER = "https://via.placeholder.com/50"
+
+MAX_SEARCH_LIMIT = 200
+SEARCH_CACHE_TIMEOUT = 60 * 10
+CATALOG_VERSION_KEY = 'matcher:catalog_version'
+MOOD_POOL_SIZE = 30  # สุ่มจาก top-N ตาม probability (ไม่ให้ได้ชุดเดิมทุกครั้ง)
+
+
+# ==========================================
+# 🔢 CATALOG VERSION (cache invalidation)
+# ==========================================
+def catalog_version():
+    """
+    เลขเวอร์ชันของแคตตาล็อกเพลง ใช้เป็นส่วนหนึ่งของ cache key
+    ถ้า key หาย (ถูก evict) จะเริ่มใหม่จาก timestamp จึงไม่ชนกับเวอร์ชันเก่า
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """ เรียกทุกครั้งที่ข้อมูลเพลงเปลี่ยน — cache เดิมทั้งหมดจะไม่ถูกใช้อีก """
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+        return version
+
+
+# ==========================================
+# 🃏 SONG CARD PROJECTION
+# ==========================================
+def song_card_values(qs):
+    """
+    Project a Song queryset down to the columns a song card needs.
+    Cover/link fallbacks are resolved in SQL so no model instances
+    (and no lyrics) are ever loaded.
+    """
+    return qs.values(
+        'song_id',
+        'json_mood',
+    ).annotate(
+        card_title=Coalesce(F('title'), Value('')),
+        artist_name=Coalesce(F('artist__name'), Value('Unknown')),
+        cover_url=Coalesce(
+            NullIf(F('image_url'), Value('')),
+            NullIf(F('album__image_url'), Value('')),
+            Value(PLACEHOLDER_COVER),
+        ),
+        link_url=Coalesce(
+            NullIf(F('spotify_link'), Value('')),
+            NullIf(F('genius_url'), Value('')),
+            Value(''),
+        ),
+    )
+
+
+def song_cards(qs):
+    """ แปลง queryset เป็น list ของ card dict (รูปแบบเดียวกับ API เดิม) """
+    return [
+        {
+            "song_id": row['song_id'],
+            "title": row['card_title'],
+            "artist": row['artist_name'],
+            "cover_url": row['cover_url'],
+            "spotify_url": row['link_url'],
+            "json_mood": row['json_mood'] or "",
+        }
+        for row in song_card_values(qs)
+    ]
+
+
+def search_songs(q='', mood='', limit=50):
+    """ Query เพลงสำหรับหน้า Browse/Search (ไม่รวมสถานะ is_liked ของ user) """
+    qs = Song.objects.all()
+
+    if mood:
+        qs = qs.filter(json_mood__iexact=mood)
+
+    if q:
+        qs = qs.filter(Q(title__icontains=q) | Q(artist__name__icontains=q))
+
+    return song_cards(qs.order_by('-song_id')[:limit])
+
+
+def normalize_search_params(q='', mood='', limit=50):
+    """ ทำให้ query ที่ความหมายเหมือนกันได้ cache key เดียวกัน """
+    q = ' '.join((q or '').split()).lower()
+    mood = (mood or '').strip().lower()
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+    return q, mood, limit
+
+
+def cached_search_songs(q='', mood='', limit=50):
+    """
+    ผลค้นหาแบบ user-independent (ลำดับ song_id + card payload)
+    เก็บใน cache ตามพารามิเตอร์ที่ normalize แล้ว และผูกกับ catalog version
+    """
+    q, mood, limit = normalize_search_params(q, mood, limit)
+    digest = hashlib.md5(json.dumps([q, mood, limit]).encode('utf-8')).hexdigest()
+    key = f"matcher:search:{catalog_version()}:{digest}"
+
+    cards = cache.get(key)
+    if cards is None:
+        cards = search_songs(q=q, mood=mood, limit=limit)
+        cache.set(key, cards, SEARCH_CACHE_TIMEOUT)
+    return cards
+
+
+def with_liked_flags(cards, user):
+    """
+    Overlay สถานะ is_liked ของ user ลงบน card ที่ได้จาก cache
+    (query เฉพาะ song_id ที่อยู่ในผลลัพธ์ ไม่ดึงทั้งหมดของ user)
+    """
+    liked_ids = liked_song_ids(user, song_ids=[card["song_id"] for card in cards])
+    return [{**card, "is_liked": card["song_id"] in liked_ids} for card in cards]
+
+
+# ==========================================
+# 🎭 MOOD PROBABILITY RANKING
+# ==========================================
+def songs_by_mood_probability(mood, limit=10, pool_size=MOOD_POOL_SIZE):
+    """
+    เพลงที่ P(mood) ใน Song.mood_probs สูงสุด (คำนวณโดย `manage.py score_audio_moods`)
+    สุ่ม `limit` เพลงจาก top `pool_size` แล้วเรียงตาม probability — คืน [] ถ้ายังไม่เคย score
+    """
+    key = (mood or '').strip().lower()
+    ranked = list(
+        Song.objects.select_related('artist')
+        .annotate(mood_score=Cast(KT(f'mood_probs__{key}'), FloatField()))
+        .filter(mood_score__gt=0)
+        .order_by('-mood_score', 'song_id')[:max(limit, pool_size)]
+    )
+    picked = random.sample(ranked, min(limit, len(ranked)))
+    return sorted(picked, key=lambda song: song.mood_score, reverse=True)
+
+
+# ==========================================
+# ⚡ JSON RESPONSE
+# ==========================================
+def dumps(payload):
+    """ Serialize เป็น bytes ด้วย orjson ถ้ามี ไม่งั้นใช้ json แบบ compact """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def fast_json_response(payload, status=200):
+    return HttpResponse(dumps(payload), content_type='application/json', status=status)
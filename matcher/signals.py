@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Song, Artist, Album
+from .search import bump_catalog_version
+
+
+# ==========================================
+# 🔄 CATALOG CHANGES -> INVALIDATE CACHES
+# ==========================================
+@receiver(post_save, sender=Song)
+@receiver(post_delete, sender=Song)
+@receiver(post_save, sender=Artist)
+@receiver(post_delete, sender=Artist)
+@receiver(post_save, sender=Album)
+@receiver(post_delete, sender=Album)
+def catalog_changed(sender, **kwargs):
+    # bulk_create / bulk_update / queryset.update ไม่ส่ง signal
+    # โค้ดที่ใช้ bulk ต้องเรียก bump_catalog_version() เอง
+    bump_catalog_version()
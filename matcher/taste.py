@@ -0,0 +1,136 @@
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Song, Interaction, UserTasteProfile
+from .upserts import upsert
+
+FEATURES = UserTasteProfile.AUDIO_FEATURES
+PROFILE_FIELDS = [
+    'like_count', 'genre_counts', 'mood_counts',
+    *[f'{feature}_sum' for feature in FEATURES],
+    'top_genre', 'updated_at',
+]
+
+
+def pick_top_genre(genre_counts):
+    """ แนวเพลงที่ like มากที่สุด (เสมอกันเลือกตามตัวอักษร เหมือน top_genres_for_users) """
+    ranked = [(-n, genre) for genre, n in genre_counts.items() if n > 0]
+    return min(ranked)[1] if ranked else None
+
+
+def _bump(counts, key, delta):
+    if not key:
+        return
+    n = counts.get(key, 0) + delta
+    if n > 0:
+        counts[key] = n
+    else:
+        counts.pop(key, None)
+
+
+# ==========================================
+# ➕ INCREMENTAL UPDATE
+# ==========================================
+def like_deltas(states):
+    """
+    states = {(user_id, song_id): type ใหม่ | None (ลบ)}
+    อ่านสถานะเดิมจาก DB ด้วย query เดียว แล้วคืน {(user_id, song_id): +1 | -1}
+    เฉพาะคู่ที่สถานะ like เปลี่ยนจริง
+    """
+    if not states:
+        return {}
+    by_user = {}
+    for user_id, song_id in states:
+        by_user.setdefault(user_id, []).append(song_id)
+    pairs = Q()
+    for user_id, song_ids in by_user.items():
+        pairs |= Q(user_id=user_id, song_id__in=song_ids)
+
+    old_types = {
+        (user_id, song_id): type
+        for user_id, song_id, type in Interaction.objects.filter(pairs).values_list('user_id', 'song_id', 'type')
+    }
+    deltas = {}
+    for key, new_type in states.items():
+        delta = int(new_type == 'like') - int(old_types.get(key) == 'like')
+        if delta:
+            deltas[key] = delta
+    return deltas
+
+
+def apply_like_deltas(deltas):
+    """
+    ปรับ running counts/sums ของ profile ตาม deltas จาก like_deltas()
+    ต้องเรียกใน transaction เดียวกับการเขียน Interaction และ *ก่อน* เขียน
+    (user ที่ยังไม่มี profile จะถูก rebuild จากสถานะเดิมใน DB ก่อน แล้วจึงบวก delta)
+    """
+    if not deltas:
+        return 0
+    user_ids = {user_id for user_id, _ in deltas}
+    song_ids = {song_id for _, song_id in deltas}
+
+    existing = set(UserTasteProfile.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    if user_ids - existing:
+        rebuild_taste_profiles(user_ids - existing)
+
+    songs = {
+        row['song_id']: row
+        for row in Song.objects.filter(song_id__in=song_ids).values('song_id', 'json_genre', 'json_mood', *FEATURES)
+    }
+    profiles = {p.user_id: p for p in UserTasteProfile.objects.select_for_update().filter(user_id__in=user_ids)}
+
+    for (user_id, song_id), delta in deltas.items():
+        song, profile = songs.get(song_id), profiles.get(user_id)
+        if song is None or profile is None:
+            continue
+        profile.like_count = max(0, profile.like_count + delta)
+        _bump(profile.genre_counts, song['json_genre'], delta)
+        _bump(profile.mood_counts, song['json_mood'], delta)
+        for feature in FEATURES:
+            total = getattr(profile, f'{feature}_sum') + delta * (song[feature] or 0)
+            # ไม่เหลือ like แล้ว: รีเซ็ตเป็น 0 กัน float drift
+            setattr(profile, f'{feature}_sum', total if profile.like_count else 0.0)
+
+    now = timezone.now()
+    for profile in profiles.values():
+        profile.top_genre = pick_top_genre(profile.genre_counts)
+        profile.updated_at = now
+    UserTasteProfile.objects.bulk_update(profiles.values(), PROFILE_FIELDS, batch_size=500)
+    return len(profiles)
+
+
+# ==========================================
+# 🔁 RECONCILE (batch rebuild)
+# ==========================================
+def rebuild_taste_profiles(user_ids):
+    """ คำนวณ profile ของ user ชุดนี้ใหม่ทั้งหมดจาก Interaction (3 aggregate queries + 1 upsert) """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+    likes = Interaction.objects.filter(type='like', user_id__in=user_ids)
+
+    profiles = {user_id: UserTasteProfile(user_id=user_id, genre_counts={}, mood_counts={}) for user_id in user_ids}
+
+    totals = likes.values('user_id').annotate(
+        n=Count('id'),
+        **{f'{feature}_sum': Sum(f'song__{feature}') for feature in FEATURES}
+    )
+    for row in totals:
+        profile = profiles[row['user_id']]
+        profile.like_count = row['n']
+        for feature in FEATURES:
+            setattr(profile, f'{feature}_sum', row[f'{feature}_sum'] or 0.0)
+
+    for field, attr in (('json_genre', 'genre_counts'), ('json_mood', 'mood_counts')):
+        rows = likes.exclude(**{f'song__{field}__isnull': True}).exclude(**{f'song__{field}': ''}) \
+            .values_list('user_id', f'song__{field}').annotate(n=Count('id'))
+        for user_id, value, n in rows:
+            getattr(profiles[user_id], attr)[value] = n
+
+    now = timezone.now()
+    for profile in profiles.values():
+        profile.top_genre = pick_top_genre(profile.genre_counts)
+        profile.updated_at = now
+
+    upsert(UserTasteProfile, list(profiles.values()), unique_fields=['user'], update_fields=PROFILE_FIELDS)
+    return len(profiles)
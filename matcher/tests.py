@@ -1,3 +1,1034 @@
-from django.test import TestCase
+import contextlib
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import Workbook
+
+import genius
+from .analytics import user_demographics, top_genres_for_users
+from .audio_features import (
+    AudioFeatureClient, FeatureCache, DEFAULT_FEATURES, enrich_audio_features, songs_needing_features,
+)
+from .dashboard import compute_dashboard, dashboard_snapshot
+from .dedup import merge_songs, normalize_artist, blocking_keys
+from .events import EventBuffer, REMOVED, write_interactions
+from .exports import export_chunks, stream_export
+from .facets import catalog_facets, count_matching, facet_options, CountedPaginator
+from . import import_jobs
+from .import_jobs import STALE_AFTER, job_payload, request_cancel, run_import_job, start_import_job
+from .importer import SongImporter
+from .keyset import keyset_page
+from .management.commands.import_workbook import WorkbookImporter, field_limits
+from .models import (
+    User, Artist, Album, Song, SongLyrics, Interaction, PlayHistory, LikeEvent,
+    UserScanLog, MetricRollup, RollupWatermark, UserTasteProfile, FavoriteSong, DashboardSnapshot,
+    ImportJob, Category,
+)
+from .rollups import rollup_metric
+from .workbook import stage_workbook, read_staged
+from .taste import like_deltas, rebuild_taste_profiles
+from .search import (
+    CATALOG_VERSION_KEY, PLACEHOLDER_COVER, bump_catalog_version, cached_search_songs, search_songs,
+    songs_by_mood_probability,
+)
+
+
+# ==========================================
+# 🌐 STUB HTTP SERVER (แทน API ภายนอก)
+# ==========================================
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        with self.server.lock:
+            self.server.requests.append((url.path, query))
+            failure = self.server.failures.pop(0) if self.server.failures else None
+        status, headers = failure or (200, {})
+        data = json.dumps({} if failure else self.server.respond(url.path, query)).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubServer(ThreadingHTTPServer):
+    """ http.server บน port สุ่ม — failures = คิว (status, headers) ที่ตอบก่อน แล้วค่อยตอบ respond(path, query) """
+
+    def __init__(self, respond):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.respond = respond
+        self.failures = []
+        self.requests = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# ==========================================
+# 📨 EVENT BUFFER
+# ==========================================
+class EventBufferFlushTests(TestCase):
+    def setUp(self):
+        artist = Artist.objects.create(name='Bodyslam')
+        self.song = Song.objects.create(title='A', artist=artist)
+        self.other = Song.objects.create(title='B', artist=artist)
+        self.user = User.objects.create_user('u1', password='x')
+        self.buffer = EventBuffer(max_events=10_000, interval=3600)
+        cache.clear()
+
+    def test_rejects_unknown_interaction_type(self):
+        with self.assertRaises(ValueError):
+            self.buffer.set_interaction(self.user.pk, self.song.song_id, type='x' * 30)
+
+    def test_bad_row_is_dead_lettered_not_requeued(self):
+        self.buffer.set_interaction(self.user.pk, self.song.song_id, type='like', rating=1)
+        self.buffer.add_play(self.user.pk, self.song.song_id, event='play', position=1)
+        self.buffer.add_play(self.user.pk, self.song.song_id, event='play', position=-1)  # ขัด CHECK >= 0
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(Interaction.objects.get().type, 'like')
+        self.assertEqual(PlayHistory.objects.count(), 1)
+        self.assertEqual(len(self.buffer.dead_letters), 1)
+        self.assertEqual(self.buffer._pending, 0)
+
+        # รอบถัดไปไม่ติดค้างกับแถวเสีย
+        self.buffer.set_interaction(self.user.pk, self.other.song_id, type='dislike')
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_events_for_deleted_song_are_dropped(self):
+        self.buffer.set_interaction(self.user.pk, self.song.song_id, type='like')
+        self.buffer.add_play(self.user.pk, self.song.song_id)
+        self.buffer.set_interaction(self.user.pk, self.other.song_id, type='like')
+        self.song.delete()
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(list(Interaction.objects.values_list('song_id', flat=True)), [self.other.song_id])
+        self.assertEqual(len(self.buffer.dead_letters), 2)
+
+    def test_pending_state_is_shared_across_workers(self):
+        other_worker = EventBuffer(max_events=10_000, interval=3600)  # process อื่นที่ใช้ cache กลางเดียวกัน
+        self.buffer.set_interaction(self.user.pk, self.song.song_id, type='like', rating=1)
+        self.assertEqual(other_worker.get_interaction(self.user.pk, self.song.song_id), (True, ('like', 1)))
+        self.assertEqual(other_worker.overlay_likes(self.user.pk, set()), {self.song.song_id})
+
+        # worker อื่น toggle ทีหลัง -> สถานะเก่าของ worker แรกต้องไม่เขียนทับตอน flush
+        other_worker.set_interaction(self.user.pk, self.song.song_id, type=None)
+        self.assertEqual(self.buffer.get_interaction(self.user.pk, self.song.song_id), (True, None))
+        self.buffer.flush()
+        other_worker.flush()
+        self.assertFalse(Interaction.objects.exists())
+
+
+class AddToPlaylistTests(TestCase):
+    def test_like_from_playlist_is_logged_for_rollup(self):
+        artist = Artist.objects.create(name='Bodyslam')
+        song = Song.objects.create(title='A', artist=artist)
+        user = User.objects.create_user('u1', password='x')
+        client = Client()
+        client.force_login(user)
+
+        client.get(f'/playlist/add/{song.song_id}/')
+        client.get(f'/playlist/add/{song.song_id}/')  # กดซ้ำ -> ไม่ใช่ like ใหม่
+        self.assertEqual(Interaction.objects.get(user=user).type, 'like')
+        self.assertEqual(list(LikeEvent.objects.values_list('song_id', 'liked')), [(song.song_id, True)])
+
+
+class InteractionTypeValidationTests(TestCase):
+    def setUp(self):
+        artist = Artist.objects.create(name='Bodyslam')
+        self.song = Song.objects.create(title='A', artist=artist)
+        self.client = Client()
+        self.client.force_login(User.objects.create_user('u1', password='x'))
+
+    def test_record_interaction_rejects_unknown_type(self):
+        response = self.client.get(f'/interaction/{self.song.song_id}/superlongbogusactiontype/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_submit_feedback_rejects_unknown_type(self):
+        response = self.client.post('/api/feedback/', {'song_id': self.song.song_id, 'type': 'love'})
+        self.assertEqual(response.status_code, 400)
+
+
+# ==========================================
+# 📊 ANALYTICS ROLLUP
+# ==========================================
+class RollupSafetyLagTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('u1', password='x')
+
+    def scan(self, age):
+        log = UserScanLog.objects.create(user=self.user, input_image='x.jpg', detected_emotion='happy')
+        UserScanLog.objects.filter(pk=log.pk).update(created_at=timezone.now() - datetime.timedelta(seconds=age))
+        return log
+
+    def total(self):
+        return sum(MetricRollup.objects.filter(metric='scans', granularity='day').values_list('count', flat=True))
+
+    def test_watermark_stops_before_recent_rows(self):
+        self.scan(age=3600)
+        recent = self.scan(age=0)  # เหมือน transaction ที่เพิ่ง commit / ยังไม่ commit
+        rollup_metric('scans', safety_lag=300)
+        self.assertEqual(self.total(), 1)
+        self.assertLess(RollupWatermark.objects.get(source='scans').last_id, recent.pk)
+
+        UserScanLog.objects.filter(pk=recent.pk).update(created_at=timezone.now() - datetime.timedelta(seconds=600))
+        rollup_metric('scans', safety_lag=300)
+        self.assertEqual(self.total(), 2)
+
+
+class LikesRollupTests(TestCase):
+    def test_like_after_flip_is_counted(self):
+        artist = Artist.objects.create(name='Bodyslam')
+        song = Song.objects.create(title='A', artist=artist, json_genre='Rock')
+        user = User.objects.create_user('u1', password='x')
+        buffer = EventBuffer(max_events=10_000, interval=3600)
+        cache.clear()
+
+        for type in ('like', 'dislike', 'like'):  # upsert ทับแถวเดิม แต่ LikeEvent ต่อท้ายทุกครั้ง
+            buffer.set_interaction(user.pk, song.song_id, type=type)
+            buffer.flush()
+        self.assertEqual(Interaction.objects.count(), 1)
+        self.assertEqual(list(LikeEvent.objects.order_by('id').values_list('liked', flat=True)), [True, False, True])
+
+        rollup_metric('likes', safety_lag=0)
+        counts = MetricRollup.objects.filter(metric='likes', granularity='day').values_list('dimension', 'count')
+        self.assertEqual(list(counts), [('Rock', 2)])
+
+
+# ==========================================
+# 🎚️ AUDIO FEATURE ENRICHMENT
+# ==========================================
+def audio_features_response(path, query):
+    ids = query['ids'][0].split(',')
+    return {'audio_features': [
+        {'id': sid, 'valence': 0.1, 'energy': 0.9, 'tempo': 99.0, 'danceability': 0.3} for sid in ids
+    ]}
+
+
+class EnrichAudioFeaturesTests(TestCase):
+    def setUp(self):
+        self.server = StubServer(audio_features_response)
+        self.addCleanup(self.server.stop)
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+        artist = Artist.objects.create(name='Bodyslam')
+        Song.objects.bulk_create([Song(title=f's{i}', artist=artist, spotify_id=f'sp{i:03d}') for i in range(250)])
+
+    def enrich(self):
+        client = AudioFeatureClient(self.server.url, token='test', retries=3)
+        return enrich_audio_features(client, FeatureCache(self.cache_dir), workers=1, log=lambda message: None)
+
+    def test_batches_retries_and_writes_features(self):
+        self.server.failures = [(503, {}), (429, {'Retry-After': '2'})]
+        with mock.patch('matcher.audio_features.time.sleep') as sleep:
+            stats = self.enrich()
+
+        # 3 batch (100 + 100 + 50) + retry 2 ครั้งของ batch แรก
+        self.assertEqual(len(self.server.requests), 5)
+        sizes = [len(query['ids'][0].split(',')) for _, query in self.server.requests]
+        self.assertEqual(sorted(sizes[2:]), [50, 100, 100])
+        self.assertLessEqual(max(sizes), 100)
+        delays = [call.args[0] for call in sleep.call_args_list]
+        self.assertTrue(0.5 <= delays[0] <= 1.0)  # 5xx -> exponential backoff
+        self.assertEqual(delays[1], 2.0)          # 429 -> ตาม Retry-After
+
+        self.assertEqual((stats['updated'], stats['failed'], stats['requests']), (250, 0, 3))
+        self.assertFalse(songs_needing_features().exists())
+        song = Song.objects.get(spotify_id='sp042')
+        self.assertEqual((song.valence, song.energy, song.tempo, song.danceability), (0.1, 0.9, 99.0, 0.3))
+
+    def test_second_run_is_served_from_disk_cache(self):
+        self.enrich()
+        Song.objects.update(**DEFAULT_FEATURES)
+        self.server.requests.clear()
+
+        stats = self.enrich()
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual((stats['cached'], stats['fetched'], stats['updated']), (250, 0, 250))
+        self.assertFalse(songs_needing_features().exists())
+
+
+# ==========================================
+# 🎤 GENIUS SCRAPER (genius.py)
+# ==========================================
+GENIUS_ARTISTS = {'Alpha': 1, 'Beta': 2}
+GENIUS_SONGS_PER_PAGE = 3
+
+
+def genius_response(path, query):
+    parts = path.strip('/').split('/')
+    if parts[0] == 'search':
+        name = query['q'][0]
+        if name not in GENIUS_ARTISTS:
+            return {'response': {'hits': []}}
+        return {'response': {'hits': [{'result': {'primary_artist': {'id': GENIUS_ARTISTS[name], 'name': name}}}]}}
+    if parts[0] == 'artists':
+        artist_id, page = int(parts[1]), int(query['page'][0])
+        songs = [
+            {'id': artist_id * 100 + (page - 1) * GENIUS_SONGS_PER_PAGE + i, 'title': f'Song {artist_id}-{page}-{i}',
+             'artist_names': f'Artist {artist_id}', 'lyrics_state': 'complete', 'release_date': '2020-01-01'}
+            for i in range(GENIUS_SONGS_PER_PAGE)
+        ]
+        return {'response': {'songs': songs, 'next_page': page + 1 if page < 2 else None}}
+    return {'response': {'song': {'id': int(parts[1]), 'release_date': '2020-01-01'}}}
+
+
+class GeniusScraperTests(TestCase):
+    def setUp(self):
+        self.server = StubServer(genius_response)
+        self.addCleanup(self.server.stop)
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.output = os.path.join(self.workdir, 'songs.jsonl')
+        self.state = os.path.join(self.workdir, 'songs.state.json')
+
+    def scrape(self, artists):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return genius.scrape_genius_super_safe(
+                artists=artists, workers=2, rate=1000, api_root=self.server.url,
+                output=self.output, state_path=self.state, token='test',
+            )
+
+    def test_token_bucket_limits_request_rate(self):
+        client = genius.GeniusClient('test', api_root=self.server.url, bucket=genius.TokenBucket(20, 1))
+        started = time.monotonic()
+        for _ in range(6):
+            client.api('search', q='Alpha')
+        self.assertGreaterEqual(time.monotonic() - started, 5 / 20)  # token แรกมีอยู่แล้ว อีก 5 ต้องรอ
+        self.assertEqual(len(self.server.requests), 6)
+
+    def test_retries_on_429_and_5xx(self):
+        self.server.failures = [(503, {'Retry-After': '0'}), (429, {'Retry-After': '0'})]
+        client = genius.GeniusClient('test', api_root=self.server.url, bucket=genius.TokenBucket(1000, 10))
+        self.assertEqual(client.find_artist('Alpha')['id'], 1)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_checkpoint_is_append_only_and_resume_skips_finished_artists(self):
+        count, failed = self.scrape(['Alpha'])
+        self.assertEqual((count, failed), (2 * GENIUS_SONGS_PER_PAGE, []))
+        with open(self.output, encoding='utf-8') as f:
+            first_run = f.read()
+
+        self.server.requests.clear()
+        count, failed = self.scrape(['Alpha', 'Beta'])
+        self.assertEqual((count, failed), (4 * GENIUS_SONGS_PER_PAGE, []))
+        with open(self.output, encoding='utf-8') as f:
+            second_run = f.read()
+        self.assertTrue(second_run.startswith(first_run))  # ไม่เขียนทับของเดิม ต่อท้ายอย่างเดียว
+        self.assertEqual(len(second_run.splitlines()), 4 * GENIUS_SONGS_PER_PAGE)
+
+        # Alpha เสร็จแล้วในรอบแรก -> รอบนี้ไม่มี request ของ Alpha เลย
+        self.assertNotIn(('/search', {'q': ['Alpha']}), self.server.requests)
+        self.assertFalse([path for path, _ in self.server.requests if path.startswith('/artists/1/')])
+        with open(self.state, encoding='utf-8') as f:
+            self.assertTrue(all(artist['done'] for artist in json.load(f).values()))
+
+    def test_missing_token_fails_clearly(self):
+        with mock.patch.object(genius, 'GENIUS_ACCESS_TOKEN', None):
+            with self.assertRaises(genius.GeniusError):
+                genius.scrape_genius_super_safe(artists=['Alpha'], api_root=self.server.url,
+                                                output=self.output, state_path=self.state)
+            with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                genius.main(['--api-root', self.server.url, '--output', self.output])
+        self.assertEqual(self.server.requests, [])
+
+
+# ==========================================
+# 🧬 DEDUP
+# ==========================================
+class ArtistNormalizationTests(TestCase):
+    def test_splits_only_on_explicit_credit_markers(self):
+        self.assertEqual(normalize_artist('Simon and Garfunkel'), 'simon and garfunkel')
+        self.assertEqual(normalize_artist('Crosby, Stills & Nash'), 'crosby')
+        self.assertEqual(normalize_artist('Bodyslam feat. Palmy'), 'bodyslam')
+        self.assertEqual(normalize_artist('Three Man Down ft. Ink Waruntorn'), 'three man down')
+
+    def test_full_credit_is_a_second_blocking_key(self):
+        keys = blocking_keys('september', normalize_artist('Earth, Wind & Fire'), 'earth wind fire')
+        self.assertIn(('a', 'earth wind fire', 'sept'), keys)
+        self.assertEqual(len(blocking_keys('september', 'bodyslam', 'bodyslam')), 2)
+
+
+class MergeSongsTests(TestCase):
+    def test_buffered_events_for_duplicate_move_to_keeper(self):
+        artist = Artist.objects.create(name='Bodyslam')
+        keeper = Song.objects.create(title='Kwam Rak', artist=artist)
+        duplicate = Song.objects.create(title='Kwam Rak (Remastered)', artist=artist)
+        user = User.objects.create_user('u1', password='x')
+        cache.clear()
+        other_worker = EventBuffer(max_events=10_000, interval=3600)
+        other_worker.set_interaction(user.pk, duplicate.song_id, type='like')
+        other_worker.add_play(user.pk, duplicate.song_id)
+
+        with mock.patch('matcher.dedup.event_buffer') as local_buffer:
+            merge_songs({duplicate.song_id: keeper.song_id})
+        local_buffer.flush.assert_called_once()
+
+        self.assertEqual(other_worker.flush(), 2)
+        self.assertEqual(list(other_worker.dead_letters), [])
+        self.assertEqual(Interaction.objects.get(user=user).song_id, keeper.song_id)
+        self.assertEqual(PlayHistory.objects.get(user=user).song_id, keeper.song_id)
+
+
+# ==========================================
+# 📥 SONG IMPORTER
+# ==========================================
+class SongImporterTests(TestCase):
+    def importer(self):
+        return SongImporter(batch_size=10, log=lambda message: None)
+
+    def test_upsert_onto_existing_spotify_id_counts_as_updated(self):
+        importer = self.importer()
+        importer.preload()
+        # import อื่นเพิ่มเพลงนี้หลัง preload -> upsert ชน spotify_id
+        Song.objects.create(title='Old title', artist=Artist.objects.create(name='Bodyslam'), spotify_id='sp1')
+
+        stats = importer.run([
+            {'title': 'Kwam Rak', 'artist': 'Bodyslam', 'spotify': {'id': 'sp1'}},
+            {'title': 'Yang Yang', 'artist': 'Bodyslam', 'spotify': {'id': 'sp2'}},
+        ])
+        self.assertEqual((stats['created'], stats['updated']), (1, 1))
+        self.assertEqual(Song.objects.get(spotify_id='sp1').title, 'Kwam Rak')
+        self.assertEqual(Song.objects.count(), 2)
+
+    def test_reimport_keeps_enriched_features_and_predicted_mood(self):
+        record = {'title': 'Kwam Rak', 'artist': 'Bodyslam', 'lyrics': 'v1', 'spotify': {'id': 'sp1'}}
+        self.importer().run([record])
+        song = Song.objects.get()
+        self.assertEqual((song.valence, song.tempo), (0.5, 120.0))
+        # ค่าที่ enrich_audio_features / backfill_moods เติมทีหลัง
+        Song.objects.update(valence=0.9, energy=0.8, tempo=140.0, danceability=0.7, json_mood='sad', mood_confidence=0.75)
+
+        stats = self.importer().run([{**record, 'lyrics': 'v2', 'audio_features': {'tempo': 150.0}}])
+        self.assertEqual(stats['updated'], 1)
+        song = Song.objects.get()
+        self.assertEqual((song.valence, song.energy, song.tempo, song.danceability), (0.9, 0.8, 150.0, 0.7))
+        self.assertEqual((song.json_mood, song.mood_confidence), ('sad', 0.75))
+        self.assertEqual(song.lyrics.text, 'v2')
+
+        # ไฟล์ต้นทางมี mood จริง -> ทับค่าที่โมเดลทาย
+        self.importer().run([{**record, 'lyrics': 'v2', 'mood': 'Happy'}])
+        song = Song.objects.get()
+        self.assertEqual((song.json_mood, song.mood_confidence, song.tempo), ('Happy', None, 150.0))
+
+    DUMP = [
+        {'title': 'Kwam Rak', 'artist': 'Bodyslam', 'album': 'Believe', 'lyrics': 'v1', 'spotify': {'id': 'sp1'}},
+        {'title': 'Yang Yang', 'artist': 'Bodyslam', 'genre': 'Rock', 'audio_features': {'tempo': 98.0}},
+        {'title': 'Ruk', 'artist': 'Palmy', 'mood': 'Happy'},
+    ]
+
+    def test_reimport_of_same_dump_writes_nothing(self):
+        self.assertEqual(self.importer().run(self.DUMP)['created'], 3)
+
+        # ลำดับ key ในไฟล์ต่างไปไม่มีผลกับ hash
+        shuffled = [dict(reversed(list(item.items()))) for item in self.DUMP]
+        with CaptureQueriesContext(connection) as queries:
+            stats = self.importer().run(shuffled)
+        self.assertEqual((stats['created'], stats['updated'], stats['unchanged']), (0, 0, 3))
+        writes = [q['sql'] for q in queries if q['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+
+    def test_counts_created_updated_and_unchanged(self):
+        self.importer().run(self.DUMP)
+        stats = self.importer().run([
+            {**self.DUMP[0], 'lyrics': 'v2'},                 # เนื้อเพลงเปลี่ยน
+            self.DUMP[1],                                      # เหมือนเดิม
+            {'title': 'Plai Tang', 'artist': 'Palmy'},         # ใหม่
+            {'title': None},                                   # ข้าม
+        ])
+        self.assertEqual(
+            {k: stats[k] for k in ('created', 'updated', 'unchanged', 'skipped')},
+            {'created': 1, 'updated': 1, 'unchanged': 1, 'skipped': 1},
+        )
+        self.assertEqual(SongLyrics.objects.get(song__spotify_id='sp1').text, 'v2')
+        self.assertEqual(Song.objects.count(), 4)
+
+    def test_last_duplicate_in_batch_wins(self):
+        self.importer().run(self.DUMP)
+        stats = self.importer().run([{**self.DUMP[2], 'genre': 'Pop'}, self.DUMP[2]])
+        # ตัวหลังเหมือน import ครั้งก่อน -> การแก้ของตัวแรกถูกยกเลิก (นับเป็นเพลงเดียว)
+        self.assertEqual((stats['updated'], stats['unchanged']), (0, 1))
+        self.assertEqual(Song.objects.get(title='Ruk').json_genre, '')
+
+
+# ==========================================
+# 📒 WORKBOOK IMPORT
+# ==========================================
+def workbook_user(email, username, **extra):
+    return {'email': email, 'username': username, 'password': '', 'status': 'Active',
+            'created_at': None, 'age': None, 'gender': '', **extra}
+
+
+class WorkbookUserImportTests(TestCase):
+    def import_users(self, records):
+        return WorkbookImporter(log=lambda message: None).load('users', records)
+
+    def test_reimport_is_idempotent(self):
+        rows = [workbook_user('a@x.com', 'alice', password='secret'), workbook_user('b@x.com', 'alice', age=30)]
+        first = self.import_users(rows)
+        self.assertEqual((first['users_created'], first['users_renamed']), (2, 0))
+
+        for _ in range(2):
+            again = self.import_users(rows)
+            self.assertEqual((again['users_created'], again['users_updated'], again['users_renamed']), (0, 0, 0))
+        self.assertEqual(
+            dict(User.objects.values_list('email', 'username')), {'a@x.com': 'alice', 'b@x.com': 'alice_2'},
+        )
+
+    def test_counts_only_users_whose_fields_changed(self):
+        self.import_users([workbook_user('a@x.com', 'alice'), workbook_user('b@x.com', 'bob')])
+        stats = self.import_users([workbook_user('a@x.com', 'alice', age=31), workbook_user('b@x.com', 'bob')])
+        self.assertEqual(stats['users_updated'], 1)
+        self.assertEqual(User.objects.get(email='a@x.com').age, 31)
+
+
+class WorkbookStagingTests(TestCase):
+    SHEETS = {
+        'users': [('Email', 'Username', 'Age', 'Joined'), ('a@x.com', 'alice', 25, '2024-01-05'), ('broken', 'bob', None, None)],
+        'artists': [('Artist Name', 'Photo'), ('Bodyslam', 'http://img/b.jpg'), (None, None)],
+        'albums': [('Album', 'Artist', 'Year'), ('Believe', 'Bodyslam', 2016)],
+        'songs': [
+            ('Song Title', 'Artist', 'Album', 'BPM', 'Lyric'),
+            ('Kwam Rak', 'Bodyslam', 'Believe', '98', 'ท่อนแรก'),
+            ('Yang Yang', 'Bodyslam', None, 'fast', ''),
+        ],
+        'genres': [('Genre',), ('Rock',)],
+        'song_genres': [('Song', 'Artist', 'Genre'), ('Kwam Rak', 'Bodyslam', 'Rock'), ('Missing', 'Bodyslam', 'Rock')],
+    }
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.path = os.path.join(self.workdir, 'data.xlsx')
+        wb = Workbook()
+        wb.remove(wb.active)
+        for name, rows in self.SHEETS.items():
+            ws = wb.create_sheet(name)
+            for row in rows:
+                ws.append(row)
+        wb.save(self.path)
+        cache.clear()
+
+    def stage(self, workers=1):
+        return stage_workbook(self.path, list(self.SHEETS), os.path.join(self.workdir, 'staged'), field_limits(), workers=workers)
+
+    def test_stage_validates_and_writes_compact_jsonl(self):
+        staged = self.stage(workers=2)  # parse ใน process pool
+        self.assertEqual(
+            {sheet: (r['rows'], r['invalid']) for sheet, r in staged.items()},
+            {'users': (1, 1), 'artists': (1, 0), 'albums': (1, 0), 'songs': (1, 1), 'genres': (1, 0), 'song_genres': (2, 0)},
+        )
+        self.assertEqual(staged['users']['errors'], [{'row': 3, 'error': "email ไม่ถูกต้อง ('broken')"}])
+        self.assertIn('tempo', staged['songs']['errors'][0]['error'])
+
+        [user] = read_staged(staged['users']['file'])
+        self.assertEqual((user['username'], user['age'], user['created_at']), ('alice', 25, '2024-01-05T00:00:00'))
+        [album] = read_staged(staged['albums']['file'])
+        self.assertEqual(album['release_date'], '2016-01-01')  # year -> 1 ม.ค.
+        [song] = read_staged(staged['songs']['file'])
+        self.assertEqual((song['tempo'], song['lyrics']), (98.0, 'ท่อนแรก'))
+
+    def test_load_staged_sheets_in_dependency_order(self):
+        staged = self.stage()
+        importer = WorkbookImporter(log=lambda message: None)
+        summary = {}
+        for sheet in self.SHEETS:
+            summary.update(importer.load(sheet, read_staged(staged[sheet]['file'])))
+
+        self.assertEqual(summary['users_created'], 1)
+        self.assertEqual(summary['songs_created'], 1)
+        self.assertEqual((summary['song_genres_linked'], summary['song_genres_unmatched']), (1, 1))
+        song = Song.objects.select_related('album', 'artist').get()
+        self.assertEqual((song.album.title, song.artist.image_url, song.tempo, song.json_genre), ('Believe', 'http://img/b.jpg', 98.0, 'Rock'))
+        self.assertEqual(song.lyrics.text, 'ท่อนแรก')
+        self.assertTrue(Category.objects.filter(type='GENRE', name='Rock').exists())
+        self.assertEqual(User.objects.get().date_joined.date(), datetime.date(2024, 1, 5))
+
+    def test_command_refuses_invalid_rows_unless_skipped(self):
+        out = io.StringIO()
+        call_command('import_workbook', self.path, '--dry-run', '--workers', '1', stdout=out)
+        self.assertIn('[DRY-RUN]', out.getvalue())
+        self.assertFalse(Song.objects.exists())
+
+        with self.assertRaises(CommandError):
+            call_command('import_workbook', self.path, '--workers', '1', stdout=io.StringIO())
+        self.assertFalse(User.objects.exists())
+
+        call_command('import_workbook', self.path, '--workers', '1', '--skip-invalid', stdout=io.StringIO())
+        self.assertEqual(Song.objects.get().json_genre, 'Rock')
+
+
+# ==========================================
+# 🔎 SONG SEARCH
+# ==========================================
+class SongSearchApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        artist = Artist.objects.create(name='Bodyslam')
+        album = Album.objects.create(title='Dharmajati', artist=artist, image_url='http://img/album.jpg')
+        self.with_album = Song.objects.create(
+            title='Kwam Rak', artist=artist, album=album, genius_url='http://genius/kwam-rak', json_mood='Sad',
+        )
+        self.bare = Song.objects.create(title='Yang Yang', artist=artist, spotify_link='http://spotify/yang')
+        SongLyrics.objects.create(song=self.bare, text='la la')
+        self.user = User.objects.create_user('u1', password='x')
+        Interaction.objects.create(user=self.user, song=self.bare, type='like')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_cards_resolve_fallbacks_and_liked_flag(self):
+        response = self.client.get('/api/search/', {'q': 'bodyslam'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        results = {card['song_id']: card for card in json.loads(response.content)['results']}
+        self.assertEqual(list(results), [self.bare.song_id, self.with_album.song_id])  # ใหม่สุดก่อน
+
+        card = results[self.with_album.song_id]
+        self.assertEqual(card, {
+            'song_id': self.with_album.song_id, 'title': 'Kwam Rak', 'artist': 'Bodyslam',
+            'cover_url': 'http://img/album.jpg', 'spotify_url': 'http://genius/kwam-rak',
+            'json_mood': 'Sad', 'is_liked': False,
+        })
+        card = results[self.bare.song_id]
+        self.assertEqual((card['cover_url'], card['spotify_url'], card['json_mood'], card['is_liked']),
+                         (PLACEHOLDER_COVER, 'http://spotify/yang', '', True))
+        self.assertNotIn('lyrics', card)
+
+    def test_search_is_one_projected_query(self):
+        with self.assertNumQueries(1):
+            cards = search_songs(q='yang', limit=10)
+        self.assertEqual([card['title'] for card in cards], ['Yang Yang'])
+
+
+class CatalogVersionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.artist = Artist.objects.create(name='Bodyslam')
+        self.song = Song.objects.create(title='Kwam Rak', artist=self.artist)
+
+    def titles(self, q=''):
+        return [card['title'] for card in cached_search_songs(q=q)]
+
+    def test_results_are_cached_until_catalog_changes(self):
+        self.assertEqual(self.titles(), ['Kwam Rak'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles(), ['Kwam Rak'])
+            self.assertEqual([c['title'] for c in cached_search_songs(q='  ', limit='50')], ['Kwam Rak'])  # normalize
+
+        Song.objects.create(title='Yang Yang', artist=self.artist)  # post_save -> bump
+        self.assertEqual(self.titles(), ['Yang Yang', 'Kwam Rak'])
+
+    def test_bulk_writes_need_explicit_bump(self):
+        self.titles()
+        Song.objects.filter(pk=self.song.pk).update(title='Renamed')  # ไม่ยิง signal
+        self.assertEqual(self.titles(), ['Kwam Rak'])
+        bump_catalog_version()
+        self.assertEqual(self.titles(), ['Renamed'])
+
+    def test_evicted_version_restarts_from_the_clock(self):
+        self.titles()
+        Song.objects.filter(pk=self.song.pk).update(title='Renamed')
+        cache.delete(CATALOG_VERSION_KEY)  # ถูก evict
+        with mock.patch('matcher.search.time.time', return_value=time.time() + 60):
+            self.assertEqual(self.titles(), ['Renamed'])
+
+
+# ==========================================
+# 📊 FACETS
+# ==========================================
+class CatalogFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        artist = Artist.objects.create(name='Bodyslam')
+        other = Artist.objects.create(name='Palmy')
+        Song.objects.bulk_create([
+            Song(title='A', artist=artist, json_mood='Sad', json_genre='Rock'),
+            Song(title='B', artist=artist, json_mood='Sad', json_genre='Pop Rock'),
+            Song(title='C', artist=other, json_mood='Happy', json_genre='Pop'),
+            Song(title='D', artist=other, json_mood=None, json_genre=''),
+        ])
+
+    def test_counts_per_mood_and_genre_in_one_query(self):
+        with self.assertNumQueries(1):  # GROUP BY (json_mood, json_genre) เดียว
+            facets = catalog_facets()
+        self.assertEqual(facets, {
+            'total': 4,
+            'moods': {'Sad': 2, 'Happy': 1},
+            'genres': {'Rock': 1, 'Pop Rock': 1, 'Pop': 1},
+        })
+        with self.assertNumQueries(0):
+            catalog_facets()
+
+    def test_filtered_counts_and_dropdown_options(self):
+        all_facets = catalog_facets()
+        filtered = catalog_facets(q='bodyslam', genre='', mood='')
+        self.assertEqual((filtered['total'], filtered['moods']), (2, {'Sad': 2}))
+        self.assertEqual(count_matching(all_facets['genres'], 'rock'), 2)  # icontains
+        self.assertEqual(facet_options(all_facets['moods'], filtered['moods']),
+                         [{'value': 'Happy', 'count': 0}, {'value': 'Sad', 'count': 2}])
+
+    def test_counted_paginator_skips_count_query(self):
+        paginator = CountedPaginator(Song.objects.order_by('song_id'), 3, count=4)
+        with self.assertNumQueries(1):
+            page = paginator.page(2)
+            self.assertEqual([song.title for song in page], ['D'])
+        self.assertEqual(paginator.num_pages, 2)
+
+
+# ==========================================
+# 👥 BEHAVIOR ANALYTICS
+# ==========================================
+class BehaviorAnalyticsTests(TestCase):
+    def test_demographics_in_one_conditional_aggregate(self):
+        for i, (age, gender) in enumerate([(20, 'M'), (30, 'F'), (41, 'F'), (None, 'O'), (None, None)]):
+            User.objects.create_user(f'u{i}', password='x', age=age, gender=gender)
+        with self.assertNumQueries(1):
+            stats = user_demographics()
+        self.assertEqual(stats, {
+            'total_users': 5, 'avg_age': 30,
+            'male_percent': 20.0, 'female_percent': 40.0, 'other_percent': 40.0,
+        })
+
+    def test_demographics_without_users(self):
+        self.assertEqual(user_demographics()['male_percent'], 0)
+
+    def test_top_genre_per_user_breaks_ties_by_name(self):
+        artist = Artist.objects.create(name='Bodyslam')
+        rock, pop, jazz = (Song.objects.create(title=g, artist=artist, json_genre=g) for g in ('Rock', 'Pop', 'Jazz'))
+        rock2 = Song.objects.create(title='Rock 2', artist=artist, json_genre='Rock')
+        u1, u2, u3 = (User.objects.create_user(f'u{i}', password='x') for i in range(3))
+        Interaction.objects.bulk_create([
+            Interaction(user=u1, song=rock, type='like'), Interaction(user=u1, song=rock2, type='like'),
+            Interaction(user=u1, song=pop, type='like'),
+            Interaction(user=u2, song=pop, type='like'), Interaction(user=u2, song=jazz, type='like'),
+            Interaction(user=u3, song=rock, type='dislike'),
+        ])
+        with self.assertNumQueries(1):
+            self.assertEqual(top_genres_for_users(), {u1.pk: 'Rock', u2.pk: 'Jazz'})
+        self.assertEqual(top_genres_for_users([u2.pk]), {u2.pk: 'Jazz'})
+
+
+class TasteProfileTests(TestCase):
+    def setUp(self):
+        artist = Artist.objects.create(name='Bodyslam')
+        self.rock = Song.objects.create(title='A', artist=artist, json_genre='Rock', json_mood='Sad', valence=0.2, energy=0.8)
+        self.pop = Song.objects.create(title='B', artist=artist, json_genre='Pop', json_mood='Happy', valence=0.9, energy=0.4)
+        self.user = User.objects.create_user('u1', password='x')
+
+    def profile(self):
+        return UserTasteProfile.objects.get(user=self.user)
+
+    def test_deltas_only_for_changed_like_state(self):
+        Interaction.objects.create(user=self.user, song=self.rock, type='like')
+        deltas = like_deltas({
+            (self.user.pk, self.rock.song_id): 'like',     # like เดิม -> ไม่เปลี่ยน
+            (self.user.pk, self.pop.song_id): 'like',      # ใหม่ -> +1
+        })
+        self.assertEqual(deltas, {(self.user.pk, self.pop.song_id): 1})
+        self.assertEqual(like_deltas({(self.user.pk, self.rock.song_id): 'dislike'}), {(self.user.pk, self.rock.song_id): -1})
+
+    def test_incremental_update_matches_rebuild(self):
+        write_interactions({self.user.pk: {self.rock.song_id: ('like', 1), self.pop.song_id: ('like', 1)}})
+        profile = self.profile()
+        self.assertEqual(profile.like_count, 2)
+        self.assertEqual(profile.genre_counts, {'Rock': 1, 'Pop': 1})
+        self.assertEqual(profile.top_genre, 'Pop')
+        self.assertAlmostEqual(profile.mean('valence'), 0.55)
+
+        write_interactions({self.user.pk: {self.pop.song_id: ('dislike', 0)}})
+        incremental = self.profile()
+        rebuild_taste_profiles([self.user.pk])
+        rebuilt = self.profile()
+        for field in ('like_count', 'genre_counts', 'mood_counts', 'top_genre'):
+            self.assertEqual(getattr(incremental, field), getattr(rebuilt, field))
+        self.assertAlmostEqual(incremental.energy_sum, rebuilt.energy_sum)
+        self.assertEqual(incremental.genre_counts, {'Rock': 1})
+
+    def test_removing_last_like_resets_profile(self):
+        write_interactions({self.user.pk: {self.rock.song_id: ('like', 1)}})
+        write_interactions({self.user.pk: {self.rock.song_id: REMOVED}})
+        profile = self.profile()
+        self.assertEqual((profile.like_count, profile.genre_counts, profile.top_genre), (0, {}, None))
+        self.assertEqual(profile.valence_sum, 0.0)
+        self.assertIsNone(profile.mean('valence'))
+        self.assertEqual(list(LikeEvent.objects.order_by('id').values_list('liked', flat=True)), [True, False])
+
+
+class DashboardSnapshotTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        artist = Artist.objects.create(name='Bodyslam')
+        self.hit, self.other = Song.objects.create(title='Hit', artist=artist), Song.objects.create(title='B', artist=artist)
+        old, new, banned = (User.objects.create_user(f'u{i}', password='x') for i in range(3))
+        User.objects.filter(pk=old.pk).update(date_joined=now - datetime.timedelta(days=60))
+        User.objects.filter(pk=banned.pk).update(is_active=False)
+        FavoriteSong.objects.bulk_create([
+            FavoriteSong(user=old, song=self.hit), FavoriteSong(user=new, song=self.hit), FavoriteSong(user=new, song=self.other),
+        ])
+        UserScanLog.objects.bulk_create([
+            UserScanLog(user=new, detected_emotion='happy'), UserScanLog(user=new, detected_emotion='happy'),
+            UserScanLog(user=old, detected_emotion=None),
+        ])
+
+    def test_kpis_in_three_queries(self):
+        with self.assertNumQueries(3):
+            data = compute_dashboard()
+        self.assertEqual(
+            (data['total_users'], data['active_users'], data['banned_users'], data['new_users_7d'], data['new_users_30d']),
+            (3, 2, 1, 2, 2),
+        )
+        self.assertEqual(data['growth_total'], 200.0)
+        self.assertEqual([(s['song_id'], s['like_count']) for s in data['most_liked_songs']], [(self.hit.song_id, 2), (self.other.song_id, 1)])
+        self.assertEqual((data['total_scans'], data['top_scanned_mood']), (3, 'happy'))
+
+    def test_missing_snapshot_is_computed_and_stored(self):
+        snapshot = dashboard_snapshot()
+        self.assertEqual(DashboardSnapshot.objects.get().data['total_users'], 3)
+        self.assertEqual(snapshot.data['total_users'], 3)
+
+    @mock.patch('matcher.dashboard._refresh_in_background')
+    def test_fresh_snapshot_is_one_read(self, refresh):
+        dashboard_snapshot()
+        with self.assertNumQueries(1):
+            dashboard_snapshot()
+        refresh.assert_not_called()
+
+    @mock.patch('matcher.dashboard._refresh_in_background')
+    def test_stale_snapshot_served_while_refreshing(self, refresh):
+        DashboardSnapshot.objects.create(
+            name='admin_dashboard', data={'total_users': 1},
+            computed_at=timezone.now() - datetime.timedelta(hours=1),
+        )
+        self.assertEqual(dashboard_snapshot(max_age=60).data, {'total_users': 1})
+        refresh.assert_called_once()
+
+
+class KeysetPaginationTests(TestCase):
+    FIELDS = ('date_joined', 'id')
+
+    def setUp(self):
+        joined = timezone.now().replace(microsecond=123456)
+        users = [User.objects.create_user(f'u{i}', password='x') for i in range(7)]
+        # ครึ่งหนึ่งสมัครเวลาเดียวกัน -> ต้องตัดสินด้วย id
+        User.objects.filter(pk__in=[u.pk for u in users[:4]]).update(date_joined=joined)
+        self.expected = list(User.objects.order_by('-date_joined', '-id').values_list('pk', flat=True))
+
+    def page(self, **kwargs):
+        return keyset_page(User.objects.all(), self.FIELDS, 3, **kwargs)
+
+    def test_walks_forward_and_back_across_ties(self):
+        pages = [self.page()]
+        while pages[-1].has_next:
+            pages.append(self.page(after=pages[-1].next_cursor))
+        self.assertEqual([[u.pk for u in p] for p in pages], [self.expected[0:3], self.expected[3:6], self.expected[6:]])
+        self.assertFalse(pages[0].has_previous)
+        self.assertTrue(pages[-1].has_previous)
+
+        back = self.page(before=pages[1].prev_cursor)
+        self.assertEqual([u.pk for u in back], self.expected[0:3])
+        self.assertFalse(back.has_previous)
+        self.assertTrue(back.has_next)
+
+    def test_exact_multiple_has_no_empty_last_page(self):
+        User.objects.get(pk=self.expected[-1]).delete()
+        second = self.page(after=self.page().next_cursor)
+        self.assertEqual(len(second), 3)
+        self.assertFalse(second.has_next)
+
+    def test_one_query_per_page(self):
+        first = self.page()
+        with self.assertNumQueries(1):
+            self.page(after=first.next_cursor)
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        for cursor in ('not-base64!', 'WyJ4Il0', 'WyJ4IiwgIngiXQ'):  # เสีย / ขนาดผิด / ค่าผิดชนิด
+            page = self.page(after=cursor)
+            self.assertEqual([u.pk for u in page], self.expected[0:3])
+            self.assertFalse(page.has_previous)
+
+
+class ExportChunkingTests(TestCase):
+    def setUp(self):
+        artist = Artist.objects.create(name='Bodyslam')
+        self.songs = [Song.objects.create(title=f'เพลง {i}', artist=artist) for i in range(5)]
+
+    def test_chunks_follow_primary_key_keyset(self):
+        with self.assertNumQueries(3):
+            chunks = list(export_chunks('songs', chunk_size=2))
+        self.assertEqual([len(c) for c in chunks], [2, 2, 1])
+        self.assertEqual([row[0] for c in chunks for row in c], [s.song_id for s in self.songs])
+
+    def test_exact_multiple_ends_with_empty_probe(self):
+        with self.assertNumQueries(2):
+            self.assertEqual([len(c) for c in export_chunks('songs', chunk_size=5)], [5])
+
+    def test_time_window(self):
+        old = timezone.now() - datetime.timedelta(days=10)
+        Song.objects.filter(pk__in=[s.pk for s in self.songs[:2]]).update(created_at=old)
+        rows = [row for c in export_chunks('songs', since=old + datetime.timedelta(days=1)) for row in c]
+        self.assertEqual([row[0] for row in rows], [s.song_id for s in self.songs[2:]])
+
+    def test_csv_streams_header_then_one_piece_per_chunk(self):
+        parts = list(stream_export('songs', 'csv', chunk_size=2))
+        self.assertEqual(len(parts), 4)
+        self.assertTrue(parts[0].startswith('\ufeffsong_id,title,artist__name'))
+        rows = list(csv.reader(io.StringIO(''.join(parts).lstrip('\ufeff'))))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][1:3], ['เพลง 0', 'Bodyslam'])
+
+    def test_unknown_export_or_format(self):
+        with self.assertRaises(ValueError):
+            stream_export('passwords')
+        with self.assertRaises(ValueError):
+            stream_export('songs', 'xlsx')
+
+    def test_view_streams_csv_for_staff(self):
+        client = Client()
+        client.force_login(User.objects.create_user('admin', password='x', is_staff=True))
+        response = client.get('/admin-custom/export/songs/', {'since': 'bad-date'})
+        self.assertEqual(response.status_code, 400)
+        response = client.get('/admin-custom/export/songs/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content).decode('utf-8').count('\n'), 6)
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir, True)
+        self.path = os.path.join(workdir, 'songdata.jsonl')
+        with open(self.path, 'w', encoding='utf-8') as fh:
+            for i in range(3):
+                fh.write(json.dumps({'title': f'เพลง {i}', 'artist': 'Bodyslam'}) + '\n')
+
+    def start(self, **kwargs):
+        with self.captureOnCommitCallbacks() as callbacks:
+            job, started = start_import_job(self.path, batch_size=1, **kwargs)
+        self.assertEqual(len(callbacks), int(started))  # thread เริ่มหลัง commit เท่านั้น
+        return job, started
+
+    def test_runs_to_completion(self):
+        job, started = self.start()
+        self.assertTrue(started)
+        run_import_job(job.pk)  # ทำงานของ thread แบบ synchronous
+        payload = job_payload(ImportJob.objects.get(pk=job.pk))
+        self.assertEqual((payload['status'], payload['created'], payload['total_records'], payload['percent']), ('succeeded', 3, 3, 100))
+        self.assertEqual(Song.objects.count(), 3)
+
+    def test_only_one_active_job(self):
+        job, _ = self.start()
+        again, started = self.start()
+        self.assertFalse(started)
+        self.assertEqual(again.pk, job.pk)
+
+    def test_cancel_before_start(self):
+        job, _ = self.start()
+        self.assertTrue(request_cancel(job))
+        run_import_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ('cancelled', 0))
+        self.assertFalse(request_cancel(job))  # จบแล้ว ยกเลิกซ้ำไม่ได้
+        self.assertFalse(Song.objects.exists())
+
+    def test_cancel_stops_after_current_batch(self):
+        job, _ = self.start()
+        progress_fields = import_jobs._progress_fields
+
+        def cancel_during_first_batch(importer):
+            # admin กดยกเลิกระหว่าง batch แรก -> worker เห็นธงหลัง batch นั้น
+            ImportJob.objects.filter(pk=job.pk).update(cancel_requested=True)
+            return progress_fields(importer)
+
+        with mock.patch.object(import_jobs, '_progress_fields', cancel_during_first_batch):
+            run_import_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ('cancelled', 1))
+        self.assertEqual(Song.objects.count(), 1)  # batch ที่ commit แล้วยังอยู่
+
+    def test_stale_job_expires_and_new_job_starts(self):
+        stale = ImportJob.objects.create(source=self.path, status='running')
+        ImportJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - STALE_AFTER - datetime.timedelta(seconds=1))
+        job, started = self.start()
+        self.assertTrue(started)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.message), ('failed', 'Worker stopped responding'))
+        self.assertIsNotNone(stale.finished_at)
+        self.assertNotEqual(job.pk, stale.pk)
+
+    def test_cancel_view_rejects_finished_job(self):
+        client = Client()
+        client.force_login(User.objects.create_user('admin', password='x', is_staff=True))
+        job = ImportJob.objects.create(source=self.path, status='succeeded')
+        response = client.post(f'/system/import-jobs/{job.pk}/cancel/')
+        self.assertEqual(response.status_code, 409)
+
+
+class MoodProbabilitySearchTests(TestCase):
+    def setUp(self):
+        artist = Artist.objects.create(name='Bodyslam')
+        probs = {'a': {'happy': 0.9, 'sad': 0.1}, 'b': {'happy': 0.4, 'sad': 0.6}, 'c': {'happy': 0.7},
+                 'd': {'sad': 1.0}, 'e': None}
+        self.songs = {title: Song.objects.create(title=title, artist=artist, json_mood='Sad', mood_probs=p) for title, p in probs.items()}
+        Song.objects.filter(title='e').update(json_mood='Happy')
+
+    def titles(self, songs):
+        return [song.title for song in songs]
+
+    def test_ranked_by_probability(self):
+        with self.assertNumQueries(1):
+            songs = songs_by_mood_probability(' Happy ', limit=10)
+        self.assertEqual(self.titles(songs), ['a', 'c', 'b'])  # ไม่มีค่า / ไม่เคย score -> ไม่นับ
+        self.assertEqual(songs[0].mood_score, 0.9)
+        self.assertEqual(songs[0].artist.name, 'Bodyslam')  # select_related
+
+    def test_samples_only_from_top_pool(self):
+        for _ in range(10):
+            songs = songs_by_mood_probability('happy', limit=1, pool_size=2)
+            self.assertIn(self.titles(songs), (['a'], ['c']))
+        self.assertEqual(self.titles(songs_by_mood_probability('happy', limit=2, pool_size=2)), ['a', 'c'])
+
+    def test_unscored_mood_returns_empty(self):
+        self.assertEqual(songs_by_mood_probability('angry'), [])
+        self.assertEqual(songs_by_mood_probability(''), [])
+
+    def test_match_result_prefers_probability_then_falls_back_to_label(self):
+        user = User.objects.create_user('u1', password='x')
+        client = Client()
+        client.force_login(user)
+        scan = UserScanLog.objects.create(user=user, input_image='scan_uploads/face.jpg', detected_emotion='sad')
+
+        response = client.get(f'/match-result/{scan.scan_id}/')
+        self.assertEqual(response.context['music_mood'], 'Sad')
+        self.assertEqual(self.titles(response.context['songs']), ['d', 'b', 'a'])
+
+        Song.objects.update(mood_probs=None)  # ยังไม่เคยรัน score_audio_moods -> จับคู่จาก json_mood
+        response = client.get(f'/match-result/{scan.scan_id}/')
+        self.assertEqual(sorted(self.titles(response.context['songs'])), ['a', 'b', 'c', 'd'])
@@ -0,0 +1,44 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# โมดูลนี้ถูก import ใน worker process (ProcessPoolExecutor) ด้วย
+# -> ห้าม import models / ใช้ settings ที่ระดับโมดูล (เหมือน workbook.py)
+
+# --- THAI TOKENIZER (optional) ---
+try:
+    from pythainlp.tokenize import word_tokenize
+    PYTHAINLP_AVAILABLE = True
+except ImportError:
+    PYTHAINLP_AVAILABLE = False
+
+SECTION_RE = re.compile(r'\[[^\]]*\]')        # [Verse], [Chorus] ...
+WORD_RE = re.compile(r'\w', re.UNICODE)        # token ต้องมีตัวอักษร/ตัวเลขอย่างน้อย 1 ตัว
+TOKENIZE_CHUNKSIZE = 32                        # เพลงต่อ 1 งานที่ส่งให้ worker
+
+
+def tokenize(text):
+    """ ตัดคำเนื้อเพลง (newmm) คืน string ของ token คั่นด้วย space (ส่งข้าม process ได้เบา) """
+    text = SECTION_RE.sub(' ', (text or '').lower())
+    tokens = word_tokenize(text, engine='newmm', keep_whitespace=False)
+    return ' '.join(token.strip() for token in tokens if WORD_RE.search(token))
+
+
+def make_pool(workers=None):
+    """
+    สร้าง pool แล้วสั่งให้ worker เริ่มทันที (start method 'fork' จะ fork ครบทุกตัวตอนงานแรก)
+    -> ผู้เรียกปิด DB connection ก่อนเรียกฟังก์ชันนี้ แล้ว process ลูกจะไม่ได้ connection ติดไปด้วย
+    """
+    if not PYTHAINLP_AVAILABLE:
+        raise RuntimeError("การตัดคำภาษาไทยต้องติดตั้ง pythainlp (pip install pythainlp)")
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pool.submit(len, '').result()
+    return pool
+
+
+def tokenize_all(texts, pool=None):
+    """ ตัดคำหลายเพลงพร้อมกันใน process pool (pythainlp ใช้ CPU ล้วน ๆ) คืน list ตามลำดับเดิม """
+    if pool is None:
+        if not PYTHAINLP_AVAILABLE:
+            raise RuntimeError("การตัดคำภาษาไทยต้องติดตั้ง pythainlp (pip install pythainlp)")
+        return [tokenize(text) for text in texts]
+    return list(pool.map(tokenize, texts, chunksize=TOKENIZE_CHUNKSIZE))
@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+
+from django.db import connection, transaction
+
+
+# ==========================================
+# ⚡ SINGLE ROUND-TRIP UPSERTS
+# ==========================================
+def insert_ignore(model, conflict_fields, **values):
+    """
+    INSERT ... ON CONFLICT (...) DO NOTHING RETURNING pk
+    คืน True ถ้าเพิ่มแถวใหม่ / False ถ้ามีแถวนั้นอยู่แล้ว — ใช้ query เดียว
+    (bulk_create(ignore_conflicts=True) บอกไม่ได้ว่าเพิ่มจริงหรือไม่)
+    """
+    opts = model._meta
+    qn = connection.ops.quote_name
+
+    fields = [opts.get_field(name) for name in values]
+    columns = ", ".join(qn(f.column) for f in fields)
+    conflict = ", ".join(qn(opts.get_field(name).column) for name in conflict_fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    params = [f.get_db_prep_save(values[f.name], connection) for f in fields]
+
+    sql = (
+        f"INSERT INTO {qn(opts.db_table)} ({columns}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({conflict}) DO NOTHING RETURNING {qn(opts.pk.column)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone() is not None
+
+
+def upsert(model, objs, unique_fields, update_fields, batch_size=1000):
+    """ INSERT ... ON CONFLICT (...) DO UPDATE ผ่าน bulk_create """
+    return model.objects.bulk_create(
+        objs,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=update_fields,
+    )
+
+
+# ==========================================
+# 🚚 POSTGRES COPY (bulk load)
+# ==========================================
+COPY_NULL = '\\N'
+
+
+def _copy_fields(model, fields=None):
+    opts = model._meta
+    if fields is not None:
+        return [opts.get_field(name) for name in fields]
+    # ทุก column ยกเว้น auto primary key (ให้ sequence สร้างเอง)
+    return [f for f in opts.concrete_fields if not (f.primary_key and f.get_internal_type().endswith('AutoField'))]
+
+
+def _copy_rows(fields, objs, add):
+    """ แปลง objects เป็น CSV ใน memory (None -> \\N) """
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    for obj in objs:
+        row = []
+        for f in fields:
+            value = f.pre_save(obj, add)
+            if f.get_internal_type() == 'JSONField':
+                value = None if value is None else json.dumps(value, cls=f.encoder)
+            else:
+                value = f.get_db_prep_save(value, connection)
+            row.append(COPY_NULL if value is None else value)
+        writer.writerow(row)
+    buf.seek(0)
+    return buf
+
+
+def _copy_from(cursor, sql, buf):
+    if hasattr(cursor, 'copy_expert'):   # psycopg2
+        cursor.copy_expert(sql, buf)
+    else:                                # psycopg 3
+        with cursor.copy(sql) as copy:
+            copy.write(buf.getvalue())
+
+
+def copy_insert(model, objs, fields=None, batch_size=1000):
+    """
+    INSERT จำนวนมากด้วย COPY ... FROM STDIN (PostgreSQL) — เร็วกว่า INSERT หลายแถวมาก
+    DB อื่น fallback เป็น bulk_create
+    หมายเหตุ: COPY ไม่คืน pk -> ผู้เรียกต้องอ่าน id กลับเอง (และไม่มี ON CONFLICT)
+    """
+    objs = list(objs)
+    if not objs:
+        return 0
+    if connection.vendor != 'postgresql':
+        model.objects.bulk_create(objs, batch_size=batch_size)
+        return len(objs)
+
+    qn = connection.ops.quote_name
+    fields = _copy_fields(model, fields)
+    columns = ", ".join(qn(f.column) for f in fields)
+    sql = f"COPY {qn(model._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+    with connection.cursor() as cursor:
+        _copy_from(cursor, sql, _copy_rows(fields, objs, add=True))
+    return len(objs)
+
+
+def copy_update(model, objs, fields, batch_size=1000):
+    """
+    UPDATE จำนวนมาก: COPY (pk, fields) ลงตารางชั่วคราว แล้ว UPDATE ... FROM ครั้งเดียว
+    (bulk_update สร้าง CASE WHEN ยาวต่อ batch) — DB อื่น fallback เป็น bulk_update
+    """
+    objs = list(objs)
+    if not objs:
+        return 0
+    if connection.vendor != 'postgresql':
+        model.objects.bulk_update(objs, fields, batch_size=batch_size)
+        return len(objs)
+
+    opts = model._meta
+    qn = connection.ops.quote_name
+    pk = opts.pk
+    fields = _copy_fields(model, fields)
+    stage = qn(f"_copy_{opts.db_table}")
+    columns = [pk, *fields]
+    definition = ", ".join(f"{qn(f.column)} {f.db_type(connection)}" for f in columns)
+    assignments = ", ".join(f"{qn(f.column)} = s.{qn(f.column)}" for f in fields)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE {stage} ({definition}) ON COMMIT DROP")
+        _copy_from(
+            cursor,
+            f"COPY {stage} ({', '.join(qn(f.column) for f in columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            _copy_rows(columns, objs, add=False),
+        )
+        cursor.execute(
+            f"UPDATE {qn(opts.db_table)} AS t SET {assignments} FROM {stage} AS s "
+            f"WHERE t.{qn(pk.column)} = s.{qn(pk.column)}"
+        )
+        cursor.execute(f"DROP TABLE {stage}")
+    return len(objs)
@@ -34,6 +34,7 @@ urlpatterns = [
     path('playlist/add/<int:song_id>/', views.add_to_playlist, name='add_to_playlist'),
     path('api/feedback/', views.submit_feedback, name='submit_feedback'),
     path('api/search/', views.song_search_api, name='song_search_api'),
+    path('api/plays/', views.play_beacon, name='play_beacon'),
     path('favorite/toggle/<int:song_id>/', views.toggle_favorite, name='toggle_favorite'),
     path('interaction/<int:song_id>/<str:action_type>/', views.record_interaction, name='record_interaction'),
 
@@ -44,6 +45,8 @@ urlpatterns = [
     path('admin-custom/', views.admin_panel, name='admin_panel'),
     path('admin-custom/users/', views.user_management, name='user_management'),
     path('admin-custom/behavior/', views.behavior_analysis, name='behavior_analysis'),
+    path('admin-custom/analytics/series/', views.analytics_series, name='analytics_series'),
+    path('admin-custom/export/<str:name>/', views.export_data, name='export_data'),
     path('admin-custom/users/toggle/<int:user_id>/', views.toggle_user_status, name='toggle_user_status'),
     path('admin-custom/users/delete/<int:user_id>/', views.delete_user, name='delete_user'),
 
@@ -69,4 +72,6 @@ urlpatterns = [
     # 📥 System / Import Data
     # ==============================
     path('system/import-songs/', views.import_songs_from_json, name='import_songs'),
+    path('system/import-jobs/<int:job_id>/', views.import_job_status, name='import_job_status'),
+    path('system/import-jobs/<int:job_id>/cancel/', views.cancel_import_job, name='cancel_import_job'),
 ]
\ No newline at end of file
@@ -10,14 +10,26 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
-from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.db.models import Q, Count, Avg
 from django.db import transaction
 from .models import *
 from .forms import CustomUserCreationForm, UserUpdateForm
+from .search import cached_search_songs, with_liked_flags, fast_json_response, songs_by_mood_probability
+from .events import (
+    event_buffer, current_interaction_type, liked_song_ids, decode_beacon, record_play_events, BeaconError,
+    is_interaction_type, write_interactions,
+)
+from .upserts import insert_ignore, upsert
+from .analytics import user_demographics, top_genres_for_users
+from .dashboard import dashboard_snapshot
+from .keyset import keyset_page
+from .rollups import metric_series, parse_range_bound
+from .exports import stream_export
+from .import_jobs import start_import_job, request_cancel, job_payload
+from .facets import catalog_facets, filter_songs, facet_options, count_matching, CountedPaginator
 from django.core.files.storage import FileSystemStorage
 
 # --- TENSORFLOW ---
@@ -108,87 +120,6 @@ def preprocess_emotion_input(img_path, model, target_size=(48, 48)):
     return x_arr, {}
 
 
-# ==========================================
-# 🆕 DATA IMPORT FUNCTION
-# ==========================================
-@csrf_exempt
-def import_songs_from_json(request):
-    if request.method == 'POST':
-        try:
-            json_path = os.path.join(settings.BASE_DIR, 'songdata.json')
-            
-            if not os.path.exists(json_path):
-                return JsonResponse({'status': 'error', 'message': 'File songdata.json not found.'}, status=404)
-
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            created_count = 0
-            updated_count = 0
-
-            with transaction.atomic():
-                for item in data:
-                    artist_name = item.get('artist', 'Unknown Artist')
-                    artist, _ = Artist.objects.get_or_create(name=artist_name)
-
-                    album_title = item.get('album')
-                    album = None
-                    if album_title:
-                        album, _ = Album.objects.get_or_create(
-                            title=album_title,
-                            artist=artist
-                        )
-
-                    spotify_data = item.get('spotify', {}) or {}
-                    audio_features = item.get('audio_features', {}) or {}
-                    
-                    release_date_str = item.get('release_date')
-                    release_date = None
-                    if release_date_str:
-                        try:
-                            release_date = datetime.datetime.strptime(release_date_str, '%Y-%m-%d').date()
-                        except ValueError:
-                            pass
-
-                    song, created = Song.objects.update_or_create(
-                        title=item.get('title'),
-                        artist=artist,
-                        defaults={
-                            'album': album,
-                            'release_date': release_date,
-                            'lyrics': item.get('lyrics', ''),
-                            'image_url': item.get('image_url', ''),
-                            'genius_url': item.get('url', ''),
-                            
-                            'json_mood': item.get('mood', ''),
-                            'json_genre': item.get('genre', ''),
-
-                            'spotify_id': spotify_data.get('id'),
-                            'spotify_link': spotify_data.get('link'),
-
-                            'valence': audio_features.get('valence', 0.5),
-                            'energy': audio_features.get('energy', 0.5),
-                            'tempo': audio_features.get('tempo', 120.0),
-                            'danceability': audio_features.get('danceability', 0.5),
-                        }
-                    )
-
-                    if created:
-                        created_count += 1
-                    else:
-                        updated_count += 1
-
-            return JsonResponse({
-                'status': 'success',
-                'message': f'✅ Import Complete! Created: {created_count}, Updated: {updated_count}'
-            })
-
-        except Exception as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
-
-    return JsonResponse({'status': 'error', 'message': 'Only POST method allowed'}, status=405)
-
-
 # ==========================================
 # 🌐 PUBLIC & AUTH VIEWS
 # ==========================================
@@ -322,33 +253,34 @@ def match_result_view(request, scan_id):
     # =========================================================
     # 🎵 QUERY: ค้นหาเพลงจาก json_mood ที่แปลงแล้ว
     # =========================================================
-    songs = Song.objects.none()
+    # เรียงตามความน่าจะเป็นของ mood (Song.mood_probs) ก่อน
+    songs = songs_by_mood_probability(target_music_mood, limit=10)
     try:
-        # ค้นหาเพลงที่เป็น 'Angry', 'Happy', 'Sad', หรือ 'Relax'
-        songs = Song.objects.filter(json_mood__icontains=target_music_mood)
-        
-        # ถ้าหาไม่เจอ ให้ลองหาจาก Category
-        if not songs.exists():
-            songs = Song.objects.filter(category__name__icontains=target_music_mood)
-            
-        # สุ่มเพลงมา 10 เพลง
-        songs = songs.order_by('?')[:10]
-        
+        if not songs:
+            # ยังไม่เคยรัน score_audio_moods -> จับคู่ข้อความแบบเดิม
+            # ค้นหาเพลงที่เป็น 'Angry', 'Happy', 'Sad', หรือ 'Relax'
+            qs = Song.objects.filter(json_mood__icontains=target_music_mood)
+
+            # ถ้าหาไม่เจอ ให้ลองหาจาก Category
+            if not qs.exists():
+                qs = Song.objects.filter(category__name__icontains=target_music_mood)
+
+            # สุ่มเพลงมา 10 เพลง
+            songs = list(qs.order_by('?')[:10])
+
     except Exception as e:
         print(f"Error finding songs: {e}")
 
     # Fallback: ถ้ายังหาไม่เจอเลยจริงๆ ให้เอาเพลงทั้งหมดมาสุ่ม
-    if not songs.exists():
-        songs = Song.objects.all().order_by('?')[:10]
+    if not songs:
+        songs = list(Song.objects.all().order_by('?')[:10])
 
-    main_song = songs[0] if songs.exists() else None
+    main_song = songs[0] if songs else None
 
     # ==================================================
     # ✅ Interaction Data (ดึงข้อมูล Like/Favorite)
     # ==================================================
-    interaction_likes = set(Interaction.objects.filter(user=request.user, type='like').values_list('song_id', flat=True))
-    favorite_likes = set(FavoriteSong.objects.filter(user=request.user).values_list('song_id', flat=True))
-    liked_song_ids = list(interaction_likes.union(favorite_likes))
+    liked_ids = list(liked_song_ids(request.user))
 
     context = {
         'scan_log': scan_log,
@@ -362,7 +294,7 @@ def match_result_view(request, scan_id):
         'songs': songs,
         'song': main_song,
         'user_image': scan_log.input_image.url if scan_log.input_image else None,
-        'liked_song_ids': liked_song_ids
+        'liked_song_ids': liked_ids
     }
     return render(request, 'matcher/match_result.html', context)
 
@@ -374,13 +306,11 @@ def browse_view(request):
     songs = Song.objects.all().order_by('-song_id')[:100]
     
     # ✅ ดึง ID เพลงที่ชอบจาก Interaction และ FavoriteSong
-    interaction_likes = set(Interaction.objects.filter(user=request.user, type='like').values_list('song_id', flat=True))
-    favorite_likes = set(FavoriteSong.objects.filter(user=request.user).values_list('song_id', flat=True))
-    liked_song_ids = list(interaction_likes.union(favorite_likes))
+    liked_ids = list(liked_song_ids(request.user))
 
     return render(request, 'matcher/browsesong.html', {
         'songs': songs,
-        'liked_song_ids': liked_song_ids
+        'liked_song_ids': liked_ids
     })
 
 @login_required(login_url='matcher:login')
@@ -393,38 +323,10 @@ def song_search_api(request):
     except ValueError:
         limit = 50
 
-    qs = Song.objects.select_related('artist', 'album')
-
-    if mood_filter:
-        qs = qs.filter(json_mood__iexact=mood_filter)
-
-    if q:
-        qs = qs.filter(Q(title__icontains=q) | Q(artist__name__icontains=q))
-
-    qs = qs.order_by('-song_id')[:limit]
-
-    # ✅ ดึง ID เพลงที่ชอบ
-    interaction_likes = set(Interaction.objects.filter(user=request.user, type='like').values_list('song_id', flat=True))
-    favorite_likes = set(FavoriteSong.objects.filter(user=request.user).values_list('song_id', flat=True))
-    liked_ids_set = interaction_likes.union(favorite_likes)
-
-    results = []
-    for s in qs:
-        artist_name = s.artist.name if s.artist else "Unknown"
-        cover_url = s.image_url if s.image_url else (s.album.image_url if s.album else "")
-        link_url = s.spotify_link or s.genius_url or ""
-
-        results.append({
-            "song_id": s.song_id,
-            "title": s.title or "",
-            "artist": artist_name,
-            "cover_url": cover_url or "https://via.placeholder.com/50",
-            "spotify_url": link_url,
-            "json_mood": s.json_mood or "",
-            "is_liked": s.song_id in liked_ids_set,
-        })
+    # ✅ ผลค้นหาที่ไม่ขึ้นกับ user มาจาก cache แล้วค่อย overlay สถานะ Like ของ user
+    results = with_liked_flags(cached_search_songs(q=q, mood=mood_filter, limit=limit), request.user)
 
-    return JsonResponse({"results": results})
+    return fast_json_response({"results": results})
 
 
 # ==========================================
@@ -475,12 +377,13 @@ def submit_feedback(request):
     feedback_type = request.POST.get('type')
 
     if song_id and feedback_type:
-        song = get_object_or_404(Song, song_id=song_id)
-        # ✅ บันทึกลง Interaction
-        Interaction.objects.update_or_create(
-            user=request.user,
-            song=song,
-            defaults={'type': feedback_type, 'rating': 1 if feedback_type == 'like' else -1}
+        if not is_interaction_type(feedback_type):
+            return JsonResponse({'status': 'error', 'message': 'Invalid feedback type'}, status=400)
+        song = get_object_or_404(Song.objects.only('song_id'), song_id=song_id)
+        # ✅ บันทึกลง Interaction (ผ่าน buffer แล้ว flush เป็น batch)
+        event_buffer.set_interaction(
+            request.user.pk, song.song_id,
+            type=feedback_type, rating=1 if feedback_type == 'like' else -1
         )
         return JsonResponse({'status': 'success'})
 
@@ -488,21 +391,31 @@ def submit_feedback(request):
 
 @login_required(login_url='matcher:login')
 def add_to_playlist(request, song_id):
-    song = get_object_or_404(Song, song_id=song_id)
-    
-    # ✅ 1. บันทึกลง FavoriteSong
-    fav_item, created = FavoriteSong.objects.get_or_create(user=request.user, song=song)
-    
-    # ✅ 2. บันทึกลง Interaction
-    Interaction.objects.update_or_create(
-        user=request.user, 
-        song=song, 
-        defaults={'type': 'like', 'rating': 1}
-    )
+    song = get_object_or_404(Song.objects.only('song_id', 'title'), song_id=song_id)
+    user_id = request.user.pk
+
+    # ✅ บันทึกทั้ง 3 ตารางใน transaction สั้น ๆ เดียว (INSERT ... ON CONFLICT)
+    with transaction.atomic():
+        # 1. FavoriteSong (มีอยู่แล้วก็ไม่เพิ่มซ้ำ)
+        created = insert_ignore(
+            FavoriteSong, ['user', 'song'],
+            user=user_id, song=song.song_id, added_at=timezone.now()
+        )
+
+        # 2. Interaction = like (ทางเดียวกับ buffer flush: taste profile + LikeEvent + upsert)
+        write_interactions({user_id: {song.song_id: ('like', 1)}})
+
+        # 3. เก็บลง Playlist เดิม
+        playlist = upsert(
+            Playlist, [Playlist(user_id=user_id, name="My Favorite Songs")],
+            unique_fields=['user', 'name'], update_fields=['name']
+        )[0]
+        PlaylistItem.objects.bulk_create(
+            [PlaylistItem(playlist_id=playlist.pk, song_id=song.song_id)], ignore_conflicts=True
+        )
 
-    # ✅ 3. เก็บลง Playlist เดิม
-    playlist, _ = Playlist.objects.get_or_create(user=request.user, name="My Favorite Songs")
-    PlaylistItem.objects.get_or_create(playlist=playlist, song=song)
+    # เขียน DB ตรงแล้ว สถานะที่ค้างใน buffer ของเพลงนี้ไม่ต้องใช้อีก
+    event_buffer.discard_interaction(user_id, song.song_id)
 
     if created:
         messages.success(request, f"Added '{song.title}' to favorites! ❤️")
@@ -511,6 +424,22 @@ def add_to_playlist(request, song_id):
         
     return redirect(request.META.get('HTTP_REFERER', 'matcher:home'))
 
+@login_required(login_url='matcher:login')
+@require_POST
+def play_beacon(request):
+    """
+    รับ play/skip event เป็น batch จากหน้า Match Result / Browse
+    body: {"events": [{"song_id", "event", "position", "emotion"}, ...]}
+    รองรับ Content-Encoding: gzip / ระบุหน้าที่ส่งมาด้วย ?source=
+    """
+    try:
+        events = decode_beacon(request.body, request.headers.get('Content-Encoding'))
+    except BeaconError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    accepted = record_play_events(request.user.pk, events, source=request.GET.get('source', 'manual'))
+    return JsonResponse({'status': 'ok', 'accepted': accepted}, status=202)
+
 @login_required
 def toggle_favorite(request, song_id):
     song = get_object_or_404(Song, pk=song_id)
@@ -544,54 +473,69 @@ def admin_login_view(request):
 
 @user_passes_test(is_admin, login_url='matcher:admin_login')
 def admin_panel(request):
-    total_users = User.objects.count()
-    active_users = User.objects.filter(is_active=True).count()
-    banned_users = User.objects.filter(is_active=False).count()
-    last_week = timezone.now() - datetime.timedelta(days=7)
-    new_users_count = User.objects.filter(date_joined__gte=last_week).count()
-    
-    try:
-        most_liked_songs = Song.objects.annotate(
-            like_count=Count('favoritesong') 
-        ).order_by('-like_count')[:5]
-    except Exception:
-        most_liked_songs = Song.objects.all()[:5]
-        
+    # ✅ KPI ทั้งหมดอ่านจาก snapshot (คำนวณล่วงหน้าใน matcher/dashboard.py)
+    snapshot = dashboard_snapshot()
+    kpi = snapshot.data
+
     recent_users = User.objects.order_by('-date_joined')[:5]
     context = {
-        'total_users': total_users,
-        'active_users': active_users,
-        'banned_users': banned_users,
-        'new_users_count': new_users_count,
-        'most_liked_songs': most_liked_songs,
+        'total_users': kpi['total_users'],
+        'active_users': kpi['active_users'],
+        'banned_users': kpi['banned_users'],
+        'new_users_count': kpi['new_users_7d'],
+        'most_liked_songs': kpi['most_liked_songs'],
+        'total_scans': kpi['total_scans'],
+        'top_scanned_mood': kpi['top_scanned_mood'],
+        'snapshot_at': snapshot.computed_at,
         'recent_users': recent_users
     }
     return render(request, 'matcher/admin_panel.html', context)
 
+USERS_PER_PAGE = 50
+
 @user_passes_test(is_admin, login_url='matcher:admin_login')
 def user_management(request):
-    users = User.objects.all().order_by('-date_joined')
-    total_users = users.count()
-    active_users = users.filter(is_active=True).count()
-    
-    # คำนวณ New User (ใน 30 วันที่ผ่านมา)
-    last_month_date = timezone.now() - datetime.timedelta(days=30)
-    new_users = users.filter(date_joined__gte=last_month_date).count()
+    q = request.GET.get('q', '').strip()
+    status = request.GET.get('status', '')
 
-    # เปรียบเทียบกับเดือนที่แล้ว
-    prev_month_date = timezone.now() - datetime.timedelta(days=60)
-    total_last_month = User.objects.filter(date_joined__lt=last_month_date).count()
-    
-    growth_total = 0
-    if total_last_month > 0:
-        growth_total = ((total_users - total_last_month) / total_last_month) * 100
+    # ✅ กรองฝั่ง server: prefix search (ใช้ functional index UPPER(...) ได้) + สถานะ
+    users = User.objects.only('id', 'username', 'email', 'date_joined', 'is_active')
+    if q:
+        users = users.filter(Q(username__istartswith=q) | Q(email__istartswith=q))
+    if status == 'active':
+        users = users.filter(is_active=True)
+    elif status == 'banned':
+        users = users.filter(is_active=False)
+
+    # ✅ Keyset pagination บน (date_joined, id) — ไม่มี OFFSET / COUNT(*)
+    page = keyset_page(
+        users, ('date_joined', 'id'), USERS_PER_PAGE,
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
+
+    # ✅ KPI (total / active / new 30 วัน / growth) มาจาก dashboard snapshot
+    snapshot = dashboard_snapshot()
+    kpi = snapshot.data
+
+    # จำนวนที่ตรงตัวกรอง (รู้ได้จาก snapshot เมื่อไม่มีคำค้น)
+    filtered_total = None
+    if not q:
+        filtered_total = {
+            'active': kpi['active_users'],
+            'banned': kpi['banned_users'],
+        }.get(status, kpi['total_users'])
 
     context = {
-        'users': users,
-        'total_users': total_users,
-        'active_users': active_users,
-        'new_users': new_users,
-        'growth_total': round(growth_total, 1),
+        'users': page,
+        'page': page,
+        'query': q,
+        'status': status,
+        'filtered_total': filtered_total,
+        'total_users': kpi['total_users'],
+        'active_users': kpi['active_users'],
+        'new_users': kpi['new_users_30d'],
+        'growth_total': kpi['growth_total'],
+        'snapshot_at': snapshot.computed_at,
     }
     return render(request, 'matcher/user_management.html', context)
 
@@ -600,24 +544,8 @@ def user_management(request):
 # ==========================================
 @user_passes_test(is_admin, login_url='matcher:admin_login')
 def behavior_analysis(request):
-    users = User.objects.all()
-    total_users = users.count()
-
-    # 1. Age Analytics
-    avg_age_data = users.aggregate(Avg('age'))
-    avg_age = round(avg_age_data['age__avg']) if avg_age_data['age__avg'] else 0
-
-    # 2. Gender Ratio (Model uses M, F, O)
-    male_count = users.filter(gender='M').count()
-    female_count = users.filter(gender='F').count()
-    other_count = total_users - (male_count + female_count)
-
-    if total_users > 0:
-        male_percent = round((male_count / total_users) * 100, 1)
-        female_percent = round((female_count / total_users) * 100, 1)
-        other_percent = round((other_count / total_users) * 100, 1)
-    else:
-        male_percent = female_percent = other_percent = 0
+    # 1-2. Age / Gender Ratio (conditional aggregate query เดียว)
+    demographics = user_demographics()
 
     # 3. Top Genre Overall (Based on Likes)
     top_genre_qs = Interaction.objects.filter(type='like') \
@@ -625,40 +553,80 @@ def behavior_analysis(request):
         .annotate(total_likes=Count('id')) \
         .order_by('-total_likes')
     
-    global_top_genre = top_genre_qs[0]['song__json_genre'] if top_genre_qs.exists() else "No Data"
+    top_genre_row = top_genre_qs.first()
+    global_top_genre = top_genre_row['song__json_genre'] if top_genre_row else "No Data"
 
     # 4. Total Interactions
     total_interactions = Interaction.objects.count()
 
-    # 5. User Specific Data
-    user_data_list = []
-    for u in users:
-        # Find favorite genre per user
-        user_fav_genre = Interaction.objects.filter(user=u, type='like') \
-            .values('song__json_genre') \
-            .annotate(c=Count('id')) \
-            .order_by('-c').first()
-        
-        user_top_genre = user_fav_genre['song__json_genre'] if user_fav_genre else None
-
-        user_data_list.append({
-            'user': u,
-            'top_genre': user_top_genre
-        })
+    # 5. User Specific Data (แบ่งหน้า + top genre อ่านจาก UserTasteProfile)
+    users = User.objects.select_related('taste_profile').order_by('-date_joined', '-id')
+    paginator = CountedPaginator(users, 50, count=demographics['total_users'])
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    page_users = list(page_obj.object_list)
+    profiles = {u.id: getattr(u, 'taste_profile', None) for u in page_users}
+    # user ที่ยังไม่มี profile (ยังไม่เคย rebuild) ใช้ window query เดียวแทน
+    missing = [uid for uid, profile in profiles.items() if profile is None]
+    top_genres = top_genres_for_users(missing) if missing else {}
+    user_data_list = [
+        {'user': u, 'top_genre': profiles[u.id].top_genre if profiles[u.id] else top_genres.get(u.id)}
+        for u in page_users
+    ]
 
     context = {
-        'avg_age': avg_age,
-        'male_percent': male_percent,
-        'female_percent': female_percent,
-        'other_percent': other_percent,
+        'avg_age': demographics['avg_age'],
+        'male_percent': demographics['male_percent'],
+        'female_percent': demographics['female_percent'],
+        'other_percent': demographics['other_percent'],
         'top_genre': global_top_genre,
         'total_interactions': total_interactions,
         'user_data': user_data_list,
+        'page_obj': page_obj,
     }
     # หมายเหตุ: ชื่อ Template ต้องตรงกับไฟล์ HTML ที่คุณมี
     return render(request, 'matcher/behavior_analysis.html', context)
 
 
+@user_passes_test(is_admin, login_url='matcher:admin_login')
+def analytics_series(request):
+    """
+    Chart series จากตาราง rollup: ?metric=scans|likes|favorites|new_users
+    &granularity=hour|day&start=YYYY-MM-DD&end=YYYY-MM-DD
+    """
+    metric = request.GET.get('metric', 'scans')
+    granularity = request.GET.get('granularity', 'day')
+    try:
+        end = parse_range_bound(request.GET.get('end')) or timezone.now()
+        default_span = datetime.timedelta(hours=48) if granularity == 'hour' else datetime.timedelta(days=30)
+        start = parse_range_bound(request.GET.get('start')) or end - default_span
+        payload = metric_series(metric, granularity, start, end)
+    except ValueError as e:
+        return fast_json_response({'status': 'error', 'message': str(e)}, status=400)
+    return fast_json_response(payload)
+
+
+@user_passes_test(is_admin, login_url='matcher:admin_login')
+def export_data(request, name):
+    """
+    ดาวน์โหลดข้อมูลสำหรับนักวิเคราะห์: /admin-custom/export/<interactions|plays|scans|songs>/
+    ?format=csv|parquet&since=YYYY-MM-DD&until=YYYY-MM-DD (สตรีมทีละ chunk ไม่โหลดทั้งตาราง)
+    """
+    fmt = request.GET.get('format', 'csv')
+    try:
+        since = parse_range_bound(request.GET.get('since'))
+        until = parse_range_bound(request.GET.get('until'))
+        stream = stream_export(name, fmt, since=since, until=until)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    content_type = 'application/vnd.apache.parquet' if fmt == 'parquet' else 'text/csv; charset=utf-8'
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    stamp = timezone.now().strftime('%Y%m%d_%H%M')
+    response['Content-Disposition'] = f'attachment; filename="{name}_{stamp}.{fmt}"'
+    return response
+
+
 # ฟังก์ชันเปลี่ยนสถานะ (ระงับ/อนุมัติ)
 @user_passes_test(is_admin)
 def toggle_user_status(request, user_id):
@@ -693,37 +661,32 @@ def song_database(request):
     genre = request.GET.get('genre')
     mood = request.GET.get('mood')
 
-    # ดึงเพลงทั้งหมด
-    songs_list = Song.objects.all().select_related('artist', 'album').order_by('-song_id')
+    filters = {'q': query, 'genre': genre, 'mood': mood}
 
-    # กรองข้อมูล (ถ้ามี)
-    if query:
-        songs_list = songs_list.filter(
-            Q(title__icontains=query) | 
-            Q(artist__name__icontains=query) | 
-            Q(album__title__icontains=query)
-        )
-    if genre:
-        songs_list = songs_list.filter(json_genre__icontains=genre)
-    if mood:
-        songs_list = songs_list.filter(json_mood__icontains=mood)
+    # ดึงเพลงทั้งหมด + กรองข้อมูล (ถ้ามี)
+    songs_list = filter_songs(
+        Song.objects.all().select_related('artist', 'album').order_by('-song_id'),
+        **filters
+    )
+
+    # Facet counts (mood/genre) จาก grouped aggregate เดียว + cache
+    all_facets = catalog_facets()
+    result_facets = catalog_facets(**filters) if any(filters.values()) else all_facets
 
     # 2. 🔥 จุดสำคัญ: ต้องทำ Pagination ก่อนส่งไปหน้าเว็บ
-    paginator = Paginator(songs_list, 50)  # แบ่งทีละ 50 เพลง
+    # ใช้ total จาก facet แทนการยิง COUNT(*) อีกรอบ
+    paginator = CountedPaginator(songs_list, 50, count=result_facets['total'])  # แบ่งทีละ 50 เพลง
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number) # ได้เป็น Page Object (มี start_index)
 
-    # ข้อมูลสำหรับ Dropdown ตัวกรอง (ถ้าหน้า Admin คุณมี)
-    all_genres = Song.objects.values_list('json_genre', flat=True).distinct()
-    all_moods = Song.objects.values_list('json_mood', flat=True).distinct()
-
     context = {
         'songs': page_obj,  # ✅ ต้องส่ง page_obj (ไม่ใช่ songs_list)
         'query': query,
         'selected_genre': genre,
         'selected_mood': mood,
-        'all_genres': sorted(filter(None, set(all_genres))),
-        'all_moods': sorted(filter(None, set(all_moods))),
+        'all_genres': facet_options(all_facets['genres'], result_facets['genres']),
+        'all_moods': facet_options(all_facets['moods'], result_facets['moods']),
+        'import_job': ImportJob.objects.order_by('-id').first(),  # widget import ล่าสุด
     }
     
     return render(request, 'matcher/song_database.html', context)
@@ -761,6 +724,8 @@ def save_song(request):
         song.artist = artist
         song.album = album
         song.json_genre = json_genre
+        if json_mood != song.json_mood:
+            song.mood_confidence = None  # admin กำหนด mood เอง
         song.json_mood = json_mood
         song.image_url = image_url # ✅ บันทึก image_url
         song.save()
@@ -787,80 +752,82 @@ def delete_song(request, song_id):
     messages.success(request, f"Deleted song: {title}")
     return redirect('matcher:song_database')
 
-def category_management(request):
-    # แยกประเภทหมวดหมู่
-    moods = Category.objects.filter(type='MOOD')
-    genres = Category.objects.filter(type='GENRE')
 
-    # ฟังก์ชันช่วยนับจำนวนเพลง (Count Songs)
-    # เนื่องจาก Song เก็บเป็น json_mood/json_genre เราจะค้นหาจาก text
-    for m in moods:
-        m.display_count = Song.objects.filter(json_mood__icontains=m.name).count()
-    
-    for g in genres:
-        g.display_count = Song.objects.filter(json_genre__icontains=g.name).count()
+# ==========================================
+# 🆕 DATA IMPORT FUNCTION
+# ==========================================
+@require_POST
+@user_passes_test(is_admin, login_url='matcher:admin_login')
+def import_songs_from_json(request):
+    """
+    เริ่ม ImportJob เบื้องหลังแล้วตอบกลับทันที (202) — ไม่ค้าง worker / transaction ยาวระหว่าง import
+    ติดตามผลที่ import_job_status, ยกเลิกที่ cancel_import_job
+    """
+    json_path = os.path.join(settings.BASE_DIR, 'songdata.json')
+    if not os.path.exists(json_path):
+        return JsonResponse({'status': 'error', 'message': 'File songdata.json not found.'}, status=404)
 
-    context = {
-        'mood_categories': moods,
-        'genre_categories': genres,
-        'total_moods': moods.count(),
-        'total_genres': genres.count()
-    }
-    return render(request, 'matcher/category_management.html', context)
+    job, started = start_import_job(json_path, user=request.user)
+    if not started:
+        return JsonResponse({
+            'status': 'error',
+            'message': f"Import #{job.pk} is still {job.status}.",
+            'job': job_payload(job),
+        }, status=409)
 
-def save_category(request):
-    if request.method == "POST":
-        cat_id = request.POST.get('category_id')
-        name = request.POST.get('name')
-        cat_type = request.POST.get('type')
+    return JsonResponse({
+        'status': 'queued',
+        'message': f"🚀 Import #{job.pk} started",
+        'job': job_payload(job),
+    }, status=202)
 
-        if cat_id: # Edit
-            category = get_object_or_404(Category, pk=cat_id)
-            category.name = name
-            category.type = cat_type
-            category.save()
-        else: # Create
-            Category.objects.create(name=name, type=cat_type)
-            
-    return redirect('matcher:category_management')
 
-def delete_category(request, cat_id):
-    category = get_object_or_404(Category, pk=cat_id)
-    category.delete()
-    return redirect('matcher:category_management')
+@user_passes_test(is_admin, login_url='matcher:admin_login')
+def import_job_status(request, job_id):
+    job = get_object_or_404(ImportJob, pk=job_id)
+    return JsonResponse({'status': 'success', 'job': job_payload(job)})
 
-# (Optional) หน้าดูเพลงในหมวดนั้นๆ
-def category_songs(request, cat_id):
-    category = get_object_or_404(Category, pk=cat_id)
-    if category.type == 'MOOD':
-        songs = Song.objects.filter(json_mood__icontains=category.name)
-    else:
-        songs = Song.objects.filter(json_genre__icontains=category.name)
-        
-    return render(request, 'matcher/song_database.html', {'songs': songs, 'query': category.name})
 
+@require_POST
+@user_passes_test(is_admin, login_url='matcher:admin_login')
+def cancel_import_job(request, job_id):
+    job = get_object_or_404(ImportJob, pk=job_id)
+    if not request_cancel(job):
+        return JsonResponse({'status': 'error', 'message': f"Import #{job.pk} is already {job.status}."}, status=409)
+    return JsonResponse({'status': 'success', 'message': 'Cancelling...', 'job': job_payload(job)})
+
+
+# ==========================================
+# 🗂 CATEGORY MANAGEMENT
+# ==========================================
+@user_passes_test(is_admin, login_url='matcher:admin_login')
 def category_management(request):
     # ดึงข้อมูลแยกประเภท
-    moods = Category.objects.filter(type='MOOD').order_by('name')
-    genres = Category.objects.filter(type='GENRE').order_by('name')
+    moods = list(Category.objects.filter(type='MOOD').order_by('name'))
+    genres = list(Category.objects.filter(type='GENRE').order_by('name'))
 
     # --- ส่วนนับจำนวนเพลง (Count Songs) ---
-    # ระบบจะค้นหาว่ามีเพลงไหนที่มีคำว่าชื่อ Category อยู่ใน json_mood หรือ json_genre บ้าง
+    # ใช้ facet counts (GROUP BY json_mood, json_genre ครั้งเดียว + cache)
+    # แล้วรวมค่าที่มีชื่อ Category อยู่ (icontains แบบเดิม) ใน Python
+    facets = catalog_facets()
     for m in moods:
-        m.display_count = Song.objects.filter(json_mood__icontains=m.name).count()
-    
+        m.display_count = count_matching(facets['moods'], m.name)
+
     for g in genres:
-        g.display_count = Song.objects.filter(json_genre__icontains=g.name).count()
+        g.display_count = count_matching(facets['genres'], g.name)
 
     context = {
         'mood_categories': moods,
         'genre_categories': genres,
+        'total_moods': len(moods),
+        'total_genres': len(genres),
     }
     return render(request, 'matcher/category_management.html', context)
 
 # ==========================================
 # 2. ฟังก์ชันบันทึก (Add / Edit)
 # ==========================================
+@user_passes_test(is_admin, login_url='matcher:admin_login')
 def save_category(request):
     if request.method == "POST":
         cat_id = request.POST.get('category_id') # รับ ID จาก Hidden Input ใน Modal
@@ -884,29 +851,33 @@ def save_category(request):
 # ==========================================
 # 3. ฟังก์ชันลบ (Delete)
 # ==========================================
-def delete_song(request, song_id):
-    song = get_object_or_404(Song, pk=song_id)
-    title = song.title
-    song.delete()
-    messages.success(request, f"Deleted song: {title}")
-    return redirect('matcher:song_database')
+@user_passes_test(is_admin, login_url='matcher:admin_login')
+def delete_category(request, cat_id):
+    category = get_object_or_404(Category, pk=cat_id)
+    category.delete()
+    return redirect('matcher:category_management')
 
 # ==========================================
 # 4. ฟังก์ชันกดดูเพลงในหมวดนั้น (View Songs)
 # ==========================================
+@user_passes_test(is_admin, login_url='matcher:admin_login')
 def category_songs(request, cat_id):
     category = get_object_or_404(Category, pk=cat_id)
+    facets = catalog_facets()
     
     # กรองเพลงตามประเภทของ Category
     if category.type == 'MOOD':
         # หาเพลงที่มีชื่อ Mood นี้อยู่ใน field json_mood
         songs_list = Song.objects.filter(json_mood__icontains=category.name)
+        total = count_matching(facets['moods'], category.name)
     else:
         # หาเพลงที่มีชื่อ Genre นี้อยู่ใน field json_genre
         songs_list = Song.objects.filter(json_genre__icontains=category.name)
+        total = count_matching(facets['genres'], category.name)
 
-    # ใช้ Pagination เหมือนหน้า Song Database ปกติ (50 เพลงต่อหน้า)
-    paginator = Paginator(songs_list, 50)
+    # ใช้ Pagination เหมือนหน้า Song Database ปกติ (50 เพลงต่อหน้า) — จำนวนรวมมาจาก facet แล้ว
+    songs_list = songs_list.select_related('artist', 'album').order_by('-song_id')
+    paginator = CountedPaginator(songs_list, 50, count=total)
     page_number = request.GET.get('page')
     songs = paginator.get_page(page_number)
 
@@ -919,28 +890,23 @@ def category_songs(request, cat_id):
     }
     return render(request, 'matcher/song_database.html', context)
 
-
 @login_required
 def record_interaction(request, song_id, action_type):
-    # action_type จะเป็น 'like' หรือ 'dislike'
-    song = get_object_or_404(Song, pk=song_id)
+    # action_type จะเป็น 'like' หรือ 'dislike' (ต้องอยู่ใน choices ของ Interaction.type)
+    if not is_interaction_type(action_type):
+        return JsonResponse({'status': 'error', 'message': 'Invalid action'}, status=400)
+    song = get_object_or_404(Song.objects.only('song_id'), pk=song_id)
     
-    # เช็คว่ามี interaction เดิมอยู่ไหม
-    interaction = Interaction.objects.filter(user=request.user, song=song).first()
-
-    if interaction:
-        if interaction.type == action_type:
-            # ถ้ากดซ้ำ (เช่น ชอบอยู่แล้ว กดชอบอีกที) -> ให้ลบออก (Un-like/Un-dislike)
-            interaction.delete()
-            current_action = 'none'
-        else:
-            # ถ้าเปลี่ยนใจ (เช่น จาก Dislike -> Like) -> ให้อัปเดต
-            interaction.type = action_type
-            interaction.save()
-            current_action = action_type
+    # เช็คว่ามี interaction เดิมอยู่ไหม (ดูใน buffer ก่อน แล้วค่อย DB)
+    current_type = current_interaction_type(request.user.pk, song.song_id)
+
+    if current_type == action_type:
+        # ถ้ากดซ้ำ (เช่น ชอบอยู่แล้ว กดชอบอีกที) -> ให้ลบออก (Un-like/Un-dislike)
+        event_buffer.set_interaction(request.user.pk, song.song_id, type=None)
+        current_action = 'none'
     else:
-        # ถ้าไม่เคยกดมาก่อน -> สร้างใหม่
-        Interaction.objects.create(user=request.user, song=song, type=action_type)
+        # ถ้าไม่เคยกดมาก่อน หรือเปลี่ยนใจ (เช่น จาก Dislike -> Like) -> สร้าง/อัปเดต
+        event_buffer.set_interaction(request.user.pk, song.song_id, type=action_type)
         current_action = action_type
 
     # ส่งค่ากลับไปบอกหน้าเว็บว่าสถานะตอนนี้คืออะไร
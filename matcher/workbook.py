@@ -0,0 +1,280 @@
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.utils.dateparse import parse_datetime, parse_date
+
+from openpyxl import load_workbook # type: ignore
+
+# โมดูลนี้ถูก import ใน worker process (ProcessPoolExecutor) ด้วย
+# -> ห้าม import models / ใช้ settings ที่ระดับโมดูล (worker ไม่ได้ django.setup())
+
+MAX_REPORTED_ERRORS = 100  # error ต่อ sheet ที่เก็บรายละเอียดไว้รายงาน
+
+# ลำดับโหลดตาม dependency (users -> artists -> albums -> songs -> genres -> links)
+SHEET_ORDER = ["users","artists","albums","songs","genres","song_genres","emotions","song_emotions"]
+
+# ชื่อคอลัมน์ที่รับได้ของแต่ละ sheet (field -> ชื่อหัวคอลัมน์ที่เป็นไปได้ ตามลำดับ)
+SHEET_COLUMNS = {
+    "users": {
+        "email": ["email"],
+        "username": ["username","user","login","name"],
+        "password": ["password_hash","password","passhash"],
+        "status": ["status","state"],
+        "created_at": ["created_at","created","joined","date_joined"],
+        "age": ["age"],
+        "gender": ["gender","sex"],
+    },
+    "artists": {
+        "name": ["name","artist","artist_name"],
+        "image_url": ["image_url","image","photo"],
+    },
+    "albums": {
+        "title": ["title","album","album_title"],
+        "artist": ["artist","artist_name"],
+        "release_date": ["release_date","released"],
+        "year": ["year","release_year"],
+        "image_url": ["image_url","cover_url","cover"],
+    },
+    "songs": {
+        "title": ["title","song","song_title"],
+        "artist": ["artist","artist_name"],
+        "album": ["album","album_title"],
+        "release_date": ["release_date","released"],
+        "image_url": ["image_url","image","cover_url"],
+        "url": ["genius_url","url"],
+        "mood": ["mood","json_mood","emotion"],
+        "genre": ["genre","json_genre"],
+        "spotify_id": ["spotify_id","external_id","ext_id"],
+        "spotify_link": ["spotify_link","spotify_url"],
+        "lyrics": ["lyrics","lyric"],
+        "valence": ["valence"],
+        "energy": ["energy"],
+        "tempo": ["tempo","bpm"],
+        "danceability": ["danceability"],
+    },
+    "genres": {"name": ["name","genre"]},
+    "song_genres": {
+        "title": ["song_title","title","song"],
+        "artist": ["artist","artist_name"],
+        "name": ["genre","genre_name","name"],
+    },
+    "emotions": {"name": ["name","emotion","mood"]},
+    "song_emotions": {
+        "title": ["song_title","title","song"],
+        "artist": ["artist","artist_name"],
+        "name": ["emotion","emotion_name","mood"],
+    },
+}
+
+REQUIRED = {
+    "users": ("email", "username"),
+    "artists": ("name",),
+    "albums": ("title", "artist"),
+    "songs": ("title", "artist"),
+    "genres": ("name",),
+    "song_genres": ("title", "artist", "name"),
+    "emotions": ("name",),
+    "song_emotions": ("title", "artist", "name"),
+}
+
+# field ที่ไม่ใช่ข้อความ (ที่เหลือเป็น text)
+FIELD_TYPES = {
+    "created_at": "datetime",
+    "release_date": "date",
+    "year": "int",
+    "age": "int",
+    "valence": "float",
+    "energy": "float",
+    "tempo": "float",
+    "danceability": "float",
+}
+
+
+# -------------------- utils --------------------
+def norm_key(s: str) -> str:
+    return "".join(c for c in (str(s or "")).lower() if c.isalnum())
+
+def text(val, default=""):
+    if val is None:
+        return default
+    return str(val).strip() if not isinstance(val, (int, float)) else str(val)
+
+def as_int(val, default=None):
+    try:
+        if val is None or val == "":
+            return default
+        return int(float(val))
+    except Exception:
+        return default
+
+def as_float(val, default=None):
+    try:
+        if val is None or val == "":
+            return default
+        return float(val)
+    except Exception:
+        return default
+
+def parse_dt(val):
+    """รองรับค่าจาก Excel (datetime) หรือสตริง -> datetime (naive ได้) หรือ None"""
+    if not val:
+        return None
+    if hasattr(val, "year") and hasattr(val, "month") and hasattr(val, "day"):
+        return val if isinstance(val, datetime.datetime) else datetime.datetime(val.year, val.month, val.day)
+    dt = parse_datetime(str(val).strip())
+    if not dt:
+        d = parse_date(str(val).strip())
+        if d:
+            dt = datetime.datetime(d.year, d.month, d.day)
+    return dt
+
+
+# -------------------- sheet reader --------------------
+def header_map(headers, columns):
+    """คำนวณครั้งเดียวต่อ sheet: field -> index ของคอลัมน์ (None = ไม่มีคอลัมน์นี้)"""
+    index = {}
+    for i, h in enumerate(headers):
+        index.setdefault(norm_key(h), i)
+    mapping = {}
+    for field, candidates in columns.items():
+        mapping[field] = next((index[norm_key(c)] for c in candidates if norm_key(c) in index), None)
+    return mapping
+
+def sheet_rows(ws, columns):
+    """
+    อ่านแบบสตรีม (read_only + values_only) คืน (เลขแถว, dict เฉพาะ field ที่ใช้)
+    """
+    rows = ws.iter_rows(values_only=True)
+    try:
+        headers = next(rows)
+    except StopIteration:
+        return
+    mapping = list(header_map(headers, columns).items())
+    for n, r in enumerate(rows, start=2):
+        if r is None:
+            continue
+        yield n, {field: (r[i] if i is not None and i < len(r) else None) for field, i in mapping}
+
+
+# -------------------- validation --------------------
+def _convert(field, value):
+    kind = FIELD_TYPES.get(field)
+    if value is None or value == "":
+        return None if kind else ""
+    if kind == "datetime":
+        dt = parse_dt(value)
+        if dt is None:
+            raise ValueError(f"{field}: วันที่ไม่ถูกต้อง ({value!r})")
+        return dt.isoformat()
+    if kind == "date":
+        dt = parse_dt(value)
+        if dt is None:
+            raise ValueError(f"{field}: วันที่ไม่ถูกต้อง ({value!r})")
+        return dt.date().isoformat()
+    if kind == "int":
+        number = as_int(value)
+        if number is None:
+            raise ValueError(f"{field}: ต้องเป็นตัวเลข ({value!r})")
+        return number
+    if kind == "float":
+        number = as_float(value)
+        if number is None:
+            raise ValueError(f"{field}: ต้องเป็นตัวเลข ({value!r})")
+        return number
+    return text(value)
+
+def normalize_row(sheet, row, limits):
+    """
+    แปลง 1 แถวเป็น record ที่สะอาด (ค่า JSON ล้วน) หรือ raise ValueError พร้อมเหตุผล
+    limits = {field: max_length} ของ sheet นั้น (คำนวณจาก models ใน process หลัก)
+    """
+    record = {field: _convert(field, value) for field, value in row.items()}
+    missing = [field for field in REQUIRED[sheet] if not record.get(field)]
+    if missing:
+        raise ValueError("ต้องมี " + ", ".join(missing))
+    for field, limit in limits.items():
+        value = record.get(field)
+        if isinstance(value, str) and len(value) > limit:
+            raise ValueError(f"{field}: ยาวเกิน {limit} ตัวอักษร")
+
+    if sheet == "users":
+        if "@" not in record["email"]:
+            raise ValueError(f"email ไม่ถูกต้อง ({record['email']!r})")
+        if record["age"] is not None and record["age"] < 0:
+            raise ValueError("age ต้องไม่ติดลบ")
+    elif sheet == "albums":
+        year = record.pop("year")
+        if not record["release_date"] and year:
+            if not 1 <= year <= 9999:
+                raise ValueError(f"year ไม่ถูกต้อง ({year})")
+            record["release_date"] = datetime.date(year, 1, 1).isoformat()
+    return record
+
+
+# -------------------- staging (worker process) --------------------
+def stage_sheet(path, sheet, out_dir, limits):
+    """
+    รันใน worker process: parse + validate sheet เดียว เขียนเป็นไฟล์ JSON Lines แบบกะทัดรัด
+    (บรรทัดแรก = ชื่อ field, บรรทัดต่อไป = array ของค่า) แล้วคืนสรุปผล
+    """
+    started = time.monotonic()
+    out_path = os.path.join(out_dir, f"{sheet}.jsonl")
+    rows = invalid = 0
+    errors = []
+    wb = load_workbook(filename=path, data_only=True, read_only=True)
+    try:
+        with open(out_path, "w", encoding="utf-8") as out:
+            fields = None
+            for n, row in sheet_rows(wb[sheet], SHEET_COLUMNS[sheet]):
+                if all(v is None or v == "" for v in row.values()):
+                    continue  # แถวว่างท้าย sheet
+                try:
+                    record = normalize_row(sheet, row, limits)
+                except ValueError as e:
+                    invalid += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append({"row": n, "error": str(e)})
+                    continue
+                if fields is None:
+                    fields = list(record)
+                    out.write(json.dumps(fields) + "\n")
+                out.write(json.dumps([record[f] for f in fields], ensure_ascii=False, separators=(",", ":")) + "\n")
+                rows += 1
+    finally:
+        wb.close()
+    return {
+        "sheet": sheet,
+        "file": out_path,
+        "rows": rows,
+        "invalid": invalid,
+        "errors": errors,
+        "seconds": round(time.monotonic() - started, 2),
+    }
+
+def stage_workbook(path, sheets, out_dir, limits, workers=None):
+    """
+    parse หลาย sheet พร้อมกันใน process pool (openpyxl ใช้ CPU ล้วน ๆ)
+    คืน {sheet: ผลของ stage_sheet}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sheets)))
+    if workers == 1:
+        results = [stage_sheet(path, sheet, out_dir, limits.get(sheet, {})) for sheet in sheets]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(stage_sheet, path, sheet, out_dir, limits.get(sheet, {})) for sheet in sheets]
+            results = [future.result() for future in futures]
+    return {result["sheet"]: result for result in results}
+
+def read_staged(file_path):
+    """อ่านไฟล์ staged กลับเป็น dict ทีละ record (สตรีม)"""
+    with open(file_path, "r", encoding="utf-8") as fh:
+        header = fh.readline()
+        if not header:
+            return
+        fields = json.loads(header)
+        for line in fh:
+            yield dict(zip(fields, json.loads(line)))